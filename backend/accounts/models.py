@@ -8,6 +8,8 @@ class User(AbstractUser):
     last_name = models.CharField(max_length=150)
     phone = models.CharField(max_length=20, blank=True)
     profile_image_url = models.URLField(blank=True)
+    # Part of the validators of responses that nest users (grievances.conditional)
+    updated_at = models.DateTimeField(auto_now=True)
     
     # Use email as username
     USERNAME_FIELD = 'email'
@@ -7,7 +7,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
         model = UserProfile
         fields = [
             'role', 'company', 'national_id', 'address',
-            'designation', 'employee_id', 'is_verified'
+            'designation', 'employee_id'
         ]
 
 class UserSerializer(serializers.ModelSerializer):
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.mail import send_mail
+
+from core.tasks import task
+from .models import User
+
+
+@task(queue='notifications')
+def send_welcome_email(user_pk):
+    """Welcome a newly registered user"""
+    user = User.objects.filter(pk=user_pk).first()
+    if user is None:
+        return
+    send_mail(
+        'Welcome to the IDRA Grievance Management System',
+        f'Dear {user.get_full_name()},\n\n'
+        'Your account has been created. You can now submit and track insurance grievances.\n',
+        settings.DEFAULT_FROM_EMAIL,
+        [user.email],
+    )
@@ -5,7 +5,9 @@ from rest_framework.response import Response
 from django.contrib.auth import authenticate, login, logout
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
+from core.audit import audit
 from .models import User
+from .tasks import send_welcome_email
 from .serializers import UserSerializer
 
 @api_view(['POST'])
@@ -27,6 +29,7 @@ def login_view(request):
         user = authenticate(request, username=email, password=password)
         if user:
             login(request, user)
+            audit(request, 'login', user)
             serializer = UserSerializer(user)
             return Response({
                 'message': 'Login successful',
@@ -47,6 +50,7 @@ def login_view(request):
 @permission_classes([IsAuthenticated])
 def logout_view(request):
     """User logout endpoint"""
+    audit(request, 'logout', request.user)
     logout(request)
     return Response({'message': 'Logout successful'})
 
@@ -88,11 +92,13 @@ def register_view(request):
             password=password,
             first_name=first_name,
             last_name=last_name,
-            phone=phone
+            phone=phone or ''
         )
         
         # Login the user
         login(request, user)
+        audit(request, 'create', user)
+        send_welcome_email.enqueue(user.pk, key=f'welcome:{user.pk}')
         
         serializer = UserSerializer(user)
         return Response({
@@ -39,9 +39,15 @@ class InsuranceCompany(models.Model):
     @property
     def total_grievances(self):
         """Get total number of grievances for this company"""
-        return self.grievances.count()
+        if hasattr(self, 'total_grievances_count'):
+            return self.total_grievances_count
+        from grievances.counters import grievance_count
+        return grievance_count(company=self)
     
     @property
     def pending_grievances(self):
         """Get number of pending grievances for this company"""
-        return self.grievances.filter(status='open').count()
\ No newline at end of file
+        if hasattr(self, 'pending_grievances_count'):
+            return self.pending_grievances_count
+        from grievances.counters import grievance_count
+        return grievance_count(company=self, status='open')
\ No newline at end of file
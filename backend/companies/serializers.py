@@ -1,6 +1,22 @@
+from django.db.models import IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 from rest_framework import serializers
+from grievances.models import GrievanceCounter
 from .models import InsuranceCompany
 
+
+def counted_grievances(company_ref='pk', **filters):
+    """Subquery summing the materialized grievance counters of the company at ``company_ref``"""
+    counts = (
+        GrievanceCounter.objects.filter(company=OuterRef(company_ref), **filters)
+        .order_by()
+        .values('company')
+        .annotate(total=Sum('count'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
 class InsuranceCompanySerializer(serializers.ModelSerializer):
     """Serializer for insurance companies"""
     total_grievances = serializers.ReadOnlyField()
@@ -14,4 +30,9 @@ class InsuranceCompanySerializer(serializers.ModelSerializer):
             'registration_date', 'license_expiry_date',
             'authorized_capital', 'paid_up_capital',
             'is_active', 'total_grievances', 'pending_grievances'
-        ]
\ No newline at end of file
+        ]
+        # Read back by the InsuranceCompany count properties (see core.query_planner)
+        annotations = {
+            'total_grievances_count': counted_grievances(),
+            'pending_grievances_count': counted_grievances(status='open'),
+        }
\ No newline at end of file
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.cache import invalidate
+from .models import InsuranceCompany
+
+
+@receiver(post_save, sender=InsuranceCompany)
+@receiver(post_delete, sender=InsuranceCompany)
+def invalidate_company_caches(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate('companies')
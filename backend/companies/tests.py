@@ -1,3 +1,111 @@
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from core import cache as cache_layer
+from grievances.tests import create_company, create_grievance
+
+
+class CompanyQueryCountTestCase(TestCase):
+    """Company API endpoints run a fixed number of queries"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_list_counts_are_annotated(self):
+        companies = [create_company(f'Company {i}', f'LIC-{i:03d}') for i in range(12)]
+        for company in companies[:3]:
+            create_grievance(company)
+            create_grievance(company, status='resolved')
+
+        with self.assertNumQueries(2):
+            response = self.client.get('/companies/api/')
+        rows = {row['name']: row for row in response.data['results']}
+        self.assertEqual(rows['Company 0']['total_grievances'], 2)
+        self.assertEqual(rows['Company 0']['pending_grievances'], 1)
+        self.assertEqual(rows['Company 11']['total_grievances'], 0)
+
+    def test_detail(self):
+        company = create_company()
+        create_grievance(company)
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/companies/api/{company.pk}/')
+        self.assertEqual(response.data['pending_grievances'], 1)
+
+
+class PublicEndpointCacheTestCase(TestCase):
+    """Public read endpoints are served from the cache until a model write"""
+
+    def setUp(self):
+        cache.clear()
+        cache_layer.reset_cache_stats()
+        self.client = APIClient()
+        self.company = create_company()
+
+    def test_company_api_hits_and_invalidation(self):
+        self.client.get('/companies/api/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/companies/api/')
+        self.assertEqual(response.data['results'][0]['total_grievances'], 0)
+
+        create_grievance(self.company)
+        response = self.client.get('/companies/api/')
+        self.assertEqual(response.data['results'][0]['total_grievances'], 1)
+        self.assertEqual(cache_layer.cache_stats()['company_api'],
+                         {'hits': 1, 'misses': 2, 'stale': 0})
+
+        staff = User.objects.create_user(username='staff@example.com', email='staff@example.com',
+                                         password='demo123', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get('/api/cache-stats/')
+        self.assertEqual(response.data['company_api']['hits'], 1)
+
+    def test_web_views_and_company_invalidation(self):
+        self.client.get('/')
+        self.client.get(f'/companies/{self.company.pk}/')
+        with self.assertNumQueries(0):
+            self.client.get(f'/companies/{self.company.pk}/')
+
+        self.company.is_active = False
+        self.company.save()
+        self.assertEqual(self.client.get(f'/companies/{self.company.pk}/').status_code, 404)
+        self.assertEqual(self.client.get('/').context['stats']['total_companies'], 0)
+
+    def test_stale_value_served_while_one_request_refreshes(self):
+        calls = []
+
+        def slow_compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return len(calls)
+
+        # An entry whose soft expiry has passed but is still within its TTL
+        key = cache_layer.make_key('landing', '', ())
+        cache.set(key, (1, time.time() - 1), 120)
+        calls.append(1)
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                cache_layer.get_or_compute('landing', slow_compute)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Only one refresh ran; everyone else got the stale value
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(sorted(results), [1, 1, 1, 1, 2])
 
-# Create your tests here.
+    def test_backend_errors_degrade_to_uncached(self):
+        with mock.patch.object(cache_layer.cache, 'get', side_effect=ConnectionError), \
+                mock.patch.object(cache_layer.cache, 'get_or_set', side_effect=ConnectionError), \
+                self.assertLogs('core.cache', 'WARNING'):
+            response = self.client.get(f'/companies/api/{self.company.pk}/')
+        self.assertEqual(response.status_code, 200)
@@ -1,16 +1,26 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.paginator import Paginator
+from django.http import Http404
 from rest_framework import generics
 from rest_framework.permissions import AllowAny
+from core.cache import aget_or_compute, cached_response, get_or_compute
+from core.query_planner import plan_queryset
+from core.replicas import replica_reads
+from grievances.stats import company_stats
 from .models import InsuranceCompany
 from .serializers import InsuranceCompanySerializer
 
 # Web Views for Company Management
-def company_list(request):
+@replica_reads
+async def company_list(request):
     """List all active insurance companies (public view)"""
-    companies = InsuranceCompany.objects.filter(is_active=True).order_by('name')
+    async def active_companies():
+        return [company async for company in InsuranceCompany.objects.filter(is_active=True).order_by('name')]
+
+    companies = await aget_or_compute('company_list', active_companies, depends_on=('companies',))
     
     # Pagination
     paginator = Paginator(companies, 12)
@@ -19,26 +29,38 @@ def company_list(request):
     
     context = {
         'companies': page_obj,
-        'total_companies': companies.count(),
+        'total_companies': len(companies),
     }
     
-    return render(request, 'companies/list.html', context)
+    # Context processors load the session user synchronously
+    return await sync_to_async(render)(request, 'companies/list.html', context)
 
-def company_detail(request, pk):
-    """View single company detail (public view)"""
-    company = get_object_or_404(InsuranceCompany, pk=pk, is_active=True)
+def company_detail_context(pk):
+    company = InsuranceCompany.objects.filter(pk=pk, is_active=True).first()
+    if company is None:
+        return None
     
     # Get grievance stats for this company
+    stats = company_stats(company)
     grievance_stats = {
-        'total': company.grievances.count(),
-        'pending': company.grievances.filter(status='open').count(),
-        'resolved': company.grievances.filter(status='resolved').count(),
+        'total': stats.total,
+        'pending': stats.count('open'),
+        'resolved': stats.count('resolved'),
     }
     
-    context = {
+    return {
         'company': company,
         'grievance_stats': grievance_stats,
     }
+
+def company_detail(request, pk):
+    """View single company detail (public view)"""
+    context = get_or_compute(
+        'company_detail', lambda: company_detail_context(pk),
+        suffix=pk, depends_on=('grievances', 'companies')
+    )
+    if context is None:
+        raise Http404('No InsuranceCompany matches the given query.')
     
     return render(request, 'companies/detail.html', context)
 
@@ -96,12 +118,20 @@ def company_create(request):
 # API Views (keep existing API functionality)
 class InsuranceCompanyListView(generics.ListAPIView):
     """List all insurance companies"""
-    queryset = InsuranceCompany.objects.filter(is_active=True)
+    queryset = plan_queryset(InsuranceCompany.objects.filter(is_active=True).order_by('name'), InsuranceCompanySerializer)
     serializer_class = InsuranceCompanySerializer
     permission_classes = [AllowAny]
+    
+    @cached_response('company_api', depends_on=('grievances', 'companies'))
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
 
 class InsuranceCompanyDetailView(generics.RetrieveAPIView):
     """Get details of a specific insurance company"""
-    queryset = InsuranceCompany.objects.filter(is_active=True)
+    queryset = plan_queryset(InsuranceCompany.objects.filter(is_active=True).order_by('name'), InsuranceCompanySerializer)
     serializer_class = InsuranceCompanySerializer
-    permission_classes = [AllowAny]
\ No newline at end of file
+    permission_classes = [AllowAny]
+    
+    @cached_response('company_api', depends_on=('grievances', 'companies'))
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
@@ -0,0 +1,379 @@
+"""
+Asynchronous, batched audit logging.
+
+Request handlers call ``audit()``, which only appends an event to a bounded
+in-process queue, so read paths never wait on an INSERT. A background
+thread per worker process drains the queue with ``bulk_create`` whenever
+``AUDIT_BATCH_SIZE`` events are waiting or ``AUDIT_FLUSH_INTERVAL`` seconds
+have passed.
+
+When the database falls behind, events are appended to a local JSON-lines
+spill file instead of being dropped or blocking the request: a full queue
+spills the new event, and a failed flush spills its batch. Spilled events
+are replayed into the database, ``AUDIT_BATCH_SIZE`` at a time, after the
+next successful flush (or with the ``replay_audit_spill`` command). A batch
+the database rejects is retried one event at a time, and events that still
+fail on their data are moved to a ``.rejected`` file beside the spill so
+they cannot hold up the events after them. Every
+worker process shares the spill file, so appends, the hand-over to a replay
+and the replay itself hold ``flock`` locks on files beside it. An
+``atexit`` hook drains the queue on graceful shutdown.
+"""
+import atexit
+import contextlib
+import fcntl
+import ipaddress
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DataError, IntegrityError, close_old_connections
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = (
+    'enqueued', 'written', 'spilled', 'replayed', 'rejected', 'lost',
+    'flushes', 'failed_flushes', 'slow_flushes',
+)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _valid_ip(value):
+    try:
+        return str(ipaddress.ip_address(value.strip()))
+    except ValueError:
+        return None
+
+
+def client_ip(request):
+    """
+    The client's address: the last ``X-Forwarded-For`` entry, which nginx
+    appends, else ``REMOTE_ADDR``. Earlier entries come from the client and
+    are not trusted.
+    """
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if forwarded:
+        address = _valid_ip(forwarded.split(',')[-1])
+        if address:
+            return address
+    return _valid_ip(request.META.get('REMOTE_ADDR') or '') or '0.0.0.0'
+
+
+def make_event(request, action, instance=None, model_name=None, object_id=None, user=None, **details):
+    """
+    Audit event for ``action`` by the request's user on ``instance``.
+
+    Pass ``model_name``/``object_id`` instead of ``instance`` for objects
+    that are not loaded. Returns None for anonymous requests.
+    """
+    user = user or getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return None
+    if instance is not None:
+        model_name = model_name or instance.__class__.__name__
+        object_id = instance.pk if object_id is None else object_id
+    return {
+        'user_id': user.pk,
+        'action': action,
+        'model_name': model_name,
+        'object_id': object_id,
+        'details': details,
+        'ip_address': client_ip(request),
+        'user_agent': request.META.get('HTTP_USER_AGENT', ''),
+        'timestamp': timezone.now().isoformat(),
+    }
+
+
+def _to_rows(events):
+    from grievances.models import AuditLog
+    return [
+        AuditLog(**{**event, 'timestamp': parse_datetime(event['timestamp'])})
+        for event in events
+    ]
+
+
+class AuditWriter:
+    """Bounded queue of audit events flushed to the database in batches"""
+
+    def __init__(self, queue_size=None, batch_size=None, flush_interval=None,
+                 spill_path=None, slow_flush=None):
+        self.queue = queue.Queue(maxsize=queue_size or _setting('AUDIT_QUEUE_SIZE', 10000))
+        self.batch_size = batch_size or _setting('AUDIT_BATCH_SIZE', 200)
+        self.flush_interval = flush_interval or _setting('AUDIT_FLUSH_INTERVAL', 1.0)
+        self.slow_flush = slow_flush or _setting('AUDIT_SLOW_FLUSH_SECONDS', 2.0)
+        self.spill_path = Path(spill_path or _setting('AUDIT_SPILL_PATH', 'audit-spill.jsonl'))
+        self.pid = os.getpid()
+        self._counts = dict.fromkeys(COUNTERS, 0)
+        self._max_depth = 0
+        self._last_flush_ms = 0.0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counts[name] += amount
+
+    def stats(self):
+        """Throughput and backpressure counters for this process"""
+        with self._lock:
+            return {
+                **self._counts,
+                'queued': self.queue.qsize(),
+                'capacity': self.queue.maxsize,
+                'max_queued': self._max_depth,
+                'last_flush_ms': round(self._last_flush_ms, 2),
+                'spill_pending': self.has_spill(),
+                'running': self._thread is not None and self._thread.is_alive(),
+            }
+
+    def has_spill(self):
+        return self.spill_path.exists() or self.spill_path.with_name(
+            self.spill_path.name + '.replaying').exists()
+
+    def record(self, event):
+        """Queue ``event`` without blocking; spill it if the queue is full"""
+        if event is None:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.spill([event])
+            return
+        self._count('enqueued')
+        depth = self.queue.qsize()
+        with self._lock:
+            self._max_depth = max(self._max_depth, depth)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.shutdown)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._stopping.wait(self.flush_interval)
+            try:
+                if self.flush() and self.has_spill():
+                    self.replay_spill()
+            except Exception:
+                # Keep the writer alive; the events stay queued or spilled
+                logger.exception('Audit writer iteration failed')
+            finally:
+                close_old_connections()
+
+    def _take(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self):
+        """
+        Write everything queued so far; returns False if any batch was spilled.
+        """
+        ok = True
+        with self._flush_lock:
+            while True:
+                batch = self._take(self.batch_size)
+                if not batch:
+                    return ok
+                ok = self._write(batch) and ok
+
+    def _write(self, batch):
+        from grievances.models import AuditLog
+        started = time.perf_counter()
+        try:
+            AuditLog.objects.bulk_create(_to_rows(batch), batch_size=self.batch_size)
+        except Exception:
+            logger.warning('Audit flush of %d events failed; spilling to %s',
+                           len(batch), self.spill_path, exc_info=True)
+            self._count('failed_flushes')
+            self.spill(batch)
+            return False
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._counts['flushes'] += 1
+            self._counts['written'] += len(batch)
+            self._last_flush_ms = elapsed * 1000
+            if elapsed > self.slow_flush:
+                self._counts['slow_flushes'] += 1
+        return True
+
+    @contextlib.contextmanager
+    def _locked(self, suffix, blocking=True):
+        """Hold an exclusive ``flock`` on the spill file's ``suffix`` lock; yields False if busy"""
+        path = self.spill_path.with_name(self.spill_path.name + suffix)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'a') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _append(self, events):
+        with self._spill_lock, self._locked('.lock'):
+            with open(self.spill_path, 'a', encoding='utf-8') as spill:
+                for event in events:
+                    spill.write(json.dumps(event) + '\n')
+                spill.flush()
+                os.fsync(spill.fileno())
+
+    def spill(self, events):
+        """Append events to the spill file for a later replay"""
+        try:
+            self._append(events)
+        except OSError:
+            logger.error('Could not spill %d audit events', len(events), exc_info=True)
+            self._count('lost', len(events))
+            return
+        self._count('spilled', len(events))
+
+    def replay_spill(self):
+        """
+        Move spilled events into the database in batches; returns how many were written.
+
+        Only one process replays at a time. If a batch fails, the events not
+        yet written are kept for the next replay.
+        """
+        replaying = self.spill_path.with_name(self.spill_path.name + '.replaying')
+        with self._locked('.replaying.lock', blocking=False) as acquired:
+            if not acquired:
+                return 0
+            with self._spill_lock, self._locked('.lock'):
+                # A leftover .replaying file means an earlier replay was interrupted
+                if not replaying.exists():
+                    if not self.spill_path.exists():
+                        return 0
+                    os.replace(self.spill_path, replaying)
+            return self._replay(replaying)
+
+    def _replay(self, replaying):
+        from grievances.models import AuditLog
+        replayed = 0
+        with open(replaying, encoding='utf-8') as spill:
+            while True:
+                batch = self._read_batch(spill)
+                if not batch:
+                    break
+                try:
+                    AuditLog.objects.bulk_create(_to_rows(json.loads(line) for line in batch))
+                except Exception:
+                    logger.warning('Replaying %d spilled audit events failed; retrying one at a time',
+                                   len(batch), exc_info=True)
+                    written, finished = self._replay_each(replaying, spill, batch)
+                    replayed += written
+                    if not finished:
+                        return replayed
+                    continue
+                replayed += len(batch)
+                self._count('replayed', len(batch))
+        replaying.unlink()
+        return replayed
+
+    def _replay_each(self, replaying, spill, batch):
+        """
+        Write ``batch`` one event at a time, rejecting events whose data the
+        database refuses; returns ``(written, finished)``. On any other error
+        the rest is kept for the next replay and ``finished`` is False.
+        """
+        from grievances.models import AuditLog
+        written = 0
+        for index, line in enumerate(batch):
+            try:
+                AuditLog.objects.bulk_create(_to_rows([json.loads(line)]))
+            except (ValueError, TypeError, KeyError, DataError, IntegrityError):
+                logger.error('Rejected spilled audit event %s', line.strip(), exc_info=True)
+                self._reject(line)
+            except Exception:
+                logger.warning('Replaying spilled audit events failed', exc_info=True)
+                self._keep_rest(replaying, spill, batch[index:])
+                return written, False
+            else:
+                written += 1
+                self._count('replayed')
+        return written, True
+
+    def _read_batch(self, spill):
+        batch = []
+        while len(batch) < self.batch_size:
+            line = spill.readline()
+            if not line:
+                break
+            if line.strip():
+                batch.append(line)
+        return batch
+
+    def _reject(self, line):
+        rejected = self.spill_path.with_name(self.spill_path.name + '.rejected')
+        with open(rejected, 'a', encoding='utf-8') as handle:
+            handle.write(line if line.endswith('\n') else line + '\n')
+            handle.flush()
+            os.fsync(handle.fileno())
+        self._count('rejected')
+
+    def _keep_rest(self, replaying, spill, pending):
+        """Replace the replaying file with ``pending`` and the lines after it, so written events are not replayed again"""
+        rest = replaying.with_name(replaying.name + '.rest')
+        with open(rest, 'w', encoding='utf-8') as handle:
+            handle.writelines(pending)
+            for line in spill:
+                handle.write(line)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(rest, replaying)
+
+    def shutdown(self, timeout=10):
+        """Stop the background thread and write out everything still queued"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        try:
+            self.flush()
+        finally:
+            close_old_connections()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """This process's writer; a forked worker gets its own"""
+    global _writer
+    with _writer_lock:
+        if _writer is None or _writer.pid != os.getpid():
+            _writer = AuditWriter()
+            if _setting('AUDIT_BACKGROUND', True):
+                _writer.start()
+        return _writer
+
+
+def audit(request, action, instance=None, **kwargs):
+    """Record an audit event for the current request without touching the database"""
+    get_writer().record(make_event(request, action, instance, **kwargs))
+
+
+def audit_stats():
+    return get_writer().stats()
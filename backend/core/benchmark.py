@@ -0,0 +1,181 @@
+"""
+HTTP-level benchmarks for every GET route.
+
+``collect_routes`` walks the URL configuration and fills path parameters with
+objects from the current database that each role is allowed to see, so the
+harness runs against whatever ``generate_load_data`` produced. Each route is
+requested in-process through the Django test client as an anonymous visitor,
+a policyholder, an insurer and an IDRA administrator, measuring:
+
+* latency percentiles over ``iterations`` timed requests, after warm-up
+  requests (caches are warm, as in production);
+* database queries per request, counted on one separate request;
+* Python allocations per request (``tracemalloc`` peak and net), on one
+  separate request, so neither instrument skews the timings.
+
+Results are plain dicts that ``compare`` checks against a stored baseline.
+"""
+import statistics
+import time
+import tracemalloc
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver
+
+from accounts.models import UserProfile
+from grievances.models import Grievance, GrievanceDocument
+
+ROLES = ('anonymous', 'policyholder', 'insurance_company', 'idra_admin')
+
+# Routes that change state on GET, dump entire tables or stream until closed
+DEFAULT_SKIP = ('admin', 'logout', 'api-logout', 'api-export', 'api-events')
+
+
+def _walk(patterns, prefix='', namespace=None):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from _walk(pattern.url_patterns, prefix + str(pattern.pattern),
+                             pattern.namespace or namespace)
+        elif isinstance(pattern, URLPattern):
+            yield prefix + str(pattern.pattern), namespace, pattern.name
+
+
+def _samples(role):
+    """The user for ``role`` and a grievance and document they may see, or None where none exist"""
+    if role == 'anonymous':
+        grievance = Grievance.objects.filter(is_public=True).first() or Grievance.objects.first()
+        return None, grievance, GrievanceDocument.objects.filter(is_public=True).order_by('pk').first()
+    profile = (
+        UserProfile.objects.filter(role=role, user__is_active=True)
+        .select_related('user').order_by('pk').first()
+    )
+    if profile is None:
+        return None, None, None
+    grievances = Grievance.objects.order_by('pk')
+    if role == 'policyholder':
+        grievances = grievances.filter(submitted_by=profile.user)
+    elif role == 'insurance_company':
+        grievances = grievances.filter(insurance_company_id=profile.company_id)
+    document = GrievanceDocument.objects.filter(grievance__in=grievances.values('pk')).order_by('pk').first()
+    return profile.user, grievances.first(), document
+
+
+def _fill(route, namespace, grievance, document):
+    """``route`` with its parameters filled in, or None if that is not possible"""
+    url = '/' + route
+    if '<' not in url:
+        return url
+    if 'documents/<int:pk>' in url:
+        pk = document.pk if document else None
+    elif namespace == 'companies':
+        pk = grievance.insurance_company_id if grievance else None
+    else:
+        pk = grievance.pk if grievance else None
+    values = {
+        '<int:pk>': pk,
+        '<str:grievance_id>': grievance.grievance_id if grievance else None,
+    }
+    for parameter, value in values.items():
+        if parameter in url:
+            if value is None:
+                return None
+            url = url.replace(parameter, str(value))
+    return None if '<' in url else url
+
+
+def collect_routes(skip=DEFAULT_SKIP):
+    """``(name, url, role, user)`` for every GET-able route and role"""
+    routes = []
+    for role in ROLES:
+        user, grievance, document = _samples(role)
+        if role != 'anonymous' and user is None:
+            continue
+        for route, namespace, name in _walk(get_resolver().url_patterns):
+            qualified = f'{namespace}:{name}' if namespace else name
+            if namespace in skip or name in skip or qualified in skip:
+                continue
+            url = _fill(route, namespace, grievance, document)
+            if url is not None:
+                routes.append((qualified or route, url, role, user))
+    return routes
+
+
+def _percentile(timings, fraction):
+    return timings[min(len(timings) - 1, int(len(timings) * fraction))]
+
+
+def measure(client, url, iterations=20, warmup=2):
+    for _ in range(warmup):
+        client.get(url)
+
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        response = client.get(url)
+        if getattr(response, 'streaming', False):
+            b''.join(response.streaming_content)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+
+    with CaptureQueriesContext(connection) as queries:
+        client.get(url)
+
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        client.get(url)
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'status': response.status_code,
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(_percentile(timings, 0.95), 3),
+        'p99_ms': round(_percentile(timings, 0.99), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'queries': len(queries),
+        'alloc_peak_kib': round((peak - before) / 1024, 1),
+        'alloc_net_kib': round((after - before) / 1024, 1),
+    }
+
+
+def run(iterations=20, warmup=2, skip=DEFAULT_SKIP, routes=None, progress=None):
+    """Benchmark every route for every role; returns ``{"GET <url> [role]": result}``"""
+    results = {}
+    clients = {}
+    for name, url, role, user in routes or collect_routes(skip):
+        if role not in clients:
+            clients[role] = Client()
+            if user is not None:
+                clients[role].force_login(user)
+        key = f'GET {url} [{role}]'
+        results[key] = {'route': name, 'role': role, **measure(clients[role], url, iterations, warmup)}
+        if progress:
+            progress(key, results[key])
+    return results
+
+
+def compare(baseline, current, threshold=0.2, min_ms=1.0):
+    """
+    Regressions of ``current`` against ``baseline``, as messages.
+
+    A route regresses when its p95 grows by more than ``threshold`` (and by at
+    least ``min_ms``, to ignore noise on fast routes), when it makes more
+    queries, or when its status code changes.
+    """
+    regressions = []
+    for key, before in baseline.items():
+        after = current.get(key)
+        if after is None:
+            continue
+        if after['status'] != before['status']:
+            regressions.append(f"{key}: status {before['status']} -> {after['status']}")
+        if after['queries'] > before['queries']:
+            regressions.append(f"{key}: queries {before['queries']} -> {after['queries']}")
+        limit = max(before['p95_ms'] * (1 + threshold), before['p95_ms'] + min_ms)
+        if after['p95_ms'] > limit:
+            regressions.append(f"{key}: p95 {before['p95_ms']:.2f} ms -> {after['p95_ms']:.2f} ms")
+    return regressions
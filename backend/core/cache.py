@@ -0,0 +1,238 @@
+"""
+Caching for public, read-heavy endpoints.
+
+Values are cached under versioned keys: every key embeds the current version
+of the namespaces it depends on (``grievances``, ``companies``), and model
+save/delete signals bump those versions, so stale entries are simply never
+read again and age out by TTL.
+
+Entries carry a soft expiry ahead of the hard cache TTL. The first request
+past the soft expiry takes a short lock and recomputes while concurrent
+requests keep serving the stale value, and a cold miss lets only the lock
+holder compute while others briefly wait for its result. Together these keep
+an expiring hot key from stampeding the database.
+
+Values are computed with ``primary_reads``, even inside ``replica_reads``
+views, so a lagging replica is never cached (see ``core.replicas``).
+
+TTLs come from the ``CACHE_TTLS`` setting. Cache backend errors are treated
+as misses so a Redis outage degrades to uncached responses.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .replicas import primary_reads
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 60
+LOCK_TIMEOUT = 10
+WAIT_FOR_LOCK = 2.0
+WAIT_INTERVAL = 0.05
+
+_stats = defaultdict(lambda: {'hits': 0, 'misses': 0, 'stale': 0})
+_stats_lock = threading.Lock()
+
+
+def _record(name, outcome):
+    with _stats_lock:
+        _stats[name][outcome] += 1
+
+
+def cache_stats():
+    """Per-endpoint hit/miss counters for this process"""
+    with _stats_lock:
+        return {name: dict(counts) for name, counts in _stats.items()}
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def get_ttl(name):
+    return getattr(settings, 'CACHE_TTLS', {}).get(name, DEFAULT_TTL)
+
+
+def _version_key(namespace):
+    return f'cache-version:{namespace}'
+
+
+def _fresh_version():
+    # Time-based, so a version key lost to eviction never reuses old keys
+    return int(time.time() * 1000)
+
+
+def namespace_version(namespace):
+    try:
+        return cache.get_or_set(_version_key(namespace), _fresh_version, timeout=None)
+    except Exception:
+        logger.warning('Cache unavailable reading version of %s', namespace, exc_info=True)
+        return 0
+
+
+def invalidate(*namespaces):
+    """Bump namespace versions so every key depending on them is skipped"""
+    for namespace in namespaces:
+        try:
+            cache.incr(_version_key(namespace))
+        except ValueError:
+            _call('set', _version_key(namespace), _fresh_version(), None)
+        except Exception:
+            logger.warning('Cache unavailable invalidating %s', namespace, exc_info=True)
+
+
+def make_key(name, suffix, depends_on):
+    versions = '.'.join(str(namespace_version(namespace)) for namespace in depends_on)
+    return f'{name}:v{versions}:{suffix}'
+
+
+def _call(method, *args, default=None):
+    """Run a cache operation, treating backend errors as a miss"""
+    try:
+        return getattr(cache, method)(*args)
+    except Exception:
+        logger.warning('Cache unavailable during %s', method, exc_info=True)
+        return default
+
+
+def get_or_compute(name, compute, suffix='', depends_on=()):
+    """
+    Return the cached value for ``name``/``suffix``, computing it on a miss.
+
+    ``depends_on`` lists the namespaces whose invalidation discards the value.
+    """
+    ttl = get_ttl(name)
+    compute = primary_reads(compute)
+    key = make_key(name, suffix, depends_on)
+    lock_key = f'{key}:lock'
+
+    entry = _call('get', key)
+    if entry is not None:
+        value, soft_expiry = entry
+        if time.time() < soft_expiry:
+            _record(name, 'hits')
+            return value
+        _record(name, 'stale')
+        if not _call('add', lock_key, 1, LOCK_TIMEOUT, default=True):
+            # Someone else is already refreshing it
+            return value
+        return _store(key, lock_key, compute, ttl)
+
+    _record(name, 'misses')
+    if _call('add', lock_key, 1, LOCK_TIMEOUT, default=True):
+        return _store(key, lock_key, compute, ttl)
+
+    # Another request is computing this key; give it a moment
+    deadline = time.monotonic() + WAIT_FOR_LOCK
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        entry = _call('get', key)
+        if entry is not None:
+            return entry[0]
+    return compute()
+
+
+def _store(key, lock_key, compute, ttl):
+    try:
+        value = compute()
+        # Keep serving the old value for one more TTL while it is refreshed
+        _call('set', key, (value, time.time() + ttl), ttl * 2)
+        return value
+    finally:
+        _call('delete', lock_key)
+
+
+# Async twins of the above for async views; same keys, locks and TTLs
+
+async def anamespace_version(namespace):
+    try:
+        return await cache.aget_or_set(_version_key(namespace), _fresh_version, timeout=None)
+    except Exception:
+        logger.warning('Cache unavailable reading version of %s', namespace, exc_info=True)
+        return 0
+
+
+async def amake_key(name, suffix, depends_on):
+    versions = '.'.join([str(await anamespace_version(namespace)) for namespace in depends_on])
+    return f'{name}:v{versions}:{suffix}'
+
+
+async def _acall(method, *args, default=None):
+    try:
+        return await getattr(cache, f'a{method}')(*args)
+    except Exception:
+        logger.warning('Cache unavailable during %s', method, exc_info=True)
+        return default
+
+
+async def aget_or_compute(name, compute, suffix='', depends_on=()):
+    """``get_or_compute`` for async views; ``compute`` is a coroutine function"""
+    ttl = get_ttl(name)
+    compute = primary_reads(compute)
+    key = await amake_key(name, suffix, depends_on)
+    lock_key = f'{key}:lock'
+
+    entry = await _acall('get', key)
+    if entry is not None:
+        value, soft_expiry = entry
+        if time.time() < soft_expiry:
+            _record(name, 'hits')
+            return value
+        _record(name, 'stale')
+        if not await _acall('add', lock_key, 1, LOCK_TIMEOUT, default=True):
+            return value
+        return await _astore(key, lock_key, compute, ttl)
+
+    _record(name, 'misses')
+    if await _acall('add', lock_key, 1, LOCK_TIMEOUT, default=True):
+        return await _astore(key, lock_key, compute, ttl)
+
+    deadline = time.monotonic() + WAIT_FOR_LOCK
+    while time.monotonic() < deadline:
+        await asyncio.sleep(WAIT_INTERVAL)
+        entry = await _acall('get', key)
+        if entry is not None:
+            return entry[0]
+    return await compute()
+
+
+async def _astore(key, lock_key, compute, ttl):
+    try:
+        value = await compute()
+        await _acall('set', key, (value, time.time() + ttl), ttl * 2)
+        return value
+    finally:
+        await _acall('delete', lock_key)
+
+
+def cached_response(name, depends_on=()):
+    """
+    Cache a DRF ``get`` handler's response per full request path.
+
+    Only use this on endpoints whose response is the same for every caller.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            def render():
+                response = method(self, request, *args, **kwargs)
+                # Plain JSON types, so the cached value carries no serializer
+                return response.status_code, json.loads(json.dumps(response.data, cls=JSONEncoder))
+
+            status, data = get_or_compute(
+                name, render, suffix=request.get_full_path(), depends_on=depends_on
+            )
+            return Response(data, status=status)
+        return wrapper
+    return decorator
@@ -0,0 +1,181 @@
+"""
+Publish/subscribe for pushing updates to connected clients.
+
+``publish(topic, event)`` hands a JSON-serialisable dict to every
+subscriber of ``topic``, and ``subscribe(topic)`` is an async context
+manager yielding a ``Subscription`` to read events from. Grievance
+conversations publish to ``grievance:<pk>`` (see ``grievances.events``), and
+``GrievanceEventsView`` streams them to browsers and the mobile app as
+Server-Sent Events.
+
+``EVENTS_BACKEND`` picks how events travel:
+
+``local``
+    Events reach the subscribers of the publishing process only, which is
+    enough when a single process serves every client.
+``redis``
+    Events go through Redis pub/sub on ``REDIS_URL``. This is the default
+    when it is set. Each process runs one listener thread on the
+    ``events:*`` channels and fans events out to its own subscribers.
+
+A subscriber is an asyncio queue on its connection's event loop, so an
+idle one costs little beyond its socket. One that falls ``EVENTS_QUEUE_SIZE``
+events behind is cut off. Its client reconnects and catches up with
+Last-Event-ID.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from rest_framework.utils.encoders import JSONEncoder
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = 'events:'
+OVERFLOW = object()
+
+
+class Subscription:
+    """Events for one subscriber, delivered on its own event loop"""
+
+    __slots__ = ('topic', 'loop', 'queue', 'limit', 'overflowed')
+
+    def __init__(self, topic, loop, limit):
+        self.topic = topic
+        self.loop = loop
+        self.queue = asyncio.Queue()
+        self.limit = limit
+        self.overflowed = False
+
+    def deliver(self, event):
+        if self.overflowed:
+            return
+        if self.queue.qsize() >= self.limit:
+            self.overflowed = True
+            event = OVERFLOW
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout=None):
+        """The next event, ``OVERFLOW`` if this subscriber fell behind, or None on timeout"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+def _deliver_all(subscriptions, event):
+    for subscription in subscriptions:
+        subscription.deliver(event)
+
+
+class Broker:
+    """Subscribers of this process, by topic"""
+
+    def __init__(self):
+        self.topics = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def add(self, subscription):
+        with self.lock:
+            self.topics[subscription.topic].add(subscription)
+
+    def remove(self, subscription):
+        with self.lock:
+            subscribers = self.topics.get(subscription.topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.topics[subscription.topic]
+
+    def count(self):
+        with self.lock:
+            return sum(len(subscribers) for subscribers in self.topics.values())
+
+    def dispatch(self, topic, event):
+        """Hand ``event`` to the subscribers of ``topic``; safe from any thread"""
+        with self.lock:
+            subscribers = list(self.topics.get(topic, ()))
+        by_loop = defaultdict(list)
+        for subscription in subscribers:
+            by_loop[subscription.loop].append(subscription)
+        # One wake-up per event loop, however many subscribers it serves
+        for loop, group in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_deliver_all, group, event)
+            except RuntimeError:
+                for subscription in group:
+                    self.remove(subscription)
+
+
+broker = Broker()
+_client = None
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def _backend():
+    return getattr(settings, 'EVENTS_BACKEND', 'local')
+
+
+def _redis():
+    global _client
+    if _client is None:
+        import redis
+        _client = redis.Redis.from_url(settings.REDIS_URL)
+    return _client
+
+
+def _listen():
+    """Fan events published through Redis out to this process's subscribers"""
+    delay = 1
+    while True:
+        try:
+            pubsub = _redis().pubsub(ignore_subscribe_messages=True)
+            pubsub.psubscribe(CHANNEL_PREFIX + '*')
+            delay = 1
+            for message in pubsub.listen():
+                topic = message['channel'].decode()[len(CHANNEL_PREFIX):]
+                broker.dispatch(topic, json.loads(message['data']))
+        except Exception:
+            logger.warning('Lost the Redis events subscription; reconnecting in %ds', delay, exc_info=True)
+            time.sleep(delay)
+            delay = min(delay * 2, 30)
+
+
+def _ensure_listener():
+    global _listener
+    if _backend() != 'redis':
+        return
+    with _listener_lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = threading.Thread(target=_listen, name='events-listener', daemon=True)
+            _listener.start()
+
+
+def publish(topic, event):
+    """Send ``event`` to every subscriber of ``topic``"""
+    if _backend() == 'redis':
+        try:
+            _redis().publish(CHANNEL_PREFIX + topic, json.dumps(event, cls=JSONEncoder))
+        except Exception:
+            # Clients catch up from the database when they reconnect
+            logger.warning('Could not publish an event to %s', topic, exc_info=True)
+    else:
+        broker.dispatch(topic, event)
+
+
+@asynccontextmanager
+async def subscribe(topic):
+    """Receive the events published to ``topic`` while the block runs"""
+    _ensure_listener()
+    subscription = Subscription(topic, asyncio.get_running_loop(), getattr(settings, 'EVENTS_QUEUE_SIZE', 100))
+    broker.add(subscription)
+    try:
+        yield subscription
+    finally:
+        broker.remove(subscription)
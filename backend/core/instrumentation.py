@@ -0,0 +1,254 @@
+"""
+Per-request instrumentation.
+
+``RequestMetricsMiddleware`` measures, for every request, the number of
+database queries and the time spent in them (through an execute wrapper
+added to every connection, so it works with ``DEBUG`` off), the time spent
+rendering templates and the time spent producing serializer ``.data``. The
+figures go out as a ``Server-Timing`` header, which browser developer tools
+show next to the request, and as one JSON log line on the
+``core.instrumentation`` logger.
+
+Queries are grouped by fingerprint: the SQL with its parameters left out and
+``IN (...)`` lists collapsed. A fingerprint run ``REQUEST_METRICS_REPEAT_THRESHOLD``
+or more times in one request is reported as a likely N+1, and the same
+statement run again with identical parameters as a duplicate.
+
+Each URL name keeps a rolling window of its last ``REQUEST_METRICS_WINDOW``
+requests, served by ``/api/request-metrics/`` as a latency histogram with
+percentiles. Both the window and the counters are per worker process.
+
+Set ``REQUEST_METRICS_ENABLED=false`` to take the middleware out of the stack
+entirely.
+"""
+import bisect
+import contextvars
+import functools
+import json
+import logging
+import re
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the histogram buckets; the last bucket is open-ended
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+_windows = defaultdict(deque)
+_windows_lock = threading.Lock()
+
+
+class RequestMetrics:
+    """Timings collected while one request is being handled"""
+
+    __slots__ = ('queries', 'db_time', 'template_time', 'serializer_time',
+                 'fingerprints', 'statements', '_depth')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.serializer_time = 0.0
+        self.fingerprints = Counter()
+        self.statements = Counter()
+        self._depth = {'template': 0, 'serializer': 0}
+
+    def repeated(self, threshold):
+        """``(fingerprint, count)`` for every fingerprint run at least ``threshold`` times"""
+        return [(sql, count) for sql, count in self.fingerprints.most_common() if count >= threshold]
+
+    def duplicates(self):
+        return sum(count - 1 for count in self.statements.values() if count > 1)
+
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+@functools.lru_cache(maxsize=4096)
+def fingerprint(sql):
+    """``sql`` normalized so the same query shape maps to one string"""
+    if 'IN (' in sql:
+        sql = _IN_LIST.sub('IN (...)', sql)
+    return sql
+
+
+def _execute(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_time += time.perf_counter() - started
+        metrics.queries += 1
+        metrics.fingerprints[fingerprint(sql)] += 1
+        if not many:
+            try:
+                metrics.statements[(sql, tuple(params or ()))] += 1
+            except TypeError:
+                pass
+
+
+def _timed(kind, attribute):
+    """Wrap a callable so its outermost calls add to ``metrics.<attribute>``"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            metrics = _current.get()
+            if metrics is None or metrics._depth[kind]:
+                return function(*args, **kwargs)
+            metrics._depth[kind] += 1
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                metrics._depth[kind] -= 1
+                setattr(metrics, attribute, getattr(metrics, attribute) + time.perf_counter() - started)
+        wrapper._request_metrics = True
+        return wrapper
+    return decorator
+
+
+def _wrap_connection(connection, **kwargs):
+    if _execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute)
+
+
+def _install_hooks():
+    """Time queries, template rendering and serializer output; safe to call repeatedly"""
+    from django.template.backends.django import Template
+    from rest_framework.serializers import ListSerializer, Serializer
+
+    # Every connection, whichever thread opens it, reports to the current request
+    connection_created.connect(_wrap_connection, dispatch_uid='core.instrumentation.wrap_connection')
+    for connection in connections.all(initialized_only=True):
+        _wrap_connection(connection)
+
+    if not getattr(Template.render, '_request_metrics', False):
+        Template.render = _timed('template', 'template_time')(Template.render)
+    for serializer in (Serializer, ListSerializer):
+        data = serializer.__dict__['data']
+        if not getattr(data.fget, '_request_metrics', False):
+            serializer.data = property(_timed('serializer', 'serializer_time')(data.fget))
+
+
+def _record(view_name, duration_ms, queries):
+    window = getattr(settings, 'REQUEST_METRICS_WINDOW', 1000)
+    with _windows_lock:
+        samples = _windows[view_name]
+        samples.append((duration_ms, queries))
+        while len(samples) > window:
+            samples.popleft()
+
+
+def request_metrics():
+    """Rolling latency histogram and percentiles per URL name for this process"""
+    with _windows_lock:
+        windows = {name: list(samples) for name, samples in _windows.items()}
+    report = {}
+    for name, samples in sorted(windows.items()):
+        durations = sorted(duration for duration, _ in samples)
+        buckets = [0] * (len(BUCKETS_MS) + 1)
+        for duration in durations:
+            buckets[bisect.bisect_left(BUCKETS_MS, duration)] += 1
+        report[name] = {
+            'count': len(durations),
+            'p50_ms': round(durations[len(durations) // 2], 2),
+            'p95_ms': round(durations[min(len(durations) - 1, int(len(durations) * 0.95))], 2),
+            'p99_ms': round(durations[min(len(durations) - 1, int(len(durations) * 0.99))], 2),
+            'mean_queries': round(statistics.fmean(queries for _, queries in samples), 2),
+            'histogram': {
+                **{f'le_{bound}ms': count for bound, count in zip(BUCKETS_MS, buckets)},
+                f'gt_{BUCKETS_MS[-1]}ms': buckets[-1],
+            },
+        }
+    return report
+
+
+def reset_request_metrics():
+    with _windows_lock:
+        _windows.clear()
+
+
+class RequestMetricsMiddleware:
+    """Adds Server-Timing headers, log lines and rolling histograms per request"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'REQUEST_METRICS_REPEAT_THRESHOLD', 5)
+        _install_hooks()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = request.request_metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    async def __acall__(self, request):
+        metrics = request.request_metrics = RequestMetrics()
+        # Copied into the threads that run ORM calls, so their queries count too
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    def finish(self, request, response, metrics, started):
+        total_ms = (time.perf_counter() - started) * 1000
+
+        match = getattr(request, 'resolver_match', None)
+        view_name = (match.view_name if match else None) or 'unresolved'
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries"',
+            f'tpl;dur={metrics.template_time * 1000:.1f}',
+            f'ser;dur={metrics.serializer_time * 1000:.1f}',
+            f'total;dur={total_ms:.1f}',
+        ])
+        _record(view_name, total_ms, metrics.queries)
+
+        repeated = metrics.repeated(self.threshold)
+        if logger.isEnabledFor(logging.INFO) or repeated:
+            line = {
+                'method': request.method,
+                'path': request.path,
+                'view': view_name,
+                'status': response.status_code,
+                'total_ms': round(total_ms, 2),
+                'db_ms': round(metrics.db_time * 1000, 2),
+                'queries': metrics.queries,
+                'duplicate_queries': metrics.duplicates(),
+                'template_ms': round(metrics.template_time * 1000, 2),
+                'serializer_ms': round(metrics.serializer_time * 1000, 2),
+            }
+            if repeated:
+                line['repeated_queries'] = [{'sql': sql[:300], 'count': count} for sql, count in repeated]
+                logger.warning(json.dumps(line))
+            else:
+                logger.info(json.dumps(line))
+        return response
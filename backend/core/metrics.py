@@ -0,0 +1,382 @@
+"""
+Prometheus metrics for the backend, served at ``/metrics``.
+
+Each worker process counts into an in-memory registry (request latency
+histograms per view, responses by status, database queries and connections)
+and writes a snapshot of it to ``METRICS_DIR/metrics-<host>-<pid>-<start>.json`` at
+most every ``METRICS_FLUSH_INTERVAL`` seconds, at the end of a request. The
+``/metrics`` view sums the snapshots of every process, so whichever prefork
+worker answers the scrape reports totals for the whole server, the same way
+``prometheus_client``'s multiprocess mode does, without the extra dependency.
+Snapshots of processes that have exited are folded into
+``metrics-archive.json`` under a file lock so counters never go backwards as
+workers are recycled. Process ids only mean something on the host (or
+container) that wrote them, so a process only archives snapshots from its
+own host; the SLA scheduler and task worker containers share the directory
+with the backend, and their last snapshots keep counting after they exit.
+With ``METRICS_DIR`` empty the registry is simply per-process.
+
+Grievance gauges (totals by status, submissions and resolutions over recent
+windows, SLA breaches from ``Grievance.sla_deadline``) are computed from the
+database at scrape time and cached for ``CACHE_TTLS['grievance_metrics']``
+seconds, so several scrapers cost one set of queries.
+"""
+import atexit
+import fcntl
+import glob
+import json
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .cache import cache_stats, get_or_compute
+
+# Request duration histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+WINDOWS = {'1h': timedelta(hours=1), '24h': timedelta(days=1), '7d': timedelta(days=7)}
+CLOSED_STATUSES = ('resolved', 'closed')
+HOST = socket.gethostname()
+
+HELP = {
+    'idra_http_request_duration_seconds': ('histogram', 'Request latency by view'),
+    'idra_http_responses_total': ('counter', 'Responses by view and status code'),
+    'idra_http_requests_in_flight': ('gauge', 'Requests being handled right now'),
+    'idra_db_queries_total': ('counter', 'Database queries run while handling requests'),
+    'idra_db_query_duration_seconds_total': ('counter', 'Time spent in database queries during requests'),
+    'idra_db_connections_opened_total': ('counter', 'Database connections opened'),
+    'idra_cache_requests_total': ('counter', 'Cache lookups by endpoint and outcome'),
+    'idra_cache_hit_ratio': ('gauge', 'Share of cache lookups served from cache (hits and stale)'),
+    'idra_grievances': ('gauge', 'Grievances by status'),
+    'idra_grievance_submissions': ('gauge', 'Grievances submitted within the window'),
+    'idra_grievance_resolutions': ('gauge', 'Grievances resolved within the window'),
+    'idra_grievances_sla_breached': ('gauge', 'Open grievances past their SLA deadline, by priority'),
+    'idra_grievances_sla_due_24h': ('gauge', 'Open grievances due within 24 hours, by priority'),
+    'idra_sla_escalations_total': ('counter', 'Grievances escalated by the SLA sweep, by level'),
+    'idra_sla_sweep_duration_seconds': ('histogram', 'Time taken by each SLA sweep'),
+    'idra_tasks_total': ('counter', 'Background jobs run, by queue and outcome'),
+    'idra_task_duration_seconds': ('histogram', 'Background job run time, by task'),
+}
+
+
+class Registry:
+    """Counters and histograms of one process"""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.started = time.time_ns()
+        self.lock = threading.Lock()
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self.in_flight = 0
+        self.flushed_at = 0.0
+
+    def inc(self, name, labels, value=1):
+        with self.lock:
+            self.counters[(name, labels)] += value
+
+    def observe(self, name, labels, value):
+        with self.lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                # One count per bucket, then +Inf, sum
+                histogram = self.histograms[(name, labels)] = [0] * (len(BUCKETS) + 1) + [0.0]
+            for index, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram[index] += 1
+                    break
+            else:
+                histogram[len(BUCKETS)] += 1
+            histogram[-1] += value
+
+    def snapshot(self):
+        with self.lock:
+            counters = [[name, list(labels), value] for (name, labels), value in self.counters.items()]
+            histograms = [[name, list(labels), list(values)] for (name, labels), values in self.histograms.items()]
+            in_flight = self.in_flight
+        for endpoint, outcomes in cache_stats().items():
+            for outcome, value in outcomes.items():
+                counters.append(['idra_cache_requests_total',
+                                 [['endpoint', endpoint], ['outcome', outcome]], value])
+        return {'pid': self.pid, 'counters': counters, 'histograms': histograms, 'in_flight': in_flight}
+
+    @property
+    def path(self):
+        return Path(settings.METRICS_DIR) / f'metrics-{HOST}-{self.pid}-{self.started}.json'
+
+    def flush(self, force=False):
+        """Write this process's snapshot if one is due"""
+        if not getattr(settings, 'METRICS_DIR', None):
+            return
+        now = time.monotonic()
+        if not force and now - self.flushed_at < getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0):
+            return
+        self.flushed_at = now
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_suffix('.tmp')
+        temporary.write_text(json.dumps(self.snapshot()))
+        os.replace(temporary, self.path)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """This process's registry; a forked child starts its own"""
+    global _registry
+    if _registry is None or _registry.pid != os.getpid():
+        with _registry_lock:
+            if _registry is None or _registry.pid != os.getpid():
+                _registry = Registry()
+                atexit.register(_registry.flush, force=True)
+    return _registry
+
+
+def reset_metrics():
+    """Start this process's counters from zero"""
+    global _registry
+    with _registry_lock:
+        _registry = None
+
+
+def _connection_opened(sender, connection, **kwargs):
+    get_registry().inc('idra_db_connections_opened_total', (('alias', connection.alias),))
+
+
+connection_created.connect(_connection_opened, dispatch_uid='core.metrics.connection_opened')
+
+
+class MetricsMiddleware:
+    """Counts in-flight requests and observes latency, status and queries per view"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        registry = self.start()
+        started = time.perf_counter()
+        response = None
+        try:
+            response = self.get_response(request)
+            return response
+        finally:
+            self.finish(registry, request, response, started)
+
+    async def __acall__(self, request):
+        registry = self.start()
+        started = time.perf_counter()
+        response = None
+        try:
+            response = await self.get_response(request)
+            return response
+        finally:
+            self.finish(registry, request, response, started)
+
+    def start(self):
+        registry = get_registry()
+        with registry.lock:
+            registry.in_flight += 1
+        return registry
+
+    def finish(self, registry, request, response, started):
+        duration = time.perf_counter() - started
+        with registry.lock:
+            registry.in_flight -= 1
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match else None) or 'unresolved'
+        status = response.status_code if response is not None else 500
+        registry.observe('idra_http_request_duration_seconds',
+                         (('view', view), ('method', request.method)), duration)
+        registry.inc('idra_http_responses_total', (('view', view), ('status', str(status))))
+        # Query counts come from core.instrumentation when it is enabled
+        request_metrics = getattr(request, 'request_metrics', None)
+        if request_metrics is not None:
+            registry.inc('idra_db_queries_total', (('view', view),), request_metrics.queries)
+            registry.inc('idra_db_query_duration_seconds_total', (('view', view),), request_metrics.db_time)
+        registry.flush()
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _merge(total, snapshot):
+    for name, labels, value in snapshot['counters']:
+        key = (name, tuple(map(tuple, labels)))
+        total['counters'][key] = total['counters'].get(key, 0) + value
+    for name, labels, values in snapshot['histograms']:
+        key = (name, tuple(map(tuple, labels)))
+        current = total['histograms'].setdefault(key, [0] * len(values))
+        for index, value in enumerate(values):
+            current[index] += value
+
+
+def _archive_dead(directory):
+    """Fold snapshots of exited processes into the archive file"""
+    with open(directory / '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive_path = directory / 'metrics-archive.json'
+        dead = []
+        for path in directory.glob(f'metrics-{glob.escape(HOST)}-*-*.json'):
+            host, pid, _ = path.stem[len('metrics-'):].rsplit('-', 2)
+            if host == HOST and not _alive(int(pid)):
+                dead.append(path)
+        if not dead:
+            return
+        archive = {'counters': {}, 'histograms': {}}
+        if archive_path.exists():
+            _merge(archive, json.loads(archive_path.read_text()))
+        for path in dead:
+            try:
+                _merge(archive, json.loads(path.read_text()))
+            except (OSError, ValueError):
+                continue
+        temporary = archive_path.with_suffix('.tmp')
+        temporary.write_text(json.dumps({
+            'counters': [[name, labels, value] for (name, labels), value in archive['counters'].items()],
+            'histograms': [[name, labels, values] for (name, labels), values in archive['histograms'].items()],
+        }))
+        os.replace(temporary, archive_path)
+        for path in dead:
+            path.unlink(missing_ok=True)
+
+
+def collect_process_metrics():
+    """Counters, histograms and in-flight requests summed over all worker processes"""
+    registry = get_registry()
+    total = {'counters': {}, 'histograms': {}, 'in_flight': 0}
+    directory = Path(settings.METRICS_DIR) if getattr(settings, 'METRICS_DIR', None) else None
+    if directory is None:
+        snapshot = registry.snapshot()
+        _merge(total, snapshot)
+        total['in_flight'] = snapshot['in_flight']
+        return total
+
+    registry.flush(force=True)
+    _archive_dead(directory)
+    for path in directory.glob('metrics-*.json'):
+        try:
+            snapshot = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue  # replaced or archived while we read it
+        _merge(total, snapshot)
+        total['in_flight'] += snapshot.get('in_flight', 0)
+    return total
+
+
+def grievance_metrics():
+    from grievances.models import Grievance
+    from grievances.stats import STATUSES, global_stats
+
+    now = timezone.now()
+    stats = global_stats()
+    open_grievances = Grievance.objects.exclude(status__in=CLOSED_STATUSES)
+    # Only rows inside the widest window can count, and both columns are indexed
+    oldest = now - max(WINDOWS.values())
+    recent = Grievance.objects.filter(Q(submitted_at__gte=oldest) | Q(resolved_at__gte=oldest))
+    windows = recent.aggregate(**{
+        f'{kind}_{window}': Count('id', filter=Q(**{f'{field}__gte': now - delta}))
+        for window, delta in WINDOWS.items()
+        for kind, field in (('submitted', 'submitted_at'), ('resolved', 'resolved_at'))
+    })
+    sla = open_grievances.filter(sla_deadline__lt=now + timedelta(days=1)).values('priority').annotate(
+        breached=Count('id', filter=Q(sla_deadline__lt=now)),
+        due=Count('id', filter=Q(sla_deadline__gte=now)),
+    )
+    return {
+        'by_status': {status: stats.count(status) for status in dict.fromkeys(STATUSES)},
+        'windows': windows,
+        'sla': {row['priority']: (row['breached'], row['due']) for row in sla},
+    }
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    from grievances.models import Grievance
+
+    process = collect_process_metrics()
+    grievances = get_or_compute('grievance_metrics', grievance_metrics)
+
+    samples = defaultdict(list)
+    for (name, labels), value in sorted(process['counters'].items()):
+        samples[name].append((name, labels, value))
+    for (name, labels), values in sorted(process['histograms'].items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), values):
+            cumulative += count
+            samples[name].append((f'{name}_bucket', labels + (('le', str(bound)),), cumulative))
+        samples[name].append((f'{name}_sum', labels, values[-1]))
+        samples[name].append((f'{name}_count', labels, cumulative))
+    samples['idra_http_requests_in_flight'].append(('idra_http_requests_in_flight', (), process['in_flight']))
+
+    cache = defaultdict(dict)
+    for (name, labels), value in process['counters'].items():
+        if name == 'idra_cache_requests_total':
+            labels = dict(labels)
+            cache[labels['endpoint']][labels['outcome']] = value
+    for endpoint, outcomes in sorted(cache.items()):
+        lookups = sum(outcomes.values())
+        if lookups:
+            served = outcomes.get('hits', 0) + outcomes.get('stale', 0)
+            samples['idra_cache_hit_ratio'].append(
+                ('idra_cache_hit_ratio', (('endpoint', endpoint),), round(served / lookups, 4)))
+
+    for status, count in grievances['by_status'].items():
+        samples['idra_grievances'].append(('idra_grievances', (('status', status),), count))
+    for window in WINDOWS:
+        samples['idra_grievance_submissions'].append(
+            ('idra_grievance_submissions', (('window', window),), grievances['windows'][f'submitted_{window}']))
+        samples['idra_grievance_resolutions'].append(
+            ('idra_grievance_resolutions', (('window', window),), grievances['windows'][f'resolved_{window}']))
+    for priority, _ in Grievance.PRIORITY_CHOICES:
+        breached, due = grievances['sla'].get(priority, (0, 0))
+        samples['idra_grievances_sla_breached'].append(
+            ('idra_grievances_sla_breached', (('priority', priority),), breached))
+        samples['idra_grievances_sla_due_24h'].append(
+            ('idra_grievances_sla_due_24h', (('priority', priority),), due))
+
+    lines = []
+    for name, (kind, description) in HELP.items():
+        if name not in samples:
+            continue
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(f'{sample}{_labels(labels)} {_number(value)}' for sample, labels, value in samples[name])
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,80 @@
+"""
+Queryset shaping driven by DRF serializer trees.
+
+``plan_queryset`` walks a serializer class and applies the ``select_related``,
+``prefetch_related`` and annotations needed to render it, so list and detail
+endpoints run a fixed number of queries regardless of page size.
+
+Serializers may declare ``Meta.annotations`` (a dict of alias -> expression)
+for computed values such as per-company grievance counts. A nested serializer
+with annotations is loaded through a ``Prefetch`` with an annotated queryset
+instead of a join, since annotations cannot ride along ``select_related``.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+def plan_queryset(queryset, serializer_class):
+    """Return ``queryset`` eager-loaded for rendering with ``serializer_class``"""
+    select_related, prefetch_related = [], []
+    _collect(serializer_class(), queryset.model, '', select_related, prefetch_related)
+
+    annotations = get_annotations(serializer_class)
+    if annotations:
+        queryset = queryset.annotate(**annotations)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    return queryset
+
+
+def get_annotations(serializer_class):
+    """Annotations declared on a serializer's Meta, if any"""
+    meta = getattr(serializer_class, 'Meta', None)
+    return dict(getattr(meta, 'annotations', {}))
+
+
+def _relation(model, source):
+    """Resolve a serializer source to a relation field on ``model``, or None"""
+    if not source or source == '*' or '.' in source:
+        return None
+    try:
+        field = model._meta.get_field(source)
+    except FieldDoesNotExist:
+        return None
+    return field if field.is_relation else None
+
+
+def _nested_queryset(serializer):
+    model = serializer.Meta.model
+    return plan_queryset(model._default_manager.all(), type(serializer))
+
+
+def _collect(serializer, model, prefix, select_related, prefetch_related):
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+
+        relation = _relation(model, field.source)
+        if relation is None:
+            continue
+        path = prefix + field.source
+
+        if isinstance(field, serializers.ListSerializer):
+            prefetch_related.append(Prefetch(path, queryset=_nested_queryset(field.child)))
+        elif isinstance(field, serializers.BaseSerializer):
+            if get_annotations(type(field)):
+                prefetch_related.append(Prefetch(path, queryset=_nested_queryset(field)))
+            else:
+                select_related.append(path)
+                _collect(field, relation.related_model, path + '__',
+                         select_related, prefetch_related)
+        elif isinstance(field, serializers.ManyRelatedField):
+            prefetch_related.append(path)
+        elif isinstance(field, serializers.RelatedField):
+            # PrimaryKeyRelatedField reads the local ``<name>_id`` column
+            if not isinstance(field, serializers.PrimaryKeyRelatedField):
+                select_related.append(path)
+
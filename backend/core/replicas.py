@@ -0,0 +1,266 @@
+"""
+Read-replica routing.
+
+Heavy reads that can tolerate a little staleness (analytics, landing page
+statistics, the company listing, exports) are designated with
+``@replica_reads`` or by binding a queryset with ``.using(read_alias())``.
+Everything else, and every write, stays on the primary.
+
+* Replicas are the aliases listed in ``DATABASE_REPLICAS``. Each is checked
+  for replication lag every ``REPLICA_LAG_CHECK_INTERVAL`` seconds per
+  process, by a background thread when ``REPLICA_MONITOR`` is on, so a
+  replica that is slow to answer never holds up a request. Without the
+  monitor the check runs inline, at most once per interval. Replica
+  connections give up after ``REPLICA_CONNECT_TIMEOUT`` seconds either way. A replica lagging more than
+  ``REPLICA_MAX_LAG_SECONDS``, or one that cannot be reached, is skipped
+  until a later check passes. With no healthy replica, reads fall back to
+  the primary.
+* Read-your-writes: a request that writes, or uses an unsafe method, sets a
+  short-lived cookie. While it is present, that client's designated reads
+  use the primary for ``REPLICA_STICKY_SECONDS``. So after
+  ``grievance_create`` redirects, the next pages see the new grievance.
+* Sessions and accounts are always read from the primary, so a fresh login
+  is never lost to replica lag.
+* Cache fills (``core.cache``) read the primary. A value read from a lagging
+  replica would otherwise be cached under the new version of its namespaces
+  and served, stale, until its TTL ran out.
+"""
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+STICKY_COOKIE = 'primary_reads'
+PRIMARY_ONLY_APPS = {'sessions', 'accounts', 'auth', 'contenttypes', 'admin'}
+
+LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+class RoutingState:
+    __slots__ = ('replica', 'pinned', 'wrote')
+
+    def __init__(self, pinned=False):
+        self.replica = False
+        self.pinned = pinned
+        self.wrote = False
+
+
+_state = contextvars.ContextVar('replica_routing', default=None)
+_health = {}
+_health_lock = threading.Lock()
+_monitor_pid = None
+
+
+def replication_lag(alias):
+    """Seconds ``alias`` is behind its primary (0 for databases without replication)"""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute(LAG_SQL)
+        return float(cursor.fetchone()[0])
+
+
+def _check(alias, now):
+    try:
+        lag = replication_lag(alias)
+        healthy = lag <= getattr(settings, 'REPLICA_MAX_LAG_SECONDS', 5)
+        if not healthy:
+            logger.warning('Replica %s is %.1fs behind; reading from the primary', alias, lag)
+    except DatabaseError:
+        logger.warning('Replica %s is unreachable; reading from the primary', alias, exc_info=True)
+        healthy = False
+    with _health_lock:
+        _health[alias] = (now, healthy)
+    return healthy
+
+
+def _monitor():
+    global _monitor_pid
+    while getattr(settings, 'REPLICA_MONITOR', False):
+        for alias in getattr(settings, 'DATABASE_REPLICAS', ()):
+            try:
+                _check(alias, time.monotonic())
+            finally:
+                # A fresh connection each round, so a dead one is not reused
+                connections[alias].close()
+        time.sleep(getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 5))
+    with _health_lock:
+        _monitor_pid = None
+
+
+def _start_monitor():
+    global _monitor_pid
+    with _health_lock:
+        # A forked worker needs a monitor of its own
+        if _monitor_pid == os.getpid():
+            return
+        _monitor_pid = os.getpid()
+    threading.Thread(target=_monitor, name='replica-monitor', daemon=True).start()
+
+
+def _healthy(alias):
+    if getattr(settings, 'REPLICA_MONITOR', False):
+        # Checked off the request path; until the first check, use the primary
+        _start_monitor()
+        with _health_lock:
+            return _health.get(alias, (None, False))[1]
+
+    now = time.monotonic()
+    with _health_lock:
+        checked_at, healthy = _health.get(alias, (None, False))
+        if checked_at is not None and now - checked_at < getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 5):
+            return healthy
+        # Others keep the previous verdict while this thread checks
+        _health[alias] = (now, healthy)
+    return _check(alias, now)
+
+
+def reset_replica_health():
+    with _health_lock:
+        _health.clear()
+
+
+def replica_status():
+    """``{alias: healthy}`` as of the last check in this process"""
+    with _health_lock:
+        return {alias: healthy for alias, (_, healthy) in _health.items()}
+
+
+def read_alias():
+    """A healthy replica for a designated read, or the primary"""
+    state = _state.get()
+    if state is not None and (state.pinned or state.wrote):
+        return DEFAULT_DB_ALIAS
+    replicas = [alias for alias in getattr(settings, 'DATABASE_REPLICAS', ()) if _healthy(alias)]
+    return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+
+def _route_reads(function, replica):
+    def enter():
+        state = _state.get()
+        if state is None:
+            state = RoutingState()
+            return state, _state.set(state), state.replica
+        previous = state.replica
+        return state, None, previous
+
+    def leave(state, token, previous):
+        state.replica = previous
+        if token is not None:
+            _state.reset(token)
+
+    if iscoroutinefunction(function):
+        @wraps(function)
+        async def async_wrapper(*args, **kwargs):
+            state, token, previous = enter()
+            state.replica = replica
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                leave(state, token, previous)
+        return async_wrapper
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        state, token, previous = enter()
+        state.replica = replica
+        try:
+            return function(*args, **kwargs)
+        finally:
+            leave(state, token, previous)
+    return wrapper
+
+
+def replica_reads(function):
+    """Send the ORM reads made inside ``function`` (sync or async) to a replica"""
+    return _route_reads(function, True)
+
+
+def primary_reads(function):
+    """Keep the ORM reads made inside ``function`` on the primary, even within ``replica_reads``"""
+    return _route_reads(function, False)
+
+
+class ReplicaRouter:
+    """Routes designated reads to replicas; everything else uses the default alias"""
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.replica or model._meta.app_label in PRIMARY_ONLY_APPS:
+            return None
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas get their schema through replication
+        if db in getattr(settings, 'DATABASE_REPLICAS', ()):
+            return False
+        return None
+
+
+class ReplicaStickinessMiddleware:
+    """Pins a client's designated reads to the primary for a while after it writes"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        state, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(request, response, state)
+
+    def start(self, request):
+        unsafe = request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+        state = RoutingState(pinned=unsafe or STICKY_COOKIE in request.COOKIES)
+        return state, _state.set(state)
+
+    def finish(self, request, response, state):
+        if state.wrote or request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE'):
+            response.set_cookie(
+                STICKY_COOKIE, '1', max_age=getattr(settings, 'REPLICA_STICKY_SECONDS', 10),
+                httponly=True, samesite='Lax', secure=request.is_secure(),
+            )
+        return response
@@ -0,0 +1,134 @@
+"""
+Storage for grievance documents.
+
+Files are written once, under keys chosen by the caller (content hashes, see
+``grievances.uploads``), and arrive in parts that are streamed straight to
+storage. The interface follows S3 multipart uploads so that an
+S3-compatible backend can take the place of the local one:
+
+``start()``
+    Begin an upload and return its id.
+``write_part(upload_id, number, chunks)``
+    Stream a candidate for part ``number`` from the iterable of byte strings
+    ``chunks``. Returns ``(token, bytes written)``. Candidates never touch
+    the parts already accepted, so several requests may write the same part
+    at once.
+``accept_part(upload_id, number, token)``
+    Make the candidate ``token`` part ``number``, replacing any earlier one.
+``discard_part(upload_id, number, token)``
+    Drop a candidate that was not accepted.
+``complete(upload_id, key, parts)``
+    Store parts 1 to ``parts``, in order, as ``key``. Returns False, and
+    stores nothing, if ``key`` already exists. The parts are kept.
+``abort(upload_id)``
+    Discard the parts, once the upload is finished or abandoned.
+
+Stored files are read with ``open(key)``, described by ``stat(key)`` and
+removed with ``delete(key)``. ``DOCUMENT_STORAGE`` is the dotted path of the
+backend class. The default, ``LocalStorage``, keeps files under
+``DOCUMENT_ROOT``.
+"""
+import os
+import shutil
+import uuid
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+COPY_SIZE = 1024 * 1024
+
+
+class LocalStorage:
+    """Documents on the local filesystem, with uploads staged beside them"""
+
+    def __init__(self, root=None):
+        self.root = os.path.abspath(root or settings.DOCUMENT_ROOT)
+        self.staging = os.path.join(self.root, 'uploads')
+        self.objects = os.path.join(self.root, 'objects')
+
+    def path(self, key):
+        path = os.path.abspath(os.path.join(self.objects, key))
+        if not path.startswith(self.objects + os.sep):
+            raise ValueError(f'Invalid storage key {key!r}')
+        return path
+
+    def _staged(self, upload_id):
+        return os.path.join(self.staging, str(uuid.UUID(str(upload_id))))
+
+    def _part(self, upload_id, number, token=None):
+        return os.path.join(self._staged(upload_id), f'{number}.{token}' if token else str(number))
+
+    def start(self):
+        upload_id = uuid.uuid4().hex
+        os.makedirs(self._staged(upload_id))
+        return upload_id
+
+    def write_part(self, upload_id, number, chunks):
+        token = uuid.uuid4().hex
+        written = 0
+        with open(self._part(upload_id, number, token), 'xb') as part:
+            for chunk in chunks:
+                part.write(chunk)
+                written += len(chunk)
+        return token, written
+
+    def accept_part(self, upload_id, number, token):
+        os.replace(self._part(upload_id, number, token), self._part(upload_id, number))
+
+    def discard_part(self, upload_id, number, token):
+        try:
+            os.unlink(self._part(upload_id, number, token))
+        except FileNotFoundError:
+            pass
+
+    def complete(self, upload_id, key, parts):
+        path = self.path(key)
+        if os.path.exists(path):
+            return False
+        if parts == 1:
+            assembled = self._part(upload_id, 1)
+        else:
+            assembled = os.path.join(self._staged(upload_id), f'assembled.{uuid.uuid4().hex}')
+        try:
+            if parts > 1:
+                with open(assembled, 'xb') as output:
+                    for number in range(1, parts + 1):
+                        with open(self._part(upload_id, number), 'rb') as part:
+                            shutil.copyfileobj(part, output, COPY_SIZE)
+            with open(assembled, 'rb') as handle:
+                os.fsync(handle.fileno())
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                # A link never replaces an existing file, so concurrent uploads
+                # of the same content keep whichever finished first
+                os.link(assembled, path)
+            except FileExistsError:
+                return False
+            return True
+        finally:
+            if parts > 1 and os.path.exists(assembled):
+                os.unlink(assembled)
+
+    def abort(self, upload_id):
+        shutil.rmtree(self._staged(upload_id), ignore_errors=True)
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def stat(self, key):
+        """``(size, mtime)`` of a stored file, the mtime in whole seconds since the epoch"""
+        result = os.stat(self.path(key))
+        return result.st_size, int(result.st_mtime)
+
+    def open(self, key):
+        return open(self.path(key), 'rb')
+
+    def delete(self, key):
+        try:
+            os.unlink(self.path(key))
+        except FileNotFoundError:
+            pass
+
+
+def get_storage():
+    return import_string(getattr(settings, 'DOCUMENT_STORAGE', 'core.storage.LocalStorage'))()
@@ -0,0 +1,37 @@
+"""
+Streaming responses under both server modes.
+
+Django 4.2's ASGI handler reads a synchronous ``StreamingHttpResponse``
+iterator to the end on a worker thread before sending anything, and its
+WSGI handler does the same with an asynchronous one. ``streaming_content``
+hands each server the kind of iterator it streams: the iterator unchanged
+under WSGI, and under ASGI an asynchronous one that produces each chunk on
+the request's thread (``sync_to_async``), so database cursors opened by the
+iterator stay on the connection they were opened on.
+"""
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+
+_DONE = object()
+
+
+def is_asgi(request):
+    """Whether ``request`` (a Django or DRF request) is served by the ASGI handler"""
+    return isinstance(getattr(request, '_request', request), ASGIRequest)
+
+
+async def aiterate(chunks):
+    """Chunks of the synchronous iterable ``chunks``, each produced with ``sync_to_async``"""
+    iterator = iter(chunks)
+    produce = sync_to_async(next)
+    try:
+        while (chunk := await produce(iterator, _DONE)) is not _DONE:
+            yield chunk
+    finally:
+        if hasattr(iterator, 'close'):
+            await sync_to_async(iterator.close)()
+
+
+def streaming_content(request, chunks):
+    """``chunks`` in the form the server handling ``request`` streams without buffering"""
+    return aiterate(chunks) if is_asgi(request) else chunks
@@ -0,0 +1,401 @@
+"""
+Background jobs for the slow side effects of request handlers.
+
+A function decorated with ``@task`` runs in a ``run_task_worker`` process
+instead of the request: ``notify_status_change.enqueue(grievance.pk, ...)``
+returns at once, so the handler commits and responds without waiting for
+the email to go out. Arguments must be JSON-serialisable, so pass primary
+keys rather than model instances. Tasks live in each app's ``tasks.py``.
+
+Two backends, chosen with ``TASK_BACKEND``:
+
+``redis``
+    Per-queue lists and sorted sets in ``REDIS_URL``. This is the default
+    when ``REDIS_URL`` is set. A job is pushed only once the surrounding
+    transaction commits, so no worker sees a job for a rolled-back change.
+``database``
+    ``BackgroundJob`` rows, claimed with ``SELECT ... FOR UPDATE SKIP
+    LOCKED``. The row is written in the handler's own transaction, so it
+    commits or rolls back with the change that caused it.
+
+Delivery is at least once. A claimed job is leased for
+``TASK_LEASE_SECONDS``, and if its worker dies it is handed out again when
+the lease runs out, unless that was its last attempt, in which case it is
+marked failed. A job that raises is retried after an exponential,
+jittered backoff: ``TASK_BACKOFF_SECONDS`` doubled per attempt, capped at
+``TASK_MAX_BACKOFF_SECONDS``. It is retried until it has run
+``max_attempts`` times. Enqueuing with ``key=`` makes the job idempotent: a
+later job with the same key is dropped while the first is remembered
+(``TASK_RETENTION_HOURS``). The Redis backend reserves the key when the
+job is enqueued, so derive keys from rows the transaction creates: a key
+reserved by a transaction that rolls back stays reserved.
+
+A worker runs as many threads per queue as ``TASK_QUEUES`` gives it, so a
+slow mail server cannot hold up other queues.
+"""
+import functools
+import json
+import logging
+import random
+import threading
+import time
+import traceback
+import uuid
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+LEASE_EXPIRED = 'The lease of the last attempt expired'
+
+_tasks = {}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class Task:
+    """A function that can be run later by a worker"""
+
+    def __init__(self, function, queue, max_attempts):
+        functools.update_wrapper(self, function)
+        self.function = function
+        self.name = f'{function.__module__}.{function.__qualname__}'
+        self.queue = queue
+        self.max_attempts = max_attempts
+
+    def __call__(self, *args, **kwargs):
+        return self.function(*args, **kwargs)
+
+    def enqueue(self, *args, key=None, delay=0, **kwargs):
+        """Run later with these arguments; False if a job with ``key`` already exists"""
+        return get_backend().enqueue(self, list(args), kwargs, key=key, delay=delay)
+
+
+def task(function=None, *, queue='default', max_attempts=5):
+    """Register ``function`` as a background task on ``queue``"""
+    def decorator(function):
+        registered = Task(function, queue, max_attempts)
+        _tasks[registered.name] = registered
+        return registered
+    return decorator(function) if function is not None else decorator
+
+
+def backoff(attempt):
+    """Seconds to wait before retrying a job that has failed ``attempt`` times"""
+    delay = min(_setting('TASK_BACKOFF_SECONDS', 5) * 2 ** (attempt - 1),
+                _setting('TASK_MAX_BACKOFF_SECONDS', 3600))
+    return delay * random.uniform(0.5, 1.0)
+
+
+@dataclass
+class Job:
+    """A job claimed by a worker"""
+
+    id: object
+    queue: str
+    task: str
+    args: list
+    kwargs: dict
+    attempts: int
+    max_attempts: int
+    raw: object = field(default=None, repr=False)
+
+
+class DatabaseBackend:
+    """``BackgroundJob`` rows claimed with SKIP LOCKED"""
+
+    def enqueue(self, task, args, kwargs, key=None, delay=0):
+        from grievances.models import BackgroundJob
+
+        job = BackgroundJob(
+            queue=task.queue, task=task.name, args=args, kwargs=kwargs, idempotency_key=key,
+            max_attempts=task.max_attempts, run_at=timezone.now() + timedelta(seconds=delay),
+        )
+        if key is None:
+            job.save()
+            return True
+        try:
+            with transaction.atomic():
+                job.save()
+        except IntegrityError:
+            return False
+        return True
+
+    def claim(self, queue, limit=1):
+        from grievances.models import BackgroundJob
+
+        now = timezone.now()
+        with transaction.atomic():
+            # A running job's run_at is when its lease expires
+            rows = list(
+                BackgroundJob.objects.filter(queue=queue, status__in=(QUEUED, RUNNING), run_at__lte=now)
+                .order_by('run_at').select_for_update(skip_locked=True)[:limit]
+            )
+            if not rows:
+                return []
+            # The lease of a job's last attempt ran out: its worker died
+            exhausted = [row.pk for row in rows if row.status == RUNNING and row.attempts >= row.max_attempts]
+            if exhausted:
+                BackgroundJob.objects.filter(pk__in=exhausted).update(
+                    status=FAILED, finished_at=now, last_error=LEASE_EXPIRED,
+                )
+            rows = [row for row in rows if row.pk not in exhausted]
+            BackgroundJob.objects.filter(pk__in=[row.pk for row in rows]).update(
+                status=RUNNING, attempts=F('attempts') + 1,
+                run_at=now + timedelta(seconds=_setting('TASK_LEASE_SECONDS', 300)),
+            )
+        return [Job(row.pk, row.queue, row.task, row.args, row.kwargs, row.attempts + 1, row.max_attempts)
+                for row in rows]
+
+    def _finish(self, job, **fields):
+        from grievances.models import BackgroundJob
+        BackgroundJob.objects.filter(pk=job.id).update(**fields)
+
+    def complete(self, job):
+        self._finish(job, status=DONE, finished_at=timezone.now())
+
+    def retry(self, job, delay, error):
+        self._finish(job, status=QUEUED, run_at=timezone.now() + timedelta(seconds=delay), last_error=error)
+
+    def fail(self, job, error):
+        self._finish(job, status=FAILED, finished_at=timezone.now(), last_error=error)
+
+    def purge(self):
+        from grievances.models import BackgroundJob
+
+        before = timezone.now() - timedelta(hours=_setting('TASK_RETENTION_HOURS', 72))
+        deleted, _ = BackgroundJob.objects.filter(status__in=(DONE, FAILED), finished_at__lt=before).delete()
+        return deleted
+
+
+# Moves due and lease-expired jobs to the ready list (lease-expired jobs
+# that were on their last attempt to the failed list instead), then leases
+# up to ARGV[3] of them. KEYS: ready, scheduled, running, failed;
+# ARGV: now, lease end, limit, lease expired error
+CLAIM_SCRIPT = """
+for _, job in ipairs(redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1], 'LIMIT', 0, 100)) do
+    redis.call('ZREM', KEYS[2], job)
+    redis.call('LPUSH', KEYS[1], job)
+end
+for _, job in ipairs(redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', ARGV[1], 'LIMIT', 0, 100)) do
+    redis.call('ZREM', KEYS[3], job)
+    local data = cjson.decode(job)
+    if data['attempts'] >= data['max_attempts'] then
+        data['error'] = ARGV[4]
+        redis.call('LPUSH', KEYS[4], cjson.encode(data))
+        redis.call('LTRIM', KEYS[4], 0, 999)
+    else
+        redis.call('LPUSH', KEYS[1], job)
+    end
+end
+local claimed = {}
+for _ = 1, tonumber(ARGV[3]) do
+    local job = redis.call('RPOP', KEYS[1])
+    if not job then break end
+    local data = cjson.decode(job)
+    data['attempts'] = data['attempts'] + 1
+    job = cjson.encode(data)
+    redis.call('ZADD', KEYS[3], ARGV[2], job)
+    table.insert(claimed, job)
+end
+return claimed
+"""
+
+
+class RedisBackend:
+    """Per-queue ready lists plus scheduled and running sorted sets in Redis"""
+
+    def __init__(self, url=None, prefix='tasks'):
+        import redis
+
+        self.client = redis.Redis.from_url(url or settings.REDIS_URL)
+        self.prefix = prefix
+        self.claim_script = self.client.register_script(CLAIM_SCRIPT)
+
+    def keys(self, queue):
+        return [f'{self.prefix}:{queue}:ready', f'{self.prefix}:{queue}:scheduled',
+                f'{self.prefix}:{queue}:running']
+
+    def enqueue(self, task, args, kwargs, key=None, delay=0):
+        payload = json.dumps({
+            'id': uuid.uuid4().hex, 'queue': task.queue, 'task': task.name, 'args': args,
+            'kwargs': kwargs, 'attempts': 0, 'max_attempts': task.max_attempts,
+        })
+        ready, scheduled, _ = self.keys(task.queue)
+        if key is not None and not self.client.set(
+                f'{self.prefix}:key:{key}', 1, nx=True,
+                ex=int(_setting('TASK_RETENTION_HOURS', 72) * 3600)):
+            return False
+
+        def push():
+            if delay:
+                self.client.zadd(scheduled, {payload: time.time() + delay})
+            else:
+                self.client.lpush(ready, payload)
+
+        transaction.on_commit(push)
+        return True
+
+    def claim(self, queue, limit=1):
+        now = time.time()
+        raw_jobs = self.claim_script(keys=self.keys(queue) + [f'{self.prefix}:failed'],
+                                     args=[now, now + _setting('TASK_LEASE_SECONDS', 300), limit, LEASE_EXPIRED])
+        jobs = []
+        for raw in raw_jobs:
+            data = json.loads(raw)
+            # An empty Lua table encodes as {}
+            args = data['args'] if isinstance(data['args'], list) else []
+            jobs.append(Job(data['id'], data['queue'], data['task'], args, data['kwargs'] or {},
+                            data['attempts'], data['max_attempts'], raw))
+        return jobs
+
+    def complete(self, job):
+        self.client.zrem(self.keys(job.queue)[2], job.raw)
+
+    def retry(self, job, delay, error):
+        _, scheduled, running = self.keys(job.queue)
+        pipeline = self.client.pipeline()
+        pipeline.zrem(running, job.raw)
+        pipeline.zadd(scheduled, {job.raw: time.time() + delay})
+        pipeline.execute()
+
+    def fail(self, job, error):
+        failed = f'{self.prefix}:failed'
+        pipeline = self.client.pipeline()
+        pipeline.zrem(self.keys(job.queue)[2], job.raw)
+        pipeline.lpush(failed, json.dumps({**json.loads(job.raw), 'error': error}))
+        pipeline.ltrim(failed, 0, 999)
+        pipeline.execute()
+
+    def purge(self):
+        # Idempotency keys expire on their own
+        return 0
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if _setting('TASK_BACKEND', 'database') == 'redis':
+                _backend = RedisBackend()
+            else:
+                _backend = DatabaseBackend()
+        return _backend
+
+
+def reset_backend():
+    global _backend
+    with _backend_lock:
+        _backend = None
+
+
+def run_job(backend, job):
+    """Run one claimed job, then complete it, schedule a retry or give up"""
+    from core.metrics import get_registry
+
+    registered = _tasks.get(job.task)
+    started = time.perf_counter()
+    try:
+        if registered is None:
+            raise LookupError(f'No task named {job.task}')
+        registered.function(*job.args, **job.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        if registered is not None and job.attempts < job.max_attempts:
+            delay = backoff(job.attempts)
+            logger.warning('Task %s failed (attempt %d/%d); retrying in %.0fs',
+                           job.task, job.attempts, job.max_attempts, delay, exc_info=True)
+            backend.retry(job, delay, error)
+            outcome = 'retried'
+        else:
+            logger.error('Task %s failed after %d attempts', job.task, job.attempts, exc_info=True)
+            backend.fail(job, error)
+            outcome = 'failed'
+    else:
+        backend.complete(job)
+        outcome = 'done'
+    registry = get_registry()
+    registry.inc('idra_tasks_total', (('queue', job.queue), ('outcome', outcome)))
+    registry.observe('idra_task_duration_seconds', (('task', job.task),), time.perf_counter() - started)
+    return outcome
+
+
+def queue_concurrency():
+    return dict(_setting('TASK_QUEUES', {'default': 1}))
+
+
+class Worker:
+    """Runs jobs from each queue in that queue's number of threads"""
+
+    def __init__(self, queues=None, backend=None):
+        autodiscover_modules('tasks')
+        self.queues = queues or queue_concurrency()
+        self.backend = backend or get_backend()
+        self.stopping = threading.Event()
+
+    def run_burst(self):
+        """Run every job that is due in this thread, then return how many ran"""
+        ran = 0
+        while True:
+            jobs = [job for queue in self.queues for job in self.backend.claim(queue, limit=100)]
+            if not jobs:
+                return ran
+            for job in jobs:
+                run_job(self.backend, job)
+                ran += 1
+
+    def consume(self, queue):
+        poll = _setting('TASK_POLL_INTERVAL', 1.0)
+        while not self.stopping.is_set():
+            try:
+                jobs = self.backend.claim(queue)
+                for job in jobs:
+                    run_job(self.backend, job)
+            except Exception:
+                logger.exception('Worker for queue %s could not claim jobs', queue)
+                jobs = None
+            finally:
+                close_old_connections()
+            if not jobs:
+                self.stopping.wait(poll)
+
+    def run(self):
+        from core.metrics import get_registry
+
+        threads = [
+            threading.Thread(target=self.consume, args=(queue,), name=f'task-{queue}-{number}', daemon=True)
+            for queue, concurrency in self.queues.items()
+            for number in range(concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        purge_at = time.monotonic()
+        while not self.stopping.wait(_setting('METRICS_FLUSH_INTERVAL', 1.0)):
+            get_registry().flush()
+            if time.monotonic() >= purge_at:
+                purge_at = time.monotonic() + 3600
+                try:
+                    self.backend.purge()
+                except Exception:
+                    logger.exception('Could not purge finished jobs')
+                finally:
+                    close_old_connections()
+        for thread in threads:
+            thread.join()
+        get_registry().flush(force=True)
+
+    def stop(self):
+        self.stopping.set()
@@ -1,21 +1,42 @@
+import hmac
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
 from django.shortcuts import render
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
 from django.contrib.auth.decorators import login_required
 from django.db.models import Count, Q
 from grievances.models import Grievance
+from grievances.stats import aglobal_stats, company_stats, global_stats, user_stats
 from companies.models import InsuranceCompany
 from accounts.models import UserProfile
+from .audit import audit_stats
+from .cache import aget_or_compute, cache_stats
+from .instrumentation import request_metrics
+from .metrics import render as render_metrics
+from .replicas import replica_reads
 
 
-def landing_page(request):
-    """Landing page with system overview statistics."""
-    stats = {
-        'total_grievances': Grievance.objects.count(),
-        'resolved_grievances': Grievance.objects.filter(status='resolved').count(),
-        'total_companies': InsuranceCompany.objects.filter(is_active=True).count(),
-        'total_users': UserProfile.objects.count(),
+async def landing_stats():
+    grievance_stats = await aglobal_stats()
+    return {
+        'total_grievances': grievance_stats.total,
+        'resolved_grievances': grievance_stats.count('resolved'),
+        'total_companies': await InsuranceCompany.objects.filter(is_active=True).acount(),
+        'total_users': await UserProfile.objects.acount(),
     }
+
+
+@replica_reads
+async def landing_page(request):
+    """Landing page with system overview statistics."""
+    stats = await aget_or_compute('landing', landing_stats, depends_on=('grievances', 'companies'))
     
-    return render(request, 'landing.html', {'stats': stats})
+    # Context processors load the session user synchronously
+    return await sync_to_async(render)(request, 'landing.html', {'stats': stats})
 
 
 @login_required
@@ -31,34 +52,37 @@ def dashboard(request):
     if user_profile.role == 'policyholder':
         # Policyholder sees only their grievances
         user_grievances = Grievance.objects.filter(submitted_by=request.user)
+        grievance_stats = user_stats(request.user)
         stats = {
-            'total_grievances': user_grievances.count(),
-            'submitted': user_grievances.filter(status='submitted').count(),
-            'under_review': user_grievances.filter(status='under_review').count(),
-            'resolved': user_grievances.filter(status='resolved').count(),
+            'total_grievances': grievance_stats.total,
+            'submitted': grievance_stats.count('submitted'),
+            'under_review': grievance_stats.count('under_review'),
+            'resolved': grievance_stats.count('resolved'),
         }
         recent_grievances = user_grievances.order_by('-created_at')[:5]
         
     elif user_profile.role == 'insurance_company':
         # Insurance company sees grievances assigned to them
-        company_grievances = Grievance.objects.filter(insurance_company=user_profile.company)
+        company_grievances = Grievance.objects.filter(insurance_company_id=user_profile.company_id)
+        grievance_stats = company_stats(user_profile.company_id)
         stats = {
-            'total_grievances': company_grievances.count(),
-            'pending_action': company_grievances.filter(status__in=['submitted', 'under_review']).count(),
-            'in_progress': company_grievances.filter(status='in_progress').count(),
-            'resolved': company_grievances.filter(status='resolved').count(),
+            'total_grievances': grievance_stats.total,
+            'pending_action': grievance_stats.count('submitted', 'under_review'),
+            'in_progress': grievance_stats.count('in_progress'),
+            'resolved': grievance_stats.count('resolved'),
         }
         recent_grievances = company_grievances.order_by('-created_at')[:5]
         
     else:  # IDRA admin or super admin
         # Admin sees all grievances
         all_grievances = Grievance.objects.all()
+        grievance_stats = global_stats()
         stats = {
-            'total_grievances': all_grievances.count(),
-            'submitted': all_grievances.filter(status='submitted').count(),
-            'under_review': all_grievances.filter(status='under_review').count(),
-            'in_progress': all_grievances.filter(status='in_progress').count(),
-            'resolved': all_grievances.filter(status='resolved').count(),
+            'total_grievances': grievance_stats.total,
+            'submitted': grievance_stats.count('submitted'),
+            'under_review': grievance_stats.count('under_review'),
+            'in_progress': grievance_stats.count('in_progress'),
+            'resolved': grievance_stats.count('resolved'),
         }
         recent_grievances = all_grievances.order_by('-created_at')[:5]
     
@@ -68,4 +92,35 @@ def dashboard(request):
         'user_role': user_profile.role,
     }
     
-    return render(request, 'dashboard.html', context)
\ No newline at end of file
+    return render(request, 'dashboard.html', context)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats_view(request):
+    """Cache hit/miss counters for this worker process."""
+    return Response(cache_stats())
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def audit_stats_view(request):
+    """Audit writer queue depth, throughput and spill counters for this worker process."""
+    return Response(audit_stats())
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def request_metrics_view(request):
+    """Rolling per-URL latency histograms and query counts for this worker process."""
+    return Response(request_metrics())
+
+
+def metrics_view(request):
+    """Prometheus metrics for all worker processes; requires METRICS_TOKEN as a bearer token if set."""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(supplied.encode(), token.encode()):
+            return HttpResponse(status=401)
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
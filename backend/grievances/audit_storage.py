@@ -0,0 +1,318 @@
+"""
+Audit log storage: monthly partitions, archival and compliance lookups.
+
+On PostgreSQL ``grievances_auditlog`` is range-partitioned by month on
+``timestamp`` (migration 0008), with a default partition catching anything
+outside the created ranges. ``ensure_partitions`` creates upcoming months
+ahead of time so the default partition stays empty, and inserts and "recent
+activity" queries only ever touch the newest, small partitions however much
+history accumulates.
+
+Months older than ``AUDIT_HOT_MONTHS`` are archived: the partition is
+detached, its rows are streamed to a gzip JSON-lines file in
+``AUDIT_ARCHIVE_DIR`` and recorded in ``manifest.json`` (range, row count,
+SHA-256), then the detached table is dropped. On other databases the month's rows are deleted
+instead. ``audit_history`` reads the database and the archives together, so
+compliance lookups need not care where a month lives.
+
+The ``manage_audit_partitions`` command runs both steps and is meant to be
+scheduled daily.
+"""
+import gzip
+import hashlib
+import heapq
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import AuditLog
+
+TABLE = 'grievances_auditlog'
+MANIFEST = 'manifest.json'
+ARCHIVE_READ_SIZE = 2000
+COLUMNS = (
+    'id', 'user_id', 'action', 'model_name', 'object_id',
+    'details', 'ip_address', 'user_agent', 'timestamp',
+)
+
+
+def _month(year, month):
+    start = datetime(year, month, 1)
+    return timezone.make_aware(start) if settings.USE_TZ else start
+
+
+def month_start(moment):
+    """First instant of ``moment``'s month in the current time zone"""
+    moment = timezone.localtime(moment) if timezone.is_aware(moment) else moment
+    return _month(moment.year, moment.month)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return _month(index // 12, index % 12 + 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y_%m}'
+
+
+def archive_dir():
+    return Path(getattr(settings, 'AUDIT_ARCHIVE_DIR', 'audit-archive'))
+
+
+def is_partitioned(using='default'):
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass', [TABLE]
+        )
+        return cursor.fetchone() is not None
+
+
+def partitions(using='default'):
+    """Names of the monthly partitions that currently exist, oldest first"""
+    if not is_partitioned(using):
+        return []
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = %s::regclass AND child.relname LIKE %s
+            ORDER BY child.relname
+            """,
+            [TABLE, f'{TABLE}_p%'],
+        )
+        return [name for name, in cursor.fetchall()]
+
+
+def ensure_partitions(ahead=None, start=None, using='default'):
+    """
+    Create monthly partitions from ``start`` (default: this month) through
+    ``ahead`` months from now. Returns the names created.
+    """
+    if not is_partitioned(using):
+        return []
+    if ahead is None:
+        ahead = getattr(settings, 'AUDIT_PARTITIONS_AHEAD', 3)
+    month = month_start(start or timezone.now())
+    last = add_months(month_start(timezone.now()), ahead)
+    existing = set(partitions(using))
+    created = []
+    with connections[using].cursor() as cursor:
+        while month <= last:
+            name = partition_name(month)
+            if name not in existing:
+                cursor.execute(
+                    f'CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)',
+                    [month, add_months(month, 1)],
+                )
+                created.append(name)
+            month = add_months(month, 1)
+    return created
+
+
+def read_manifest():
+    path = archive_dir() / MANIFEST
+    if not path.exists():
+        return []
+    return json.loads(path.read_text())
+
+
+def _write_manifest(entries):
+    path = archive_dir() / MANIFEST
+    temporary = path.with_suffix('.tmp')
+    temporary.write_text(json.dumps(sorted(entries, key=lambda entry: entry['start']), indent=2))
+    os.replace(temporary, path)
+
+
+def _row(values):
+    row = dict(zip(COLUMNS, values))
+    if isinstance(row['details'], str):
+        row['details'] = json.loads(row['details'])
+    row['ip_address'] = str(row['ip_address'])
+    row['timestamp'] = row['timestamp'].isoformat()
+    return row
+
+
+def _detached(name, using='default'):
+    """Whether ``name`` was detached by an archive run that did not finish"""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [name])
+        return cursor.fetchone()[0]
+
+
+def _table_rows(name, using='default'):
+    """Rows of the detached partition ``name``, read through a server-side cursor"""
+    connection = connections[using]
+    with transaction.atomic(using=using), connection.chunked_cursor() as cursor:
+        cursor.execute(f'SELECT {", ".join(COLUMNS)} FROM {name} ORDER BY id')
+        while values := cursor.fetchmany(ARCHIVE_READ_SIZE):
+            yield from (_row(row) for row in values)
+
+
+def _archived_rows(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as archive:
+        for line in archive:
+            yield json.loads(line)
+
+
+def archive_month(month, using='default'):
+    """
+    Move one month of audit rows into a compressed archive file.
+
+    The month's partition is detached, and that committed, before anything
+    is read, so the live table is only locked for the detach. Rows are then
+    streamed from server-side cursors into the gzip file in id order, merged
+    with any earlier archive of the month (written in the same order). A row
+    already written has an id no greater than the last one, so duplicates
+    are skipped without keeping ids in memory.
+
+    Returns the manifest entry, or None when the month holds no rows and
+    has no partition.
+    """
+    start, end = month_start(month), add_months(month_start(month), 1)
+    name = partition_name(start)
+    connection = connections[using]
+
+    # Detach first so nothing new lands in the rows being archived; late
+    # events for this month go to the default partition
+    if name in partitions(using):
+        with connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+        has_partition = True
+    else:
+        has_partition = _detached(name, using)
+
+    remaining = AuditLog.objects.using(using).filter(timestamp__gte=start, timestamp__lt=end)
+    if not has_partition and not remaining.exists():
+        return None
+
+    directory = archive_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    filename = f'auditlog-{start:%Y-%m}.jsonl.gz'
+    previous = directory / filename
+    temporary = directory / f'{filename}.tmp'
+    digest = hashlib.sha256()
+    rows = 0
+    last_id = last_live_id = None
+
+    def live_rows():
+        nonlocal last_live_id
+        live = remaining.order_by('id').values_list(*COLUMNS)
+        for values in live.iterator(chunk_size=ARCHIVE_READ_SIZE):
+            row = _row(values)
+            last_live_id = row['id']
+            yield row
+
+    # Archiving a month twice (late events, or a run interrupted before the
+    # drop) keeps the earlier rows
+    sources = [_archived_rows(previous)] if previous.exists() else []
+    if has_partition:
+        sources.append(_table_rows(name, using))
+    sources.append(live_rows())
+    # One transaction, so committing one cursor does not close the others
+    with transaction.atomic(using=using), gzip.open(temporary, 'wt', encoding='utf-8') as archive:
+        for row in heapq.merge(*sources, key=lambda row: row['id']):
+            if last_id is not None and row['id'] <= last_id:
+                continue
+            line = json.dumps(row) + '\n'
+            archive.write(line)
+            digest.update(line.encode())
+            rows += 1
+            last_id = row['id']
+    os.replace(temporary, previous)
+
+    entry = {
+        'file': filename,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'rows': rows,
+        'sha256': digest.hexdigest(),
+        'archived_at': timezone.now().isoformat(),
+    }
+    _write_manifest([entry for entry in read_manifest() if entry['file'] != filename] + [entry])
+
+    # Only drop rows once the archive and manifest that hold them are written
+    if last_live_id is not None:
+        remaining.filter(id__lte=last_live_id).delete()
+    if has_partition:
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE {name}')
+    return entry
+
+
+def archive_before(cutoff, using='default'):
+    """Archive every month that ends on or before ``cutoff``"""
+    cutoff = month_start(cutoff)
+    months = {
+        month_start(day) for day in
+        AuditLog.objects.using(using).filter(timestamp__lt=cutoff).datetimes('timestamp', 'month')
+    }
+    for name in partitions(using):
+        year, number = name.rsplit('_p', 1)[1].split('_')
+        month = _month(int(year), int(number))
+        if month < cutoff:
+            months.add(month)
+    return [entry for entry in (archive_month(month, using) for month in sorted(months)) if entry]
+
+
+def hot_cutoff():
+    """Start of the oldest month kept in the database"""
+    return add_months(month_start(timezone.now()), -getattr(settings, 'AUDIT_HOT_MONTHS', 6))
+
+
+def audit_history(start, end, user=None, model_name=None, object_id=None, action=None, using='default'):
+    """
+    Audit events in ``[start, end)`` matching the filters, from the database
+    and from any archives covering the range, oldest first, as dicts.
+    """
+    filters = {'model_name': model_name, 'object_id': object_id, 'action': action,
+               'user_id': getattr(user, 'pk', user)}
+    filters = {key: value for key, value in filters.items() if value is not None}
+
+    queryset = AuditLog.objects.using(using).filter(timestamp__gte=start, timestamp__lt=end, **filters)
+    events = [_row(values) for values in queryset.values_list(*COLUMNS)]
+    seen = {event['id'] for event in events}
+
+    for entry in read_manifest():
+        if parse_datetime(entry['end']) <= start or parse_datetime(entry['start']) >= end:
+            continue
+        with gzip.open(archive_dir() / entry['file'], 'rt', encoding='utf-8') as archive:
+            for line in archive:
+                event = json.loads(line)
+                if event['id'] in seen or not start <= parse_datetime(event['timestamp']) < end:
+                    continue
+                if all(event[key] == value for key, value in filters.items()):
+                    events.append(event)
+
+    events.sort(key=lambda event: (event['timestamp'], event['id']))
+    return events
+
+
+def verify_archives():
+    """Manifest entries whose file is missing or does not match its checksum"""
+    problems = []
+    for entry in read_manifest():
+        path = archive_dir() / entry['file']
+        if not path.exists():
+            problems.append(entry)
+            continue
+        digest = hashlib.sha256()
+        with gzip.open(path, 'rb') as archive:
+            for line in archive:
+                digest.update(line)
+        if digest.hexdigest() != entry['sha256']:
+            problems.append(entry)
+    return problems
@@ -0,0 +1,226 @@
+"""
+Bulk grievance import for insurer batch uploads.
+
+Rows arrive as CSV or JSON lines and are processed in chunks: each chunk is
+validated with plain field checks (not a serializer per row), companies are
+resolved by license number from a dictionary loaded once, grievance IDs are
+leased for the whole chunk in one round-trip, and grievances and their
+initial messages go in with ``bulk_create``. Counters, search vectors and
+caches that the per-row signals would maintain are updated once per chunk.
+
+Every row that fails validation is reported by its 1-based row number
+(excluding the CSV header) with per-field errors; valid rows in the same
+chunk are still imported. A file that turns out to be unreadable part way
+through stops the import with ``ImportFormatError``, whose ``report`` says
+how many rows the chunks before it already committed.
+"""
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.utils import timezone
+
+from companies.models import InsuranceCompany
+from core.cache import invalidate
+from . import counters
+from .id_allocator import get_allocator
+from .models import Grievance, GrievanceMessage
+from .search import update_search_vectors
+from .sla import compute_deadline
+
+DEFAULT_CHUNK_SIZE = 1000
+
+REQUIRED = ('title', 'description', 'category', 'complainant_name',
+            'complainant_email', 'complainant_phone', 'company_license')
+TEXT_FIELDS = ('title', 'description', 'complainant_name', 'complainant_email',
+               'complainant_phone', 'policy_number')
+CHOICES = {
+    'category': {value for value, _ in Grievance.CATEGORY_CHOICES},
+    'priority': {value for value, _ in Grievance.PRIORITY_CHOICES},
+}
+
+
+class ImportFormatError(ValueError):
+    """The upload could not be parsed; ``report`` covers the rows committed before that"""
+
+    def __init__(self, message, report=None):
+        super().__init__(message)
+        self.report = report
+
+
+class ImportNotAllowed(PermissionError):
+    """The user may not import grievances"""
+
+
+@dataclass
+class ImportReport:
+    rows: int = 0
+    created: int = 0
+    grievance_ids: list = field(default_factory=list)
+    errors: list = field(default_factory=list)
+
+    @property
+    def failed(self):
+        return len(self.errors)
+
+    def as_dict(self):
+        return {'rows': self.rows, 'created': self.created, 'failed': self.failed,
+                'errors': self.errors}
+
+
+def read_rows(stream, import_format):
+    """Dicts from a binary ``stream`` of CSV (with a header row) or JSON lines"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if import_format == 'csv':
+        # Strict, so a stray quote is an error rather than a silently merged field
+        reader = csv.DictReader(text, strict=True)
+        try:
+            yield from reader
+        except csv.Error as error:
+            raise ImportFormatError(f'Line {reader.line_num + 1} is not valid CSV: {error}') from None
+    elif import_format == 'jsonl':
+        for number, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as error:
+                raise ImportFormatError(f'Line {number} is not valid JSON: {error}') from None
+            if not isinstance(row, dict):
+                raise ImportFormatError(f'Line {number} is not a JSON object')
+            yield row
+    else:
+        raise ImportFormatError(f'Unsupported import format: {import_format}')
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class GrievanceImporter:
+    """
+    Imports rows on behalf of ``user``, who also sends the initial messages.
+
+    Insurance company users may only import grievances against their own
+    company; pass ``company`` to the same effect for command-line imports.
+    """
+
+    def __init__(self, user, company=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.user = user
+        self.chunk_size = chunk_size
+        profile = getattr(user, 'profile', None)
+        if company is None and profile is not None and profile.role == 'insurance_company':
+            company = profile.company
+            if company is None:
+                raise ImportNotAllowed('Your account is not linked to an insurance company')
+        self.company = company
+        self.companies = dict(
+            InsuranceCompany.objects.filter(is_active=True).values_list('license_number', 'id')
+        )
+        self.max_lengths = {
+            name: Grievance._meta.get_field(name).max_length for name in TEXT_FIELDS
+            if Grievance._meta.get_field(name).max_length
+        }
+
+    def run(self, rows):
+        report = ImportReport()
+        try:
+            for chunk in _chunks(rows, self.chunk_size):
+                start = report.rows + 1
+                report.rows += len(chunk)
+                self.import_chunk(chunk, start, report)
+        except (ImportFormatError, UnicodeDecodeError, csv.Error) as error:
+            raise ImportFormatError(str(error), report) from error
+        finally:
+            if report.created:
+                invalidate('grievances')
+        return report
+
+    def clean(self, row):
+        """Model field values for ``row``, or a dict of errors"""
+        row = {str(key).strip(): '' if value is None else str(value).strip()
+               for key, value in row.items() if key}
+        errors = {}
+        for name in REQUIRED:
+            if not row.get(name):
+                errors[name] = ['This field is required.']
+        for name, max_length in self.max_lengths.items():
+            if len(row.get(name, '')) > max_length:
+                errors.setdefault(name, []).append(f'Ensure this field has at most {max_length} characters.')
+        for name, allowed in CHOICES.items():
+            if row.get(name) and row[name] not in allowed:
+                errors.setdefault(name, []).append(f'"{row[name]}" is not a valid choice.')
+        if row.get('complainant_email'):
+            try:
+                validate_email(row['complainant_email'])
+            except ValidationError:
+                errors.setdefault('complainant_email', []).append('Enter a valid email address.')
+
+        claim_amount = None
+        if row.get('claim_amount'):
+            try:
+                claim_amount = Decimal(row['claim_amount']).quantize(Decimal('0.01'))
+                if not claim_amount.is_finite() or abs(claim_amount) >= 10 ** 10:
+                    raise InvalidOperation
+            except InvalidOperation:
+                errors['claim_amount'] = ['A valid amount is required.']
+
+        company_id = self.companies.get(row.get('company_license'))
+        if row.get('company_license') and company_id is None:
+            errors['company_license'] = ['No active insurance company has this license number.']
+        elif self.company is not None and company_id not in (None, self.company.pk):
+            errors['company_license'] = ['You can only import grievances for your own company.']
+
+        if errors:
+            return None, errors
+        values = {name: row.get(name) or '' for name in TEXT_FIELDS}
+        values.update(
+            category=row['category'],
+            priority=row.get('priority') or 'medium',
+            claim_amount=claim_amount,
+            insurance_company_id=company_id,
+        )
+        return (values, (row.get('initial_message') or '').strip()), None
+
+    def import_chunk(self, chunk, start, report):
+        cleaned = []
+        for number, row in enumerate(chunk, start):
+            result, errors = self.clean(row)
+            if errors:
+                report.errors.append({'row': number, 'errors': errors})
+            else:
+                cleaned.append(result)
+        if not cleaned:
+            return
+
+        now = timezone.now()
+        with transaction.atomic():
+            ids = get_allocator().allocate_many(len(cleaned))
+            grievances = Grievance.objects.bulk_create([
+                Grievance(grievance_id=grievance_id,
+                          sla_deadline=compute_deadline(values['category'], values['priority'], now), **values)
+                for grievance_id, (values, _) in zip(ids, cleaned)
+            ])
+            messages = [
+                GrievanceMessage(grievance=grievance, sender=self.user, content=message)
+                for grievance, (_, message) in zip(grievances, cleaned)
+                if message
+            ]
+            GrievanceMessage.objects.bulk_create(messages)
+            counters.record_created(counters.counter_key(grievance) for grievance in grievances)
+        update_search_vectors([grievance.pk for grievance in grievances])
+
+        report.created += len(grievances)
+        report.grievance_ids.extend(ids)
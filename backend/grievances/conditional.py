@@ -0,0 +1,112 @@
+"""
+Conditional GET for grievance endpoints.
+
+Polling clients send back the ``ETag``/``Last-Modified`` they were given.
+The validators are derived, in one aggregate query, from everything the
+responses show: ``Grievance.updated_at``, the grievance's messages, its
+company and the company's counters, and the users they nest (submitter,
+assignee and message senders, with their profiles). A request whose
+representation has not changed is answered 304 before any serialization or
+template rendering happens. Views that audit reads record the view on that
+path too, and pages that differ by viewer fold the viewer into the ETag.
+"""
+import hashlib
+
+from django.db.models import Count, F, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from companies.serializers import counted_grievances
+
+
+def _validator_rows(queryset):
+    return (
+        queryset.order_by()
+        .values('pk', 'updated_at')
+        .annotate(
+            last_message=Max('messages__updated_at'),
+            message_count=Count('messages'),
+            company_total=counted_grievances('insurance_company'),
+            company_pending=counted_grievances('insurance_company', status='open'),
+            company_updated=F('insurance_company__updated_at'),
+            submitter_updated=F('submitted_by__updated_at'),
+            submitter_profile_updated=F('submitted_by__profile__updated_at'),
+            assignee_updated=F('assigned_to__updated_at'),
+            assignee_profile_updated=F('assigned_to__profile__updated_at'),
+            sender_updated=Max('messages__sender__updated_at'),
+            sender_profile_updated=Max('messages__sender__profile__updated_at'),
+        )
+    )
+
+
+FINGERPRINT = (
+    'pk', 'updated_at', 'last_message', 'message_count', 'company_total', 'company_pending', 'company_updated',
+    'submitter_updated', 'submitter_profile_updated', 'assignee_updated', 'assignee_profile_updated',
+    'sender_updated', 'sender_profile_updated',
+)
+
+
+def _validators(row, vary=()):
+    if row is None:
+        return None, None
+
+    last_modified = max(filter(None, [row['updated_at'], row['last_message']]))
+    fingerprint = ':'.join([str(row[key]) for key in FINGERPRINT] + [str(value) for value in vary])
+    digest = hashlib.md5(fingerprint.encode(), usedforsecurity=False).hexdigest()
+    return f'W/"{digest}"', last_modified
+
+
+def grievance_validators(queryset, vary=()):
+    """
+    ``(etag, last_modified)`` for the single grievance in ``queryset``, or
+    ``(None, None)``. ``vary`` holds anything else the representation
+    depends on, such as the viewer.
+    """
+    return _validators(_validator_rows(queryset).first(), vary)
+
+
+async def agrievance_validators(queryset):
+    return _validators(await _validator_rows(queryset).afirst())
+
+
+def conditional_response(request, queryset, respond, viewed=None, vary=()):
+    """
+    Answer 304 if the client's validators still match, otherwise ``respond()``.
+
+    ``queryset`` must already be restricted to what the user may see, so a
+    grievance they can't access falls through to ``respond()`` and its
+    normal 404/redirect handling. ``viewed()``, if given, is called when the
+    answer is 304, as ``respond()`` would otherwise record the view.
+    """
+    etag, last_modified = grievance_validators(queryset, vary)
+    if etag is None:
+        return respond()
+
+    timestamp = int(last_modified.timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None and response.status_code == 304 and viewed is not None:
+        viewed()
+    if response is None:
+        response = respond()
+        if response.status_code != 200:
+            return response
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(timestamp)
+    return response
+
+
+async def aconditional_response(request, queryset, respond):
+    """``conditional_response`` for async views; ``respond`` is a coroutine function"""
+    etag, last_modified = await agrievance_validators(queryset)
+    if etag is None:
+        return await respond()
+
+    timestamp = int(last_modified.timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = await respond()
+        if response.status_code != 200:
+            return response
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(timestamp)
+    return response
@@ -0,0 +1,128 @@
+"""
+Materialized grievance counters.
+
+``GrievanceCounter`` holds one row per (company, status, category, month)
+bucket. Grievance saves and deletes move a grievance between buckets through
+the signal handlers in ``grievances.signals``, so readers sum a handful of
+counter rows instead of counting the grievance table.
+
+Bulk queryset ``update()``/``delete()`` calls bypass the signals; run the
+``reconcile_grievance_counters`` command after those. ``bulk_create`` callers
+report their rows with ``record_created``.
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+
+COUNTER_FIELDS = ('insurance_company_id', 'status', 'category', 'submitted_at')
+
+
+def counter_key(grievance):
+    """Bucket a grievance is counted in, or None if it can't be determined"""
+    if grievance.get_deferred_fields().intersection(COUNTER_FIELDS):
+        return None
+    if grievance.insurance_company_id is None or grievance.submitted_at is None:
+        return None
+    month = timezone.localtime(grievance.submitted_at).date().replace(day=1)
+    return (grievance.insurance_company_id, grievance.status, grievance.category, month)
+
+
+def stored_counter_key(pk):
+    """Bucket of the grievance row currently stored under ``pk``"""
+    from .models import Grievance
+
+    stored = (
+        Grievance.objects.filter(pk=pk)
+        .only('insurance_company', 'status', 'category', 'submitted_at')
+        .first()
+    )
+    return counter_key(stored) if stored is not None else None
+
+
+def _bump(key, delta):
+    from .models import GrievanceCounter
+
+    company_id, status, category, month = key
+    bucket = GrievanceCounter.objects.filter(
+        company_id=company_id, status=status, category=category, month=month
+    )
+    if bucket.update(count=F('count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            GrievanceCounter.objects.create(
+                company_id=company_id, status=status, category=category,
+                month=month, count=delta
+            )
+    except IntegrityError:
+        # Another writer created the bucket first
+        bucket.update(count=F('count') + delta)
+
+
+def record_change(old_key, new_key):
+    """Move one grievance from ``old_key`` to ``new_key``; either may be None"""
+    if old_key == new_key:
+        return
+    with transaction.atomic():
+        if old_key is not None:
+            _bump(old_key, -1)
+        if new_key is not None:
+            _bump(new_key, 1)
+
+
+def record_created(keys):
+    """Count newly bulk-created grievances, one update per bucket"""
+    with transaction.atomic():
+        for key, delta in Counter(key for key in keys if key is not None).items():
+            _bump(key, delta)
+
+
+def grievance_count(**filters):
+    """Number of grievances in the buckets matching ``filters``"""
+    from .models import GrievanceCounter
+
+    return GrievanceCounter.objects.filter(**filters).aggregate(
+        total=Coalesce(Sum('count'), 0)
+    )['total']
+
+
+def grievance_breakdown(field, **filters):
+    """Counts grouped by a counter field, largest first"""
+    from .models import GrievanceCounter
+
+    return (
+        GrievanceCounter.objects.filter(**filters)
+        .values(field)
+        .annotate(count=Sum('count'))
+        .filter(count__gt=0)
+        .order_by('-count')
+    )
+
+
+def rebuild():
+    """Recompute every counter bucket from the grievance table"""
+    from .models import Grievance, GrievanceCounter
+
+    buckets = (
+        Grievance.objects.order_by()
+        .annotate(month=TruncMonth('submitted_at'))
+        .values('insurance_company_id', 'status', 'category', 'month')
+        .annotate(total=Count('id'))
+    )
+    counters = [
+        GrievanceCounter(
+            company_id=bucket['insurance_company_id'],
+            status=bucket['status'],
+            category=bucket['category'],
+            month=timezone.localtime(bucket['month']).date(),
+            count=bucket['total'],
+        )
+        for bucket in buckets.iterator()
+    ]
+    with transaction.atomic():
+        GrievanceCounter.objects.all().delete()
+        GrievanceCounter.objects.bulk_create(counters, batch_size=1000)
+    return len(counters)
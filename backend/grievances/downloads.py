@@ -0,0 +1,107 @@
+"""
+Grievance document downloads.
+
+Django checks access and answers conditional requests, then leaves the
+transfer to nginx. The response carries ``X-Accel-Redirect`` to the
+internal location ``DOCUMENT_ACCEL_REDIRECT``, which maps onto the stored
+files, and nginx sends the file with sendfile, Range requests included.
+No worker is held while the bytes go out.
+
+nginx replaces the upstream's ``ETag`` and ``Last-Modified`` with its own,
+derived from the file's mtime and size, so the validators here are derived
+the same way. A client that revalidates, or resumes with If-Range, sees
+the same values from Django and from nginx. Stored files are never
+rewritten (see ``grievances.uploads``), so the validators only change
+when the file does.
+
+When ``DOCUMENT_ACCEL_REDIRECT`` is empty (the default, for when no nginx
+is in front), Django sends the file itself in ``READ_SIZE`` pieces and
+handles single byte ranges. The pieces stream under both WSGI and ASGI
+(see ``core.streaming``).
+"""
+import re
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+from core.storage import get_storage
+from core.streaming import streaming_content
+
+READ_SIZE = 64 * 1024
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def validators(size, mtime):
+    """``(etag, last_modified)`` as nginx computes them for a static file"""
+    return f'"{mtime:x}-{size:x}"', mtime
+
+
+def byte_range(request, size, etag, last_modified):
+    """``(start, end)`` of a satisfiable single range, None for the whole file, or False if unsatisfiable"""
+    match = RANGE.match(request.headers.get('Range', '').replace(' ', ''))
+    if not match or not any(match.groups()):
+        return None
+    # If-Range: resume only if the file is the one the client has part of
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != last_modified:
+        return None
+    first, last = match.groups()
+    if not first:
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def _read_range(handle, start, length):
+    with handle:
+        handle.seek(start)
+        while length > 0:
+            piece = handle.read(min(READ_SIZE, length))
+            if not piece:
+                return
+            length -= len(piece)
+            yield piece
+
+
+def document_response(request, document):
+    """The download of ``document``, after the caller has checked access"""
+    storage = get_storage()
+    size, mtime = storage.stat(document.file_path)
+    etag, last_modified = validators(size, mtime)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        accel = getattr(settings, 'DOCUMENT_ACCEL_REDIRECT', '')
+        if accel:
+            response = HttpResponse()
+            response['X-Accel-Redirect'] = accel + document.file_path
+        else:
+            response = _file_response(request, storage, document, size, etag, last_modified)
+        if response.status_code != 416:
+            response['Content-Type'] = document.content_type or 'application/octet-stream'
+            response['Content-Disposition'] = content_disposition_header(True, document.file_name)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Revalidate on every use, so revoked access takes effect at once
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _file_response(request, storage, document, size, etag, last_modified):
+    span = byte_range(request, size, etag, last_modified)
+    if span is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    else:
+        start, end = span or (0, size - 1)
+        chunks = _read_range(storage.open(document.file_path), start, end - start + 1)
+        response = StreamingHttpResponse(streaming_content(request, chunks), status=206 if span else 200)
+        if span:
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,52 @@
+"""
+Live grievance conversation events (see core.events).
+
+New messages and status changes are published to ``grievance:<pk>`` once
+their transaction commits. Message events carry the message id, which
+clients send back as Last-Event-ID to replay what they missed.
+"""
+from django.db import transaction
+
+from core.events import publish
+from .models import Grievance, GrievanceMessage
+from .serializers import GrievanceMessageSerializer
+
+
+def topic(grievance_pk):
+    return f'grievance:{grievance_pk}'
+
+
+def message_event(message):
+    return {
+        'type': 'message',
+        'id': message.pk,
+        'internal': message.is_internal,
+        'data': dict(GrievanceMessageSerializer(message).data),
+    }
+
+
+def status_event(grievance):
+    return {
+        'type': 'status',
+        'internal': False,
+        'data': {'status': grievance.status, 'priority': grievance.priority},
+    }
+
+
+def publish_message(message):
+    transaction.on_commit(lambda: publish(topic(message.grievance_id), message_event(message)))
+
+
+def publish_status(grievance):
+    transaction.on_commit(lambda: publish(topic(grievance.pk), status_event(grievance)))
+
+
+def replay(grievance_pk, after_id, internal):
+    """Events for the messages after ``after_id``, then the current status"""
+    messages = GrievanceMessage.objects.filter(grievance_id=grievance_pk, pk__gt=after_id).select_related(
+        'sender__profile').order_by('pk')
+    if not internal:
+        messages = messages.filter(is_internal=False)
+    events = [message_event(message) for message in messages[:500]]
+    grievance = Grievance.objects.only('status', 'priority').get(pk=grievance_pk)
+    return events + [status_event(grievance)]
@@ -0,0 +1,139 @@
+"""
+Grievance ID allocation.
+
+IDs have the form ``GRV-{year}-{n:05d}``. Numbers come from a per-year
+``GrievanceSequence`` row that is only ever advanced under a row lock, so two
+writers can never receive the same number. ``BlockIdAllocator`` leases a
+range of numbers per round-trip and hands them out from memory, so most
+inserts never touch the sequence table at all.
+
+The allocator class is chosen with the ``GRIEVANCE_ID_ALLOCATOR`` setting and
+the lease size with ``GRIEVANCE_ID_BLOCK_SIZE``.
+"""
+import os
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import Length
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+def format_grievance_id(year, number):
+    return f"GRV-{year}-{number:05d}"
+
+
+# Serialises leases between threads of one process; the row lock taken by
+# select_for_update() does the same between processes.
+_lease_lock = threading.Lock()
+
+
+def lease(year, size):
+    """Reserve ``size`` consecutive numbers for ``year`` and return ``(start, end)``"""
+    from .models import GrievanceSequence
+
+    with _lease_lock, transaction.atomic():
+        sequence = GrievanceSequence.objects.select_for_update().filter(year=year).first()
+        if sequence is None:
+            GrievanceSequence.objects.get_or_create(
+                year=year, defaults={'next_value': _first_unused(year)}
+            )
+            sequence = GrievanceSequence.objects.select_for_update().get(year=year)
+        start = sequence.next_value
+        sequence.next_value = start + size
+        sequence.save(update_fields=['next_value'])
+    return start, start + size
+
+
+def _first_unused(year):
+    """Seed a new year's sequence past any IDs issued before the table existed"""
+    from .models import Grievance
+
+    prefix = format_grievance_id(year, 0)[:-5]
+    latest = (
+        Grievance.objects.filter(grievance_id__startswith=prefix)
+        .order_by(Length('grievance_id').desc(), '-grievance_id')
+        .values_list('grievance_id', flat=True)
+        .first()
+    )
+    if latest is None:
+        return 1
+    try:
+        return int(latest[len(prefix):]) + 1
+    except ValueError:
+        return 1
+
+
+class SequenceIdAllocator:
+    """Allocates every ID with its own sequence round-trip"""
+
+    def allocate(self, year=None):
+        return self.allocate_many(1, year)[0]
+
+    def allocate_many(self, count, year=None):
+        """Allocate ``count`` IDs, in increasing order"""
+        year = year or timezone.localdate().year
+        start, end = lease(year, count)
+        return [format_grievance_id(year, n) for n in range(start, end)]
+
+
+class BlockIdAllocator(SequenceIdAllocator):
+    """
+    Leases ``block_size`` numbers at a time and serves them from memory.
+
+    At most ``block_size - 1`` numbers per process are skipped when a process
+    exits with part of its block unused, so gaps stay bounded.
+    """
+
+    def __init__(self, block_size=None):
+        self.block_size = block_size or getattr(settings, 'GRIEVANCE_ID_BLOCK_SIZE', 20)
+        self._lock = threading.Lock()
+        self._blocks = {}
+        self._pid = os.getpid()
+
+    def allocate_many(self, count, year=None):
+        year = year or timezone.localdate().year
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked after leasing: the parent owns those numbers
+                self._blocks = {}
+                self._pid = os.getpid()
+
+            next_value, end = self._blocks.get(year, (0, 0))
+            numbers = list(range(next_value, min(end, next_value + count)))
+            next_value += len(numbers)
+            shortfall = count - len(numbers)
+            if shortfall and transaction.get_connection().in_atomic_block:
+                # A lease inside an outer transaction is rolled back with it,
+                # so only take what this call needs and never cache the rest.
+                start, stop = lease(year, shortfall)
+                numbers.extend(range(start, stop))
+            elif shortfall:
+                start, end = lease(year, max(self.block_size, shortfall))
+                numbers.extend(range(start, start + shortfall))
+                next_value = start + shortfall
+            self._blocks[year] = (next_value, end)
+        return [format_grievance_id(year, n) for n in numbers]
+
+
+_allocator = None
+_allocator_lock = threading.Lock()
+
+
+def get_allocator():
+    """Process-wide allocator configured by ``GRIEVANCE_ID_ALLOCATOR``"""
+    global _allocator
+    if _allocator is None:
+        with _allocator_lock:
+            if _allocator is None:
+                path = getattr(
+                    settings, 'GRIEVANCE_ID_ALLOCATOR',
+                    'grievances.id_allocator.BlockIdAllocator'
+                )
+                _allocator = import_string(path)()
+    return _allocator
+
+
+def allocate_grievance_id():
+    return get_allocator().allocate()
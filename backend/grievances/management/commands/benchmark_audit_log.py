@@ -0,0 +1,80 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from accounts.models import User
+from grievances.audit_storage import ensure_partitions, is_partitioned
+from grievances.models import AuditLog
+
+HISTORY_SQL = """
+    INSERT INTO grievances_auditlog
+        (user_id, action, model_name, object_id, details, ip_address, user_agent, "timestamp")
+    SELECT %s, 'view', 'Grievance', n %% 100000, '{}'::jsonb, '10.0.0.1', 'benchmark',
+           %s - (random() * %s) * interval '1 day'
+    FROM generate_series(1, %s) AS n
+"""
+
+
+class Command(BaseCommand):
+    help = ('Benchmark audit log insert throughput and "last 24h" query latency as history grows '
+            '(run against a scratch PostgreSQL database)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--steps', type=int, default=5, help='Number of history sizes to measure')
+        parser.add_argument('--rows-per-step', type=int, default=2_000_000,
+                            help='Historical rows added before each measurement')
+        parser.add_argument('--history-days', type=int, default=365,
+                            help='Spread historical rows over this many past days')
+        parser.add_argument('--inserts', type=int, default=20_000, help='Events inserted per measurement')
+        parser.add_argument('--repeat', type=int, default=50, help='Runs of the 24h query per measurement')
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            raise CommandError('Audit log benchmarks need the partitioned PostgreSQL table.')
+        user = User.objects.order_by('pk').first()
+        if user is None:
+            raise CommandError('Create at least one user first (e.g. manage.py create_demo_data).')
+
+        now = timezone.now()
+        ensure_partitions(start=now - timedelta(days=options['history_days']))
+
+        self.stdout.write(f"{'history rows':>14}  {'inserts/s':>10}  {'24h p50 ms':>10}  {'24h p95 ms':>10}")
+        for _ in range(options['steps']):
+            with connection.cursor() as cursor:
+                # Keep the newest day clear of history so each step queries the same recent rows
+                cursor.execute(HISTORY_SQL, [
+                    user.pk, now - timedelta(days=1), options['history_days'] - 1, options['rows_per_step'],
+                ])
+                cursor.execute('ANALYZE grievances_auditlog')
+
+            rate = self.measure_inserts(user, options['inserts'])
+            timings = self.measure_recent_queries(user, options['repeat'])
+            self.stdout.write(
+                f'{AuditLog.objects.count():>14,}  {rate:>10,.0f}  '
+                f'{statistics.median(timings):>10.2f}  {timings[int(len(timings) * 0.95) - 1]:>10.2f}'
+            )
+
+    def measure_inserts(self, user, count, batch_size=500):
+        started = time.perf_counter()
+        for offset in range(0, count, batch_size):
+            AuditLog.objects.bulk_create([
+                AuditLog(user=user, action='view', model_name='Grievance', object_id=number,
+                         details={}, ip_address='10.0.0.2', user_agent='benchmark')
+                for number in range(offset, min(offset + batch_size, count))
+            ])
+        return count / (time.perf_counter() - started)
+
+    def measure_recent_queries(self, user, repeat):
+        timings = []
+        for _ in range(repeat):
+            since = timezone.now() - timedelta(hours=24)
+            started = time.perf_counter()
+            list(AuditLog.objects.filter(user=user, timestamp__gte=since).order_by('-timestamp')[:50])
+            AuditLog.objects.filter(timestamp__gte=since).count()
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return timings
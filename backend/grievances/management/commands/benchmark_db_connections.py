@@ -0,0 +1,64 @@
+import statistics
+import threading
+import time
+
+from django.core import signals
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+
+from grievances.models import Grievance
+
+
+class Command(BaseCommand):
+    help = ('Measure requests/s of simulated request cycles under the current DB_POOL_MODE; '
+            'run once per mode (e.g. DB_POOL_MODE=none, persistent, pgbouncer) to compare')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Request cycles per thread')
+        parser.add_argument('--threads', type=int, default=4, help='Concurrent request threads')
+        parser.add_argument('--queries', type=int, default=4,
+                            help='Queries per request (session, user, profile, object)')
+
+    def handle(self, *args, **options):
+        settings_dict = connection.settings_dict
+        self.stdout.write(
+            f"CONN_MAX_AGE={settings_dict['CONN_MAX_AGE']} "
+            f"health_checks={settings_dict.get('CONN_HEALTH_CHECKS', False)} "
+            f"pool={'pool' in settings_dict['OPTIONS']} "
+            f"server_side_cursors={not settings_dict.get('DISABLE_SERVER_SIDE_CURSORS', False)} "
+            f"host={settings_dict.get('HOST') or 'local'}"
+        )
+        pk = Grievance.objects.values_list('pk', flat=True).first() or 0
+        connections.close_all()
+
+        timings = []
+        lock = threading.Lock()
+
+        def worker():
+            local = []
+            for _ in range(options['requests']):
+                started = time.perf_counter()
+                # The same signals the request handler sends, so CONN_MAX_AGE applies
+                signals.request_started.send(sender=self.__class__)
+                for _ in range(options['queries']):
+                    Grievance.objects.filter(pk=pk).exists()
+                signals.request_finished.send(sender=self.__class__)
+                local.append(time.perf_counter() - started)
+            connections.close_all()
+            with lock:
+                timings.extend(local)
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        timings.sort()
+        self.stdout.write(
+            f'{len(timings) / elapsed:,.0f} requests/s, '
+            f'p50 {statistics.median(timings) * 1000:.2f} ms, '
+            f'p95 {timings[int(len(timings) * 0.95) - 1] * 1000:.2f} ms'
+        )
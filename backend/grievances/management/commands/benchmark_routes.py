@@ -0,0 +1,61 @@
+import json
+import platform
+import sys
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from core import benchmark
+from grievances.models import Grievance
+
+
+class Command(BaseCommand):
+    help = ('Benchmark every GET route for every role in-process (latency percentiles, queries, '
+            'allocations) and write the results as JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Timed requests per route and role')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests before timing')
+        parser.add_argument('--skip', action='append', default=[],
+                            help='Extra route name or namespace to skip (repeatable)')
+        parser.add_argument('--output', '-o', help='JSON file to write (default: stdout)')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1.')
+
+        def progress(key, result):
+            self.stderr.write(
+                f"{key:<70} {result['status']}  p95 {result['p95_ms']:>8.2f} ms  "
+                f"{result['queries']:>3} queries  {result['alloc_peak_kib']:>8.1f} KiB"
+            )
+
+        results = benchmark.run(
+            iterations=options['iterations'],
+            warmup=options['warmup'],
+            skip=benchmark.DEFAULT_SKIP + tuple(options['skip']),
+            progress=progress if options['verbosity'] > 1 else None,
+        )
+        report = {
+            'meta': {
+                'created_at': timezone.now().isoformat(),
+                'iterations': options['iterations'],
+                'warmup': options['warmup'],
+                'database': connection.vendor,
+                'grievances': Grievance.objects.count(),
+                'debug': settings.DEBUG,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+            'results': results,
+        }
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output + '\n')
+            self.stderr.write(f"Benchmarked {len(results)} route/role pairs into {options['output']}.")
+        else:
+            sys.stdout.write(output + '\n')
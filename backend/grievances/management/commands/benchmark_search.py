@@ -0,0 +1,98 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from companies.models import InsuranceCompany
+from grievances.counters import rebuild as rebuild_counters
+from grievances.id_allocator import get_allocator
+from grievances.models import Grievance
+from grievances.search import search_grievances, supports_search, update_search_vectors
+
+WORDS = (
+    'claim settlement delayed rejected premium refund policy agent misconduct '
+    'hospital bill document missing surveyor vehicle accident fire flood crop '
+    'life maturity nominee payment cheque bounced renewal lapse medical'
+).split()
+NAMES = ['Rahim', 'Karim', 'Fatema', 'Ayesha', 'Hasan', 'Nusrat', 'Tanvir', 'Sadia']
+SURNAMES = ['Ahmed', 'Hossain', 'Islam', 'Rahman', 'Chowdhury', 'Akter', 'Uddin']
+QUERIES = [
+    'claim settlement', 'premium refund', '"hospital bill"', 'agent -fire',
+    'Rahim Ahmed', 'Fatma Hosain', 'POL-0012345', 'GRV-2026-0001',
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark grievance search over synthetic data (run against a scratch PostgreSQL database)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000,
+                            help='Ensure at least this many grievances exist before benchmarking')
+        parser.add_argument('--repeat', type=int, default=20, help='Runs per query')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if not supports_search():
+            raise CommandError('Search benchmarks need the PostgreSQL backend.')
+        random.seed(options['seed'])
+
+        missing = options['rows'] - Grievance.objects.count()
+        if missing > 0:
+            self.generate(missing, options['batch_size'])
+
+        self.stdout.write(f"Benchmarking {len(QUERIES)} queries x {options['repeat']} runs")
+        for text in QUERIES:
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                list(search_grievances(Grievance.objects.all(), text).values_list('id', flat=True)[:20])
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f"  {text!r:<22} p50 {statistics.median(timings):7.2f} ms  "
+                f"p95 {timings[int(len(timings) * 0.95) - 1]:7.2f} ms"
+            )
+
+    def generate(self, count, batch_size):
+        company = InsuranceCompany.objects.first() or InsuranceCompany.objects.create(
+            name='Benchmark Insurance Ltd', license_number='LIC-BENCH',
+            established_year=2000, address='Dhaka', phone='+8801700000000',
+            email='bench@example.com', registration_date=date(2020, 1, 1),
+            license_expiry_date=date(2030, 1, 1), authorized_capital=0, paid_up_capital=0,
+        )
+        categories = [value for value, _ in Grievance.CATEGORY_CHOICES]
+        statuses = [value for value, _ in Grievance.STATUS_CHOICES]
+        deadline = timezone.now() + timedelta(days=30)
+
+        self.stdout.write(f'Generating {count} synthetic grievances...')
+        started = time.perf_counter()
+        for offset in range(0, count, batch_size):
+            size = min(batch_size, count - offset)
+            ids = get_allocator().allocate_many(size)
+            Grievance.objects.bulk_create([
+                Grievance(
+                    grievance_id=grievance_id,
+                    title=' '.join(random.choices(WORDS, k=5)).capitalize(),
+                    description=' '.join(random.choices(WORDS, k=40)),
+                    category=random.choice(categories),
+                    status=random.choice(statuses),
+                    complainant_name=f'{random.choice(NAMES)} {random.choice(SURNAMES)}',
+                    complainant_email='complainant@example.com',
+                    complainant_phone='+8801700000000',
+                    policy_number=f'POL-{random.randrange(10 ** 7):07d}',
+                    insurance_company=company,
+                    sla_deadline=deadline,
+                )
+                for grievance_id in ids
+            ])
+        self.stdout.write('Building search vectors and counters...')
+        update_search_vectors()
+        rebuild_counters()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE grievances_grievance')
+        self.stdout.write(f'Generated in {time.perf_counter() - started:.1f}s')
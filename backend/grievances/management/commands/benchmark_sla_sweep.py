@@ -0,0 +1,106 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from companies.models import InsuranceCompany
+from grievances.counters import rebuild as rebuild_counters
+from grievances.id_allocator import get_allocator
+from grievances.models import Grievance
+from grievances.sla import CLOSED_STATUSES, ESCALATABLE, NONE, sweep
+
+OPEN_STATUSES = [value for value, _ in Grievance.STATUS_CHOICES if value not in CLOSED_STATUSES]
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the SLA escalation sweep over many open grievances (each sweep is rolled back, '
+            'so every run escalates the same rows)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5_000_000,
+                            help='Ensure at least this many open grievances exist before benchmarking')
+        parser.add_argument('--breached', type=int, default=500, help='Generated grievances already past due')
+        parser.add_argument('--near-breach', type=int, default=500,
+                            help='Generated grievances due within the warning window')
+        parser.add_argument('--repeat', type=int, default=20, help='Sweeps to time')
+        parser.add_argument('--budget-ms', type=float, default=100.0, help='Fail if the p95 sweep is slower')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows inserted per statement')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        missing = options['rows'] - Grievance.objects.exclude(status__in=CLOSED_STATUSES).count()
+        if missing > 0:
+            self.generate(missing, options)
+
+        now = timezone.now()
+        due = Grievance.objects.filter(ESCALATABLE, escalation_level=NONE, sla_deadline__lte=now)
+        self.stdout.write('Plan for the breach lookup:')
+        self.stdout.write(due.order_by('sla_deadline').values_list('pk', flat=True)[:500].explain())
+
+        timings, result = [], None
+        for _ in range(options['repeat']):
+            with transaction.atomic():
+                started = time.perf_counter()
+                result = sweep(now=now)
+                timings.append((time.perf_counter() - started) * 1000)
+                transaction.set_rollback(True)
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f"Sweep escalating {result['breached']} breached and {result['near_breach']} near-breach "
+            f"grievances: p50 {statistics.median(timings):.2f} ms, p95 {p95:.2f} ms, max {timings[-1]:.2f} ms"
+        )
+        if p95 > options['budget_ms']:
+            raise CommandError(f"p95 {p95:.2f} ms is over the {options['budget_ms']:.0f} ms budget")
+
+    def generate(self, count, options):
+        company = InsuranceCompany.objects.first() or InsuranceCompany.objects.create(
+            name='Benchmark Insurance Ltd', license_number='LIC-BENCH',
+            established_year=2000, address='Dhaka', phone='+8801700000000',
+            email='bench@example.com', registration_date=date(2020, 1, 1),
+            license_expiry_date=date(2030, 1, 1), authorized_capital=0, paid_up_capital=0,
+        )
+        categories = [value for value, _ in Grievance.CATEGORY_CHOICES]
+        priorities = [value for value, _ in Grievance.PRIORITY_CHOICES]
+        now = timezone.now()
+
+        def deadline(number):
+            # The first rows are due already or soon; the rest weeks from now
+            if number < options['breached']:
+                return now - timedelta(minutes=random.randrange(1, 60 * 24 * 7))
+            if number < options['breached'] + options['near_breach']:
+                return now + timedelta(minutes=random.randrange(1, 60 * 20))
+            return now + timedelta(minutes=random.randrange(60 * 48, 60 * 24 * 60))
+
+        self.stdout.write(f'Generating {count} open grievances...')
+        started = time.perf_counter()
+        batch_size = options['batch_size']
+        for offset in range(0, count, batch_size):
+            size = min(batch_size, count - offset)
+            ids = get_allocator().allocate_many(size)
+            Grievance.objects.bulk_create([
+                Grievance(
+                    grievance_id=grievance_id,
+                    title='SLA benchmark grievance',
+                    description='Generated by benchmark_sla_sweep',
+                    category=random.choice(categories),
+                    priority=random.choice(priorities),
+                    status=random.choice(OPEN_STATUSES),
+                    complainant_name='Benchmark Complainant',
+                    complainant_email='complainant@example.com',
+                    complainant_phone='+8801700000000',
+                    insurance_company=company,
+                    sla_deadline=deadline(offset + index),
+                )
+                for index, grievance_id in enumerate(ids)
+            ])
+        rebuild_counters()
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE grievances_grievance')
+        self.stdout.write(f'Generated in {time.perf_counter() - started:.1f}s')
@@ -0,0 +1,40 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmark import compare
+
+
+def _load(path):
+    try:
+        with open(path) as handle:
+            return json.load(handle)['results']
+    except (OSError, ValueError, KeyError) as error:
+        raise CommandError(f'Cannot read benchmark results from {path}: {error}')
+
+
+class Command(BaseCommand):
+    help = 'Compare two benchmark_routes reports and fail if the current one regresses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('baseline', help='JSON report to compare against')
+        parser.add_argument('current', help='JSON report of the build under test')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed relative p95 growth (default: 0.2 = 20%%)')
+        parser.add_argument('--min-ms', type=float, default=1.0,
+                            help='Ignore p95 growth smaller than this many milliseconds')
+
+    def handle(self, *args, **options):
+        baseline = _load(options['baseline'])
+        current = _load(options['current'])
+        for key in sorted(baseline.keys() - current.keys()):
+            self.stderr.write(f'Missing from current run: {key}')
+        for key in sorted(current.keys() - baseline.keys()):
+            self.stderr.write(f'New in current run: {key}')
+
+        regressions = compare(baseline, current, options['threshold'], options['min_ms'])
+        if regressions:
+            for message in regressions:
+                self.stderr.write(message)
+            raise CommandError(f'{len(regressions)} regression(s) against {options["baseline"]}.')
+        self.stdout.write(f'No regressions across {len(baseline.keys() & current.keys())} route/role pairs.')
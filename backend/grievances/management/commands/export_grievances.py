@@ -0,0 +1,54 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+from rest_framework.exceptions import ValidationError
+
+from core.replicas import read_alias
+from grievances.export import DEFAULT_CHUNK_SIZE, FORMATS, export_stream
+from grievances.models import Grievance
+from grievances.views import filter_grievances
+
+
+class Command(BaseCommand):
+    help = 'Stream a grievance export (CSV, JSONL or XLSX) to a file or stdout'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='export_format', choices=list(FORMATS), default='csv')
+        parser.add_argument('--gzip', action='store_true', help='Gzip-compress the output')
+        parser.add_argument('--output', '-o', help='File to write (default: stdout)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Rows fetched from the database per round trip')
+        for name in ('status', 'category', 'priority', 'company'):
+            parser.add_argument(f'--{name}', action='append', default=[],
+                                help=f'Only export grievances with this {name} (repeatable)')
+        parser.add_argument('--submitted-after', help='YYYY-MM-DD')
+        parser.add_argument('--submitted-before', help='YYYY-MM-DD')
+
+    def handle(self, *args, **options):
+        params = QueryDict(mutable=True)
+        for name in ('status', 'category', 'priority', 'company'):
+            params.setlist(name, options[name])
+        for name in ('submitted_after', 'submitted_before'):
+            if options[name]:
+                params[name] = options[name]
+
+        try:
+            queryset = filter_grievances(Grievance.objects.using(read_alias()), params)
+        except ValidationError as error:
+            raise CommandError(' '.join(
+                f'--{param.replace("_", "-")}: {problem}'
+                for param, problems in error.detail.items() for problem in problems
+            ))
+        chunks, _, _ = export_stream(
+            queryset, options['export_format'], options['gzip'], options['chunk_size']
+        )
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+        finally:
+            if options['output']:
+                output.close()
+            else:
+                output.flush()
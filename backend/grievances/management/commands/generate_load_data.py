@@ -0,0 +1,322 @@
+"""
+Generate large, realistic data sets for load testing.
+
+Grievances are produced in fixed-size batches. Batch ``n`` always draws from
+a generator seeded with ``(seed, n)``, so the same seed yields the same data
+(with timestamps relative to the run time) however many workers run and in
+whatever order. Each batch (its grievances, messages,
+documents and audit rows) is committed in one transaction, and its
+grievances carry deterministic IDs (``LD{seed}-{number}``), so ``--resume``
+skips every batch whose last grievance already exists. SLA deadlines come
+from ``grievances.sla.compute_deadline``, as for real submissions.
+"""
+import multiprocessing
+import random
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from accounts.models import User, UserProfile
+from companies.models import InsuranceCompany
+from core.cache import invalidate
+from grievances import counters
+from grievances.audit_storage import ensure_partitions
+from grievances.models import AuditLog, Grievance, GrievanceDocument, GrievanceMessage
+from grievances.search import update_search_vectors
+from grievances.sla import compute_deadline
+
+STATUS_WEIGHTS = {'open': 25, 'under_review': 20, 'pending_response': 15, 'resolved': 30, 'closed': 10}
+CATEGORY_WEIGHTS = {
+    'claim_settlement': 35, 'premium_issues': 15, 'service_quality': 14, 'policy_terms': 12,
+    'documentation': 10, 'agent_conduct': 7, 'fraud_concern': 3, 'other': 4,
+}
+PRIORITY_WEIGHTS = {'low': 20, 'medium': 50, 'high': 24, 'urgent': 6}
+WORDS = (
+    'claim settlement delayed rejected premium refund policy agent misconduct hospital bill '
+    'document missing surveyor vehicle accident fire flood crop life maturity nominee payment '
+    'cheque bounced renewal lapse medical branch office reply weeks months pending'
+).split()
+FIRST_NAMES = ['Rahim', 'Karim', 'Fatema', 'Ayesha', 'Hasan', 'Nusrat', 'Tanvir', 'Sadia', 'Imran', 'Farhana']
+LAST_NAMES = ['Ahmed', 'Hossain', 'Islam', 'Rahman', 'Chowdhury', 'Akter', 'Uddin', 'Khan', 'Sarkar']
+DOCUMENT_TYPES = [('claim_form.pdf', 'application/pdf'), ('receipt.jpg', 'image/jpeg'),
+                  ('policy.pdf', 'application/pdf'), ('letter.docx',
+                  'application/vnd.openxmlformats-officedocument.wordprocessingml.document')]
+AUDIT_ACTIONS = ['view', 'view', 'view', 'update', 'status_change', 'message_sent']
+STAFF_PER_COMPANY = 5
+ADMINS = 10
+# Keeps LD{seed}-{number:010d} within Grievance.grievance_id's 20 characters
+MAX_SEED = 10 ** 7 - 1
+
+# Fields that would otherwise be overwritten with the insert time
+TIMESTAMP_FIELDS = {
+    Grievance: ('submitted_at', 'created_at', 'updated_at'),
+    GrievanceMessage: ('created_at', 'updated_at'),
+    GrievanceDocument: ('uploaded_at', 'updated_at'),
+}
+
+
+def grievance_number_id(seed, number):
+    return f'LD{seed}-{number:010d}'
+
+
+@contextmanager
+def explicit_timestamps():
+    """Let bulk_create keep generated timestamps instead of auto_now values"""
+    fields = [model._meta.get_field(name) for model, names in TIMESTAMP_FIELDS.items() for name in names]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _weighted(weights):
+    return list(weights), list(weights.values())
+
+
+def _text(rng, words):
+    return ' '.join(rng.choices(WORDS, k=words))
+
+
+def generate_batch(task):
+    """Insert one batch; runs in a worker process"""
+    plan, batch = task
+    rng = random.Random(f"{plan['seed']}:{batch}")
+    now = timezone.now()
+    span = plan['days'] * 86400
+    statuses, status_weights = _weighted(STATUS_WEIGHTS)
+    categories, category_weights = _weighted(CATEGORY_WEIGHTS)
+    priorities, priority_weights = _weighted(PRIORITY_WEIGHTS)
+    company_ids, company_weights = plan['companies'], plan['company_weights']
+    policyholders, staff, admins = plan['policyholders'], plan['staff'], plan['admins']
+
+    first = batch * plan['batch_size']
+    last = min(first + plan['batch_size'], plan['grievances'])
+    grievances = []
+    for number in range(first, last):
+        # Square root skews submissions towards the present, as volume grows over time
+        submitted = now - timedelta(seconds=span * (1 - rng.random() ** 0.5))
+        status = rng.choices(statuses, status_weights)[0]
+        resolved = None
+        if status in ('resolved', 'closed'):
+            resolved = min(now, submitted + timedelta(days=rng.expovariate(1 / 12)))
+        company_id = rng.choices(company_ids, company_weights)[0]
+        submitter = rng.choice(policyholders) if policyholders and rng.random() < 0.8 else None
+        grievances.append(Grievance(
+            grievance_id=grievance_number_id(plan['seed'], number),
+            title=_text(rng, 6).capitalize(),
+            description=_text(rng, rng.randint(20, 120)),
+            category=rng.choices(categories, category_weights)[0],
+            complainant_name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            complainant_email=f'complainant{number}@example.test',
+            complainant_phone=f'+88017{rng.randrange(10 ** 8):08d}',
+            policy_number=f'POL-{rng.randrange(10 ** 7):07d}',
+            insurance_company_id=company_id,
+            submitted_by_id=submitter,
+            status=status,
+            priority=rng.choices(priorities, priority_weights)[0],
+            submitted_at=submitted,
+            created_at=submitted,
+            updated_at=resolved or submitted,
+            resolved_at=resolved,
+            claim_amount=round(rng.lognormvariate(11, 1.2), 2) if rng.random() < 0.7 else None,
+            is_public=rng.random() < 0.1,
+        ))
+        grievances[-1].sla_deadline = compute_deadline(grievances[-1].category, grievances[-1].priority, submitted)
+
+    with explicit_timestamps(), transaction.atomic():
+        Grievance.objects.bulk_create(grievances, batch_size=1000)
+        messages, documents, events = [], [], []
+        for grievance in grievances:
+            end = grievance.resolved_at or now
+            window = max((end - grievance.submitted_at).total_seconds(), 1)
+            responders = staff.get(grievance.insurance_company_id) or admins
+            for _ in range(int(rng.expovariate(1 / plan['messages'])) if plan['messages'] else 0):
+                moment = grievance.submitted_at + timedelta(seconds=rng.random() * window)
+                from_submitter = grievance.submitted_by_id and rng.random() < 0.5
+                messages.append(GrievanceMessage(
+                    grievance_id=grievance.pk,
+                    sender_id=grievance.submitted_by_id if from_submitter else rng.choice(responders),
+                    content=_text(rng, rng.randint(5, 60)),
+                    is_internal=not from_submitter and rng.random() < 0.2,
+                    created_at=moment, updated_at=moment,
+                ))
+            for _ in range(int(rng.expovariate(1 / plan['documents'])) if plan['documents'] else 0):
+                name, content_type = rng.choice(DOCUMENT_TYPES)
+                moment = grievance.submitted_at + timedelta(seconds=rng.random() * window)
+                documents.append(GrievanceDocument(
+                    grievance_id=grievance.pk,
+                    uploaded_by_id=grievance.submitted_by_id or rng.choice(responders),
+                    file_name=name, file_path=f'grievances/{grievance.grievance_id}/{name}',
+                    file_size=rng.randint(20_000, 5_000_000), content_type=content_type,
+                    is_public=rng.random() < 0.5, uploaded_at=moment, updated_at=moment,
+                ))
+            for _ in range(int(rng.expovariate(1 / plan['audit'])) if plan['audit'] else 0):
+                events.append(AuditLog(
+                    user_id=rng.choice(responders), action=rng.choice(AUDIT_ACTIONS),
+                    model_name='Grievance', object_id=grievance.pk, details={},
+                    ip_address=f'10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}',
+                    user_agent='load-generator',
+                    timestamp=grievance.submitted_at + timedelta(seconds=rng.random() * window),
+                ))
+        GrievanceMessage.objects.bulk_create(messages, batch_size=1000)
+        GrievanceDocument.objects.bulk_create(documents, batch_size=1000)
+        AuditLog.objects.bulk_create(events, batch_size=1000)
+    return len(grievances), len(messages), len(documents), len(events)
+
+
+class Command(BaseCommand):
+    help = 'Generate companies, users, grievances, messages, documents and audit rows for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--companies', type=int, default=50)
+        parser.add_argument('--users', type=int, default=10_000, help='Policyholder accounts')
+        parser.add_argument('--grievances', type=int, default=1_000_000)
+        parser.add_argument('--messages', type=float, default=3.0, help='Average messages per grievance')
+        parser.add_argument('--documents', type=float, default=0.5, help='Average documents per grievance')
+        parser.add_argument('--audit', type=float, default=5.0, help='Average audit rows per grievance')
+        parser.add_argument('--days', type=int, default=730, help='Spread submissions over this many days')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Grievances per batch/transaction')
+        parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(),
+                            help='Worker processes (always 1 on SQLite)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--resume', action='store_true',
+                            help='Skip batches that an earlier run with the same seed completed')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        seed = options['seed']
+        if not 0 <= seed <= MAX_SEED:
+            raise CommandError(f'--seed must be between 0 and {MAX_SEED}')
+        company_ids = self.create_companies(options['companies'], seed)
+        policyholders, staff, admins = self.create_users(options['users'], company_ids, seed)
+
+        rng = random.Random(seed)
+        plan = {
+            'seed': seed,
+            'grievances': options['grievances'],
+            'batch_size': options['batch_size'],
+            'days': options['days'],
+            'messages': options['messages'],
+            'documents': options['documents'],
+            'audit': options['audit'],
+            'companies': company_ids,
+            # A few large insurers receive most grievances
+            'company_weights': [1 / (rank + 1) ** 0.8 for rank in rng.sample(range(len(company_ids)),
+                                                                              len(company_ids))],
+            'policyholders': policyholders,
+            'staff': staff,
+            'admins': admins,
+        }
+        batches = list(range(-(-options['grievances'] // options['batch_size'])))
+        if options['resume']:
+            batches = self.pending_batches(batches, plan)
+        ensure_partitions(start=timezone.now() - timedelta(days=options['days']))
+
+        workers = 1 if connection.vendor == 'sqlite' else max(1, options['workers'])
+        self.stdout.write(f'Generating {len(batches)} batches with {workers} worker(s)...')
+        totals = [0, 0, 0, 0]
+        tasks = [(plan, batch) for batch in batches]
+        if workers == 1:
+            results = map(generate_batch, tasks)
+            self.report(results, totals, len(tasks), started)
+        else:
+            # Forked workers must open their own database connections
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            with context.Pool(workers) as pool:
+                self.report(pool.imap_unordered(generate_batch, tasks), totals, len(tasks), started)
+
+        self.stdout.write('Rebuilding counters and search vectors...')
+        counters.rebuild()
+        update_search_vectors()
+        invalidate('grievances', 'companies')
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {totals[0]:,} grievances, {totals[1]:,} messages, {totals[2]:,} documents and '
+            f'{totals[3]:,} audit rows in {time.perf_counter() - started:.1f}s'
+        ))
+
+    def report(self, results, totals, batches, started):
+        for done, counts in enumerate(results, 1):
+            totals[:] = [total + count for total, count in zip(totals, counts)]
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'  {done}/{batches} batches, {totals[0]:,} grievances '
+                              f'({totals[0] / elapsed:,.0f}/s)')
+
+    def pending_batches(self, batches, plan):
+        last_ids = {
+            grievance_number_id(plan['seed'], min((batch + 1) * plan['batch_size'], plan['grievances']) - 1): batch
+            for batch in batches
+        }
+        done = set(Grievance.objects.filter(grievance_id__in=list(last_ids)).values_list('grievance_id', flat=True))
+        self.stdout.write(f'Resuming: {len(done)} of {len(batches)} batches already present')
+        return [batch for grievance_id, batch in last_ids.items() if grievance_id not in done]
+
+    def create_companies(self, count, seed):
+        rng = random.Random(f'{seed}:companies')
+        InsuranceCompany.objects.bulk_create([
+            InsuranceCompany(
+                name=f'Load Test Insurance {number:04d}',
+                license_number=f'LOAD-{number:05d}',
+                established_year=rng.randint(1960, 2015),
+                address='Dhaka, Bangladesh',
+                phone=f'+88017{rng.randrange(10 ** 8):08d}',
+                email=f'company{number}@example.test',
+                registration_date=date(2020, 1, 1),
+                license_expiry_date=date(2030, 1, 1),
+                authorized_capital=rng.randint(1, 50) * 10 ** 8,
+                paid_up_capital=rng.randint(1, 25) * 10 ** 8,
+            )
+            for number in range(count)
+        ], ignore_conflicts=True)
+        return list(
+            InsuranceCompany.objects.filter(license_number__startswith='LOAD-')
+            .order_by('license_number').values_list('pk', flat=True)[:count]
+        )
+
+    def create_users(self, count, company_ids, seed):
+        """Policyholders, ``STAFF_PER_COMPANY`` staff per company and a few IDRA administrators"""
+        password = make_password('loadtest123')
+        accounts = [(f'policyholder{n}', 'policyholder', None) for n in range(count)]
+        accounts += [(f'staff{company_id}-{n}', 'insurance_company', company_id)
+                     for company_id in company_ids for n in range(STAFF_PER_COMPANY)]
+        accounts += [(f'admin{n}', 'idra_admin', None) for n in range(ADMINS)]
+
+        for offset in range(0, len(accounts), 5000):
+            chunk = accounts[offset:offset + 5000]
+            User.objects.bulk_create([
+                User(username=f'load-{name}', email=f'load-{name}@example.test', password=password,
+                     first_name=FIRST_NAMES[index % len(FIRST_NAMES)],
+                     last_name=LAST_NAMES[index % len(LAST_NAMES)], is_staff=role == 'idra_admin')
+                for index, (name, role, _) in enumerate(chunk, offset)
+            ], ignore_conflicts=True)
+            user_ids = dict(User.objects.filter(
+                email__in=[f'load-{name}@example.test' for name, _, _ in chunk]
+            ).values_list('email', 'pk'))
+            UserProfile.objects.bulk_create([
+                UserProfile(user_id=user_ids[f'load-{name}@example.test'], role=role, company_id=company_id)
+                for name, role, company_id in chunk
+            ], ignore_conflicts=True)
+
+        profiles = UserProfile.objects.filter(user__email__startswith='load-').values_list(
+            'user_id', 'role', 'company_id')
+        policyholders, staff, admins = [], {}, []
+        for user_id, role, company_id in profiles.order_by('user_id').iterator(chunk_size=10_000):
+            if role == 'policyholder':
+                policyholders.append(user_id)
+            elif role == 'insurance_company':
+                staff.setdefault(company_id, []).append(user_id)
+            else:
+                admins.append(user_id)
+        return policyholders[:count], staff, admins
@@ -0,0 +1,64 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from companies.models import InsuranceCompany
+from grievances.bulk_import import (
+    DEFAULT_CHUNK_SIZE, GrievanceImporter, ImportFormatError, ImportNotAllowed, read_rows,
+)
+
+
+class Command(BaseCommand):
+    help = 'Bulk-import grievances from a CSV or JSONL file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', dest='import_format', choices=['csv', 'jsonl'],
+                            help='Defaults to the file extension')
+        parser.add_argument('--user', required=True,
+                            help='Email of the user the import (and initial messages) is attributed to')
+        parser.add_argument('--company', help='Only accept rows for this license number')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--errors', help='Write the per-row error report to this CSV file')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(email=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user with email {options['user']}")
+        company = None
+        if options['company']:
+            company = InsuranceCompany.objects.filter(license_number=options['company']).first()
+            if company is None:
+                raise CommandError(f"No insurance company with license {options['company']}")
+        import_format = options['import_format'] or options['path'].rsplit('.', 1)[-1].lower()
+
+        try:
+            importer = GrievanceImporter(user, company=company, chunk_size=options['chunk_size'])
+        except ImportNotAllowed as error:
+            raise CommandError(str(error))
+        started = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as stream:
+                report = importer.run(read_rows(stream, import_format))
+        except ImportFormatError as error:
+            if error.report is not None and error.report.created:
+                raise CommandError(f'{error} ({error.report.created} rows from earlier chunks were imported)')
+            raise CommandError(str(error))
+        elapsed = time.perf_counter() - started
+
+        if options['errors']:
+            with open(options['errors'], 'w', newline='') as output:
+                writer = csv.writer(output)
+                writer.writerow(['row', 'field', 'error'])
+                for failure in report.errors:
+                    for field, messages in failure['errors'].items():
+                        for message in messages:
+                            writer.writerow([failure['row'], field, message])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {report.created} of {report.rows} rows in {elapsed:.1f}s '
+            f'({report.rows / elapsed if elapsed else 0:,.0f} rows/s); {report.failed} failed'
+        ))
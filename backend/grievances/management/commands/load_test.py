@@ -0,0 +1,168 @@
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class SlowClient:
+    """One keep-alive connection that writes and reads like a mobile client on a poor network"""
+
+    def __init__(self, host, port, path, send_delay, read_rate, think_time, timeout):
+        self.host, self.port, self.path = host, port, path
+        self.send_delay = send_delay
+        self.read_rate = read_rate
+        self.think_time = think_time
+        self.timeout = timeout
+        self.reader = self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    async def request(self):
+        if self.writer is None:
+            await self.connect()
+        head = (f'GET {self.path} HTTP/1.1\r\nHost: {self.host}\r\n'
+                'User-Agent: load-test\r\nAccept: */*\r\n\r\n').encode()
+        # Trickle the request out in a few pieces
+        for start in range(0, len(head), 32):
+            self.writer.write(head[start:start + 32])
+            await self.writer.drain()
+            if self.send_delay:
+                await asyncio.sleep(self.send_delay)
+
+        headers = await asyncio.wait_for(self.reader.readuntil(b'\r\n\r\n'), self.timeout)
+        status = int(headers.split(b' ', 2)[1])
+        length, chunked, keep_alive = 0, False, True
+        for line in headers.decode('latin-1').split('\r\n')[1:]:
+            name, _, value = line.partition(':')
+            name, value = name.strip().lower(), value.strip().lower()
+            if name == 'content-length':
+                length = int(value)
+            elif name == 'transfer-encoding' and 'chunked' in value:
+                chunked = True
+            elif name == 'connection' and value == 'close':
+                keep_alive = False
+
+        if chunked:
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                await self.read(size + 2)
+                if size == 0:
+                    break
+        else:
+            await self.read(length)
+        if not keep_alive:
+            self.close()
+        return status
+
+    async def read(self, remaining):
+        # Limit throughput to read_rate bytes per second
+        piece = max(1, int(self.read_rate / 10)) if self.read_rate else remaining or 1
+        while remaining > 0:
+            data = await asyncio.wait_for(self.reader.read(min(piece, remaining)), self.timeout)
+            if not data:
+                raise ConnectionError('Connection closed mid-response')
+            remaining -= len(data)
+            if self.read_rate:
+                await asyncio.sleep(len(data) / self.read_rate)
+
+
+class Command(BaseCommand):
+    help = ('Load-test one URL with many concurrent slow keep-alive clients and report throughput, '
+            'latency percentiles and errors (run once per server mode to compare)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='e.g. http://127.0.0.1:6789/grievances/api/track/IDRA-2025-000001/')
+        parser.add_argument('--clients', type=int, default=500, help='Concurrent connections')
+        parser.add_argument('--duration', type=float, default=20.0, help='Seconds to run')
+        parser.add_argument('--ramp-up', type=float, default=2.0, help='Seconds over which clients connect')
+        parser.add_argument('--send-delay', type=float, default=0.05,
+                            help='Seconds between request fragments (slow uplink)')
+        parser.add_argument('--read-rate', type=float, default=20_000,
+                            help='Bytes per second each client reads (0 = unlimited)')
+        parser.add_argument('--think-time', type=float, default=1.0, help='Seconds between requests per client')
+        parser.add_argument('--timeout', type=float, default=30.0, help='Seconds before a request fails')
+        parser.add_argument('--label', default='', help='Name for this run in the report')
+        parser.add_argument('--output', '-o', help='Also write the report as JSON to this file')
+
+    def handle(self, *args, **options):
+        parts = urlsplit(options['url'])
+        if parts.scheme != 'http' or not parts.hostname:
+            raise CommandError('Only plain http:// URLs are supported.')
+        path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        report = asyncio.run(self.run(parts.hostname, parts.port or 80, path, options))
+        report['label'] = options['label']
+
+        self.stdout.write(
+            f"{options['label'] or options['url']}: {report['requests']} requests "
+            f"({report['requests_per_second']:.1f}/s), {report['errors']} errors, "
+            f"p50 {report['p50_ms']:.1f} ms, p95 {report['p95_ms']:.1f} ms, p99 {report['p99_ms']:.1f} ms, "
+            f"{report['connected']}/{options['clients']} clients connected"
+        )
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(report, handle, indent=2)
+
+    async def run(self, host, port, path, options):
+        timings, errors, statuses = [], [], {}
+        connected = 0
+        deadline = time.monotonic() + options['duration']
+
+        async def client(number):
+            nonlocal connected
+            await asyncio.sleep(options['ramp_up'] * number / options['clients'])
+            session = SlowClient(host, port, path, options['send_delay'], options['read_rate'],
+                                 options['think_time'], options['timeout'])
+            try:
+                await session.connect()
+                connected += 1
+            except (OSError, asyncio.TimeoutError) as error:
+                errors.append(type(error).__name__)
+                return
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    status = await session.request()
+                except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError) as error:
+                    errors.append(type(error).__name__)
+                    session.close()
+                    await asyncio.sleep(options['think_time'])
+                    continue
+                timings.append((time.perf_counter() - started) * 1000)
+                statuses[status] = statuses.get(status, 0) + 1
+                if status >= 500:
+                    errors.append(f'HTTP {status}')
+                await asyncio.sleep(options['think_time'])
+            session.close()
+
+        started = time.monotonic()
+        await asyncio.gather(*(client(number) for number in range(options['clients'])))
+        elapsed = time.monotonic() - started
+
+        timings.sort()
+
+        def percentile(fraction):
+            return timings[min(len(timings) - 1, int(len(timings) * fraction))] if timings else 0.0
+
+        return {
+            'clients': options['clients'],
+            'connected': connected,
+            'duration_s': round(elapsed, 2),
+            'requests': len(timings),
+            'requests_per_second': round(len(timings) / elapsed, 2) if elapsed else 0.0,
+            'errors': len(errors),
+            'error_types': {name: errors.count(name) for name in set(errors)},
+            'statuses': {str(status): count for status, count in sorted(statuses.items())},
+            'p50_ms': round(statistics.median(timings), 2) if timings else 0.0,
+            'p95_ms': round(percentile(0.95), 2),
+            'p99_ms': round(percentile(0.99), 2),
+        }
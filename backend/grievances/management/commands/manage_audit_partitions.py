@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from grievances import audit_storage
+
+
+class Command(BaseCommand):
+    help = 'Create upcoming audit log partitions and archive months older than AUDIT_HOT_MONTHS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=None,
+                            help='Months of partitions to create ahead of now (default AUDIT_PARTITIONS_AHEAD)')
+        parser.add_argument('--no-archive', action='store_true', help='Only create partitions')
+        parser.add_argument('--verify', action='store_true',
+                            help='Check archive files against the manifest checksums and exit')
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            problems = audit_storage.verify_archives()
+            for entry in problems:
+                self.stdout.write(self.style.ERROR(f"Archive {entry['file']} is missing or corrupt"))
+            if not problems:
+                self.stdout.write(self.style.SUCCESS(
+                    f'{len(audit_storage.read_manifest())} archives match the manifest'
+                ))
+            return
+
+        if audit_storage.is_partitioned():
+            created = audit_storage.ensure_partitions(options['ahead'])
+            self.stdout.write(f"Created partitions: {', '.join(created) or 'none needed'}")
+        else:
+            self.stdout.write('Audit log is not partitioned on this database; archiving rows only')
+
+        if not options['no_archive']:
+            for entry in audit_storage.archive_before(audit_storage.hot_cutoff()):
+                self.stdout.write(self.style.SUCCESS(
+                    f"Archived {entry['rows']} events from {entry['start'][:7]} to {entry['file']}"
+                ))
@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from grievances.uploads import purge_expired_uploads
+
+
+class Command(BaseCommand):
+    help = 'Abandon document uploads not finished within DOCUMENT_UPLOAD_EXPIRY_HOURS'
+
+    def handle(self, *args, **options):
+        purged = purge_expired_uploads()
+        self.stdout.write(self.style.SUCCESS(
+            f'Purged {purged} uploads older than {settings.DOCUMENT_UPLOAD_EXPIRY_HOURS:g} hours'
+        ))
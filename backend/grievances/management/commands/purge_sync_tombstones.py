@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from grievances.sync import purge_tombstones, tombstone_retention
+
+
+class Command(BaseCommand):
+    help = 'Delete delta-sync tombstones older than SYNC_TOMBSTONE_RETENTION_DAYS'
+
+    def handle(self, *args, **options):
+        deleted = purge_tombstones()
+        self.stdout.write(self.style.SUCCESS(
+            f'Purged {deleted} tombstones older than {tombstone_retention().days} days'
+        ))
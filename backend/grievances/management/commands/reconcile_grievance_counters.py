@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from grievances import counters
+from grievances.models import Grievance, GrievanceCounter
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized grievance counters from the grievance table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report whether the counters have drifted')
+
+    def handle(self, *args, **options):
+        expected = Grievance.objects.count()
+        counted = counters.grievance_count()
+
+        if options['check']:
+            if expected == counted:
+                self.stdout.write(self.style.SUCCESS(f'Counters match: {counted} grievances'))
+            else:
+                self.stdout.write(self.style.WARNING(
+                    f'Counters drifted: {counted} counted, {expected} grievances'
+                ))
+            return
+
+        buckets = counters.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {buckets} counter buckets covering {expected} grievances '
+            f'(was {counted}, {GrievanceCounter.objects.count()} buckets now stored)'
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from core.audit import AuditWriter
+
+
+class Command(BaseCommand):
+    help = 'Write audit events spilled to AUDIT_SPILL_PATH into the audit log'
+
+    def handle(self, *args, **options):
+        writer = AuditWriter()
+        if not writer.has_spill():
+            self.stdout.write(f'No spilled audit events at {writer.spill_path}')
+            return
+        replayed = writer.replay_spill()
+        if writer.has_spill():
+            self.stdout.write(self.style.WARNING(
+                f'Replayed {replayed} audit events; some remain in {writer.spill_path}'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Replayed {replayed} audit events'))
@@ -0,0 +1,44 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+
+from core.metrics import get_registry
+from grievances.sla import sweep
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Escalate grievances near or past their SLA deadline, every SLA_SWEEP_INTERVAL seconds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run one sweep and exit')
+        parser.add_argument('--interval', type=float, help='Seconds between sweeps')
+        parser.add_argument('--batch-size', type=int, help='Grievances escalated per transaction')
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or getattr(settings, 'SLA_SWEEP_INTERVAL', 60)
+        while True:
+            started = time.monotonic()
+            close_old_connections()
+            try:
+                escalated = sweep(batch_size=options['batch_size'])
+            except DatabaseError:
+                if options['once']:
+                    raise
+                logger.exception('SLA sweep failed; retrying in %.0fs', interval)
+            else:
+                self.stdout.write(
+                    f"Escalated {escalated['breached']} breached and {escalated['near_breach']} "
+                    f"near-breach grievances in {(time.monotonic() - started) * 1000:.1f} ms"
+                )
+            get_registry().flush(force=True)
+            if options['once']:
+                return
+            try:
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+            except KeyboardInterrupt:
+                return
@@ -0,0 +1,36 @@
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.tasks import Worker, queue_concurrency
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs (see core.tasks) until stopped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', '-q', action='append', default=[], metavar='NAME[:THREADS]',
+                            help='Queue to consume, with its number of threads (default: TASK_QUEUES)')
+        parser.add_argument('--burst', action='store_true',
+                            help='Run every due job in this thread, then exit')
+
+    def handle(self, *args, **options):
+        queues = {}
+        for entry in options['queue']:
+            name, _, threads = entry.partition(':')
+            try:
+                queues[name] = int(threads or queue_concurrency().get(name, 1))
+            except ValueError:
+                raise CommandError(f'Invalid queue {entry!r}; expected NAME or NAME:THREADS')
+        worker = Worker(queues or None)
+
+        if options['burst']:
+            ran = worker.run_burst()
+            self.stdout.write(f'Ran {ran} jobs')
+            return
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: worker.stop())
+        self.stdout.write('Consuming ' + ', '.join(f'{name} ({threads} threads)'
+                                                   for name, threads in worker.queues.items()))
+        worker.run()
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+
+
+def resident_memory_mb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as handle:
+            for line in handle:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class Stream:
+    """One idle event-stream subscriber that reconnects where it left off"""
+
+    def __init__(self, host, port, path, cookie, timeout, stats):
+        self.host, self.port, self.path = host, port, path
+        self.cookie = cookie
+        self.timeout = timeout
+        self.stats = stats
+        self.last_id = None
+
+    async def follow(self, deadline):
+        while time.monotonic() < deadline:
+            try:
+                await self.open(deadline)
+            except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError) as error:
+                self.stats['errors'][type(error).__name__] = self.stats['errors'].get(type(error).__name__, 0) + 1
+                await asyncio.sleep(1)
+
+    async def open(self, deadline):
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        try:
+            resume = f'Last-Event-ID: {self.last_id}\r\n' if self.last_id is not None else ''
+            writer.write((f'GET {self.path} HTTP/1.1\r\nHost: {self.host}\r\nAccept: text/event-stream\r\n'
+                          f'Cookie: {self.cookie}\r\n{resume}Connection: close\r\n\r\n').encode())
+            await writer.drain()
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.timeout)
+            status = int(head.split(b' ', 2)[1])
+            if status != 200:
+                raise ValueError(f'HTTP {status}')
+            self.stats['opened'] += 1
+            self.stats['open'] += 1
+            try:
+                # Idle streams only carry heartbeats, so a silence much longer
+                # than the heartbeat interval means the stream is stuck
+                while (remaining := deadline - time.monotonic()) > 0:
+                    line = await asyncio.wait_for(reader.readline(), min(remaining, self.timeout))
+                    if not line:
+                        break
+                    if line.startswith(b': keep-alive'):
+                        self.stats['heartbeats'] += 1
+                    elif line.startswith(b'id: '):
+                        self.last_id = int(line[4:])
+                    elif line.startswith(b'data: '):
+                        self.stats['events'] += 1
+            except asyncio.TimeoutError:
+                if time.monotonic() < deadline:
+                    raise
+            finally:
+                self.stats['open'] -= 1
+        finally:
+            writer.close()
+
+
+class Command(BaseCommand):
+    help = ('Hold many idle subscribers on one grievance event stream and report how many stay connected '
+            'and the server memory they cost (point it at a single process to measure per-process capacity)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='e.g. http://127.0.0.1:6789/grievances/api/1/events/')
+        parser.add_argument('--user', required=True, help='Email of a user allowed to follow the grievance')
+        parser.add_argument('--subscribers', type=int, default=10_000)
+        parser.add_argument('--duration', type=float, default=120.0, help='Seconds to hold the streams')
+        parser.add_argument('--ramp-up', type=float, default=30.0, help='Seconds over which subscribers connect')
+        parser.add_argument('--timeout', type=float, default=60.0,
+                            help='Seconds to wait for a connection, a response or the next heartbeat')
+        parser.add_argument('--server-pid', type=int, help='Report the resident memory of this server process')
+        parser.add_argument('--min-connected', type=float, default=0.99,
+                            help='Fail unless this fraction of subscribers is connected at the end')
+        parser.add_argument('--output', '-o', help='Also write the report as JSON to this file')
+
+    def handle(self, *args, **options):
+        parts = urlsplit(options['url'])
+        if parts.scheme != 'http' or not parts.hostname:
+            raise CommandError('Only plain http:// URLs are supported.')
+        try:
+            user = User.objects.get(email=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user with email {options['user']!r}")
+
+        # One logged-in session shared by every subscriber
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        cookie = f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
+
+        path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        try:
+            report = asyncio.run(self.run(parts.hostname, parts.port or 80, path, cookie, options))
+        finally:
+            session.delete()
+
+        self.stdout.write(
+            f"{report['connected']}/{options['subscribers']} subscribers connected after "
+            f"{report['duration_s']:.0f} s ({report['opened']} streams opened, {report['heartbeats']} heartbeats, "
+            f"{report['events']} events, {sum(report['errors'].values())} errors)"
+        )
+        if report['server_rss_mb'] is not None:
+            self.stdout.write(f"Server RSS {report['server_rss_before_mb']:.0f} MB idle, "
+                              f"{report['server_rss_mb']:.0f} MB with the subscribers connected")
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(report, handle, indent=2)
+        if report['connected'] < options['subscribers'] * options['min_connected']:
+            raise CommandError(f"Only {report['connected']} of {options['subscribers']} subscribers stayed connected")
+
+    async def run(self, host, port, path, cookie, options):
+        stats = {'opened': 0, 'open': 0, 'heartbeats': 0, 'events': 0, 'errors': {}}
+        rss_before = resident_memory_mb(options['server_pid']) if options['server_pid'] else None
+        started = time.monotonic()
+        deadline = started + options['duration']
+
+        async def subscriber(number):
+            await asyncio.sleep(options['ramp_up'] * number / options['subscribers'])
+            await Stream(host, port, path, cookie, options['timeout'], stats).follow(deadline)
+
+        tasks = [asyncio.create_task(subscriber(number)) for number in range(options['subscribers'])]
+        # Sample just before the streams close
+        await asyncio.sleep(max(0.0, deadline - time.monotonic() - 1))
+        connected = stats['open']
+        rss = resident_memory_mb(options['server_pid']) if options['server_pid'] else None
+        await asyncio.gather(*tasks)
+
+        return {
+            'subscribers': options['subscribers'],
+            'connected': connected,
+            'duration_s': round(time.monotonic() - started, 2),
+            'opened': stats['opened'],
+            'heartbeats': stats['heartbeats'],
+            'events': stats['events'],
+            'errors': stats['errors'],
+            'server_rss_before_mb': rss_before,
+            'server_rss_mb': rss,
+        }
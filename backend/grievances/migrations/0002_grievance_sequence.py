@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grievances', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GrievanceSequence',
+            fields=[
+                ('year', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('next_value', models.PositiveIntegerField(default=1)),
+            ],
+            options={
+                'verbose_name': 'Grievance Sequence',
+                'verbose_name_plural': 'Grievance Sequences',
+            },
+        ),
+    ]
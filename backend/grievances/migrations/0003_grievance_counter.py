@@ -0,0 +1,61 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_counters(apps, schema_editor):
+    from django.db.models import Count
+    from django.db.models.functions import TruncMonth
+    from django.utils import timezone
+
+    Grievance = apps.get_model('grievances', 'Grievance')
+    GrievanceCounter = apps.get_model('grievances', 'GrievanceCounter')
+    buckets = (
+        Grievance.objects.order_by()
+        .annotate(month=TruncMonth('submitted_at'))
+        .values('insurance_company_id', 'status', 'category', 'month')
+        .annotate(total=Count('id'))
+    )
+    GrievanceCounter.objects.bulk_create([
+        GrievanceCounter(
+            company_id=bucket['insurance_company_id'],
+            status=bucket['status'],
+            category=bucket['category'],
+            month=timezone.localtime(bucket['month']).date(),
+            count=bucket['total'],
+        )
+        for bucket in buckets
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0001_initial'),
+        ('grievances', '0002_grievance_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GrievanceCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=20)),
+                ('category', models.CharField(max_length=20)),
+                ('month', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='grievance_counters', to='companies.insurancecompany')),
+            ],
+            options={
+                'verbose_name': 'Grievance Counter',
+                'verbose_name_plural': 'Grievance Counters',
+                'indexes': [models.Index(fields=['status'], name='grievances__status_a6c809_idx'), models.Index(fields=['month'], name='grievances__month_2e1027_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='grievancecounter',
+            constraint=models.UniqueConstraint(fields=('company', 'status', 'category', 'month'), name='unique_grievance_counter_bucket'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grievances', '0003_grievance_counter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='grievance',
+            index=models.Index(fields=['-submitted_at', '-id'], name='grievances__submitt_32f22f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grievance',
+            index=models.Index(fields=['insurance_company', '-submitted_at', '-id'], name='grievances__insuran_f5376b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grievance',
+            index=models.Index(fields=['submitted_by', '-submitted_at', '-id'], name='grievances__submitt_80a328_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grievancemessage',
+            index=models.Index(fields=['grievance', 'created_at', 'id'], name='grievances__grievan_3d0908_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:52
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# GIN indexes are PostgreSQL-only, so they are created here rather than
+# declared in Grievance.Meta (which would break the SQLite test database).
+SEARCH_INDEXES = {
+    'grievance_search_vector_gin': 'search_vector',
+    'grievance_complainant_trgm': 'complainant_name gin_trgm_ops',
+    'grievance_policy_number_trgm': 'policy_number gin_trgm_ops',
+    'grievance_grievance_id_trgm': 'grievance_id gin_trgm_ops',
+}
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, column in SEARCH_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON grievances_grievance USING gin ({column})'
+        )
+
+    from grievances.search import update_search_vectors
+    update_search_vectors(using=schema_editor.connection.alias)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grievances', '0004_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='grievance',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grievances', '0005_grievance_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_name', models.CharField(choices=[('grievance', 'Grievance'), ('message', 'Grievance Message'), ('document', 'Grievance Document')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('grievance_ref', models.PositiveBigIntegerField()),
+                ('company_ref', models.PositiveBigIntegerField(null=True)),
+                ('submitted_by_ref', models.PositiveBigIntegerField(null=True)),
+                ('is_internal', models.BooleanField(default=False)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Sync Tombstone',
+                'verbose_name_plural': 'Sync Tombstones',
+                'ordering': ['deleted_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='grievancedocument',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='grievance',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='grievancemessage',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:01
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grievances', '0006_sync_tracking'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='auditlog',
+            name='action',
+            field=models.CharField(choices=[('create', 'Created'), ('update', 'Updated'), ('delete', 'Deleted'), ('view', 'Viewed'), ('assign', 'Assigned'), ('status_change', 'Status Changed'), ('message_sent', 'Message Sent'), ('file_upload', 'File Uploaded'), ('login', 'Logged In'), ('logout', 'Logged Out')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='auditlog',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:03
+
+from django.db import migrations, models
+
+# Declarative partitioning is PostgreSQL-only; other databases keep the plain
+# table. The primary key must include the partition key, so the table is
+# rebuilt as (id, timestamp) and the existing rows copied across.
+PARTITIONED_TABLE_SQL = '''
+    ALTER TABLE grievances_auditlog RENAME TO grievances_auditlog_unpartitioned;
+    CREATE SEQUENCE IF NOT EXISTS grievances_auditlog_event_id_seq AS bigint;
+    CREATE TABLE grievances_auditlog (
+        id bigint NOT NULL DEFAULT nextval('grievances_auditlog_event_id_seq'),
+        action varchar(20) NOT NULL,
+        model_name varchar(50) NOT NULL,
+        object_id integer NOT NULL CHECK (object_id >= 0),
+        details jsonb NOT NULL,
+        ip_address inet NOT NULL,
+        user_agent text NOT NULL,
+        "timestamp" timestamp with time zone NOT NULL,
+        user_id bigint NOT NULL REFERENCES accounts_user (id) DEFERRABLE INITIALLY DEFERRED,
+        PRIMARY KEY (id, "timestamp")
+    ) PARTITION BY RANGE ("timestamp");
+    ALTER SEQUENCE grievances_auditlog_event_id_seq OWNED BY grievances_auditlog.id;
+    CREATE TABLE grievances_auditlog_default PARTITION OF grievances_auditlog DEFAULT;
+'''
+
+COPY_ROWS_SQL = '''
+    INSERT INTO grievances_auditlog
+        (id, action, model_name, object_id, details, ip_address, user_agent, "timestamp", user_id)
+    SELECT id, action, model_name, object_id, details, ip_address, user_agent, "timestamp", user_id
+    FROM grievances_auditlog_unpartitioned;
+    SELECT setval('grievances_auditlog_event_id_seq',
+                  (SELECT coalesce(max(id), 0) + 1 FROM grievances_auditlog), false);
+    DROP TABLE grievances_auditlog_unpartitioned;
+'''
+
+
+def partition_audit_log(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    from grievances.audit_storage import ensure_partitions
+
+    alias = schema_editor.connection.alias
+    AuditLog = apps.get_model('grievances', 'AuditLog')
+    oldest = AuditLog.objects.using(alias).order_by('timestamp').values_list('timestamp', flat=True).first()
+
+    schema_editor.execute(PARTITIONED_TABLE_SQL)
+    ensure_partitions(start=oldest, using=alias)
+    schema_editor.execute(COPY_ROWS_SQL)
+    for index in AuditLog._meta.indexes:
+        schema_editor.add_index(AuditLog, index)
+
+
+def unpartition_audit_log(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('''
+        ALTER TABLE grievances_auditlog RENAME TO grievances_auditlog_partitioned;
+        CREATE TABLE grievances_auditlog (LIKE grievances_auditlog_partitioned INCLUDING DEFAULTS);
+        INSERT INTO grievances_auditlog SELECT * FROM grievances_auditlog_partitioned;
+        ALTER SEQUENCE grievances_auditlog_event_id_seq OWNED BY grievances_auditlog.id;
+        DROP TABLE grievances_auditlog_partitioned;
+        ALTER TABLE grievances_auditlog ADD PRIMARY KEY (id);
+        ALTER TABLE grievances_auditlog ADD FOREIGN KEY (user_id)
+            REFERENCES accounts_user (id) DEFERRABLE INITIALLY DEFERRED;
+    ''')
+    AuditLog = apps.get_model('grievances', 'AuditLog')
+    for index in AuditLog._meta.indexes:
+        schema_editor.add_index(AuditLog, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grievances', '0007_audit_event_time'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='auditlog',
+            name='grievances__user_id_cb5c8c_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='auditlog',
+            name='grievances__model_n_e9d737_idx',
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['user', 'timestamp'], name='auditlog_user_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['model_name', 'object_id', 'timestamp'], name='auditlog_object_time_idx'),
+        ),
+        migrations.RunPython(partition_audit_log, unpartition_audit_log),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grievances', '0008_auditlog_partitioning'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='grievance',
+            index=models.Index(condition=models.Q(('status__in', ['resolved', 'closed']), _negated=True), fields=['sla_deadline'], name='grievance_open_sla_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grievance',
+            index=models.Index(fields=['resolved_at'], name='grievance_resolved_at_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grievances', '0009_metrics_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='grievance',
+            name='escalated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='grievance',
+            name='escalation_level',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'None'), (1, 'Near Breach'), (2, 'Breached')], default=0),
+        ),
+        migrations.AddIndex(
+            model_name='grievance',
+            index=models.Index(condition=models.Q(models.Q(('status__in', ['resolved', 'closed']), _negated=True), ('escalation_level__lt', 2)), fields=['escalation_level', 'sla_deadline'], name='grievance_sla_escalation_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('grievances', '0011_background_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='grievancedocument',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.CreateModel(
+            name='DocumentUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('storage_id', models.CharField(max_length=200)),
+                ('file_name', models.CharField(max_length=255)),
+                ('file_size', models.PositiveIntegerField()),
+                ('content_type', models.CharField(max_length=100)),
+                ('description', models.TextField(blank=True)),
+                ('is_public', models.BooleanField(default=False)),
+                ('chunk_size', models.PositiveIntegerField()),
+                ('offset', models.PositiveIntegerField(default=0)),
+                ('digests', models.BinaryField(default=bytes)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('grievance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='uploads', to='grievances.grievance')),
+                ('uploaded_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Document Upload',
+                'verbose_name_plural': 'Document Uploads',
+            },
+        ),
+    ]
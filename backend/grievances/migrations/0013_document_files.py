@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grievances', '0012_document_uploads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentFile',
+            fields=[
+                ('key', models.CharField(max_length=500, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Document File',
+                'verbose_name_plural': 'Document Files',
+            },
+        ),
+    ]
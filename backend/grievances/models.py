@@ -1,5 +1,9 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -32,6 +36,12 @@ class Grievance(models.Model):
         ('other', 'Other'),
     ]
     
+    ESCALATION_CHOICES = [
+        (0, 'None'),
+        (1, 'Near Breach'),
+        (2, 'Breached'),
+    ]
+    
     # Basic Information
     grievance_id = models.CharField(max_length=20, unique=True)
     title = models.CharField(max_length=200)
@@ -76,6 +86,10 @@ class Grievance(models.Model):
     sla_deadline = models.DateTimeField()
     resolved_at = models.DateTimeField(null=True, blank=True)
     
+    # SLA escalation (set by grievances.sla.sweep)
+    escalation_level = models.PositiveSmallIntegerField(choices=ESCALATION_CHOICES, default=0)
+    escalated_at = models.DateTimeField(null=True, blank=True)
+    
     # Financial details
     claim_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
     settlement_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
@@ -85,7 +99,10 @@ class Grievance(models.Model):
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    
+    # Full-text search (maintained by grievances.search, PostgreSQL only)
+    search_vector = SearchVectorField(null=True, editable=False)
     
     class Meta:
         verbose_name = "Grievance"
@@ -96,20 +113,54 @@ class Grievance(models.Model):
             models.Index(fields=['status']),
             models.Index(fields=['priority']),
             models.Index(fields=['insurance_company']),
+            # Keyset pagination on (submitted_at, id), globally and per role scope
+            models.Index(fields=['-submitted_at', '-id']),
+            models.Index(fields=['insurance_company', '-submitted_at', '-id']),
+            models.Index(fields=['submitted_by', '-submitted_at', '-id']),
+            # SLA breach counts only look at grievances that are still open
+            models.Index(fields=['sla_deadline'], condition=~models.Q(status__in=['resolved', 'closed']),
+                         name='grievance_open_sla_idx'),
+            models.Index(fields=['resolved_at'], name='grievance_resolved_at_idx'),
+            # The SLA sweep seeks each escalation level by deadline
+            models.Index(fields=['escalation_level', 'sla_deadline'],
+                         condition=~models.Q(status__in=['resolved', 'closed']) & models.Q(escalation_level__lt=2),
+                         name='grievance_sla_escalation_idx'),
         ]
     
     def __str__(self):
         return f"{self.grievance_id} - {self.title}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember which counter bucket the stored row belongs to
+        from .counters import counter_key
+        instance._counter_key = counter_key(instance)
+        return instance
+    
     def save(self, *args, **kwargs):
         if not self.grievance_id:
             # Generate unique grievance ID
-            from datetime import datetime
-            year = datetime.now().year
-            count = Grievance.objects.filter(created_at__year=year).count() + 1
-            self.grievance_id = f"GRV-{year}-{count:05d}"
+            from .id_allocator import allocate_grievance_id
+            self.grievance_id = allocate_grievance_id()
+        if not self.sla_deadline:
+            from .sla import compute_deadline
+            self.sla_deadline = compute_deadline(self.category, self.priority, self.submitted_at)
         super().save(*args, **kwargs)
 
+class GrievanceSequence(models.Model):
+    """Per-year counter backing grievance ID allocation"""
+    
+    year = models.PositiveIntegerField(primary_key=True)
+    next_value = models.PositiveIntegerField(default=1)
+    
+    class Meta:
+        verbose_name = "Grievance Sequence"
+        verbose_name_plural = "Grievance Sequences"
+    
+    def __str__(self):
+        return f"{self.year}: next {self.next_value}"
+
 class GrievanceMessage(models.Model):
     """Model for messages/responses in grievance conversations"""
     
@@ -123,12 +174,15 @@ class GrievanceMessage(models.Model):
     is_internal = models.BooleanField(default=False)  # Internal notes vs public responses
     
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         verbose_name = "Grievance Message"
         verbose_name_plural = "Grievance Messages"
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['grievance', 'created_at', 'id']),
+        ]
     
     def __str__(self):
         return f"Message for {self.grievance.grievance_id} by {self.sender.get_full_name()}"
@@ -144,14 +198,17 @@ class GrievanceDocument(models.Model):
     uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE)
     
     file_name = models.CharField(max_length=255)
-    file_path = models.CharField(max_length=500)
+    file_path = models.CharField(max_length=500)  # storage key (see core.storage)
     file_size = models.PositiveIntegerField()  # in bytes
     content_type = models.CharField(max_length=100)
+    # Names the stored file, which documents with the same content share
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
     
     description = models.TextField(blank=True)
     is_public = models.BooleanField(default=False)
     
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         verbose_name = "Grievance Document"
@@ -161,6 +218,148 @@ class GrievanceDocument(models.Model):
     def __str__(self):
         return f"{self.file_name} for {self.grievance.grievance_id}"
 
+class DocumentUpload(models.Model):
+    """Resumable document upload in progress (see grievances.uploads)"""
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    grievance = models.ForeignKey(
+        Grievance,
+        on_delete=models.CASCADE,
+        related_name='uploads'
+    )
+    uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE)
+    storage_id = models.CharField(max_length=200)
+    
+    file_name = models.CharField(max_length=255)
+    file_size = models.PositiveIntegerField()  # in bytes
+    content_type = models.CharField(max_length=100)
+    description = models.TextField(blank=True)
+    is_public = models.BooleanField(default=False)
+    
+    chunk_size = models.PositiveIntegerField()
+    offset = models.PositiveIntegerField(default=0)  # bytes received
+    digests = models.BinaryField(default=bytes)  # SHA-256 of each chunk received, concatenated
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        verbose_name = "Document Upload"
+        verbose_name_plural = "Document Uploads"
+    
+    def __str__(self):
+        return f"{self.file_name} ({self.offset}/{self.file_size} bytes)"
+
+class DocumentFile(models.Model):
+    """Stored document file shared by documents with the same content (see grievances.uploads)"""
+    
+    # Locked while documents start or stop using the file
+    key = models.CharField(max_length=500, primary_key=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "Document File"
+        verbose_name_plural = "Document Files"
+    
+    def __str__(self):
+        return self.key
+
+class GrievanceCounter(models.Model):
+    """Materialized grievance counts per company, status, category and month"""
+    
+    company = models.ForeignKey(
+        'companies.InsuranceCompany',
+        on_delete=models.CASCADE,
+        related_name='grievance_counters'
+    )
+    status = models.CharField(max_length=20)
+    category = models.CharField(max_length=20)
+    month = models.DateField()  # first day of the month grievances were submitted in
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        verbose_name = "Grievance Counter"
+        verbose_name_plural = "Grievance Counters"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['company', 'status', 'category', 'month'],
+                name='unique_grievance_counter_bucket'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status']),
+            models.Index(fields=['month']),
+        ]
+    
+    def __str__(self):
+        return f"{self.company_id}/{self.status}/{self.category}/{self.month:%Y-%m}: {self.count}"
+
+class SyncTombstone(models.Model):
+    """Record of a deleted grievance, message or document for delta sync"""
+    
+    MODEL_CHOICES = [
+        ('grievance', 'Grievance'),
+        ('message', 'Grievance Message'),
+        ('document', 'Grievance Document'),
+    ]
+    
+    model_name = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    
+    # Scope of the deleted object's grievance, kept as plain IDs since the
+    # rows they point at may be gone too
+    grievance_ref = models.PositiveBigIntegerField()
+    company_ref = models.PositiveBigIntegerField(null=True)
+    submitted_by_ref = models.PositiveBigIntegerField(null=True)
+    is_internal = models.BooleanField(default=False)
+    
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    class Meta:
+        verbose_name = "Sync Tombstone"
+        verbose_name_plural = "Sync Tombstones"
+        ordering = ['deleted_at']
+    
+    def __str__(self):
+        return f"{self.model_name} {self.object_id} deleted at {self.deleted_at}"
+
+class BackgroundJob(models.Model):
+    """Job for the database task backend (see core.tasks)"""
+    
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    queue = models.CharField(max_length=50)
+    task = models.CharField(max_length=200)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    idempotency_key = models.CharField(max_length=200, null=True, blank=True, unique=True)
+    
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    # When the job is due, or for a running job when its lease expires
+    run_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = "Background Job"
+        verbose_name_plural = "Background Jobs"
+        indexes = [
+            models.Index(fields=['queue', 'status', 'run_at'], name='backgroundjob_claim_idx'),
+            models.Index(fields=['finished_at'], name='backgroundjob_finished_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.task} ({self.status})"
+
 class AuditLog(models.Model):
     """Model for tracking all actions in the system"""
     
@@ -173,6 +372,8 @@ class AuditLog(models.Model):
         ('status_change', 'Status Changed'),
         ('message_sent', 'Message Sent'),
         ('file_upload', 'File Uploaded'),
+        ('login', 'Logged In'),
+        ('logout', 'Logged Out'),
     ]
     
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -183,16 +384,19 @@ class AuditLog(models.Model):
     ip_address = models.GenericIPAddressField()
     user_agent = models.TextField(blank=True)
     
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the event happens, not when the batched writer inserts it
+    timestamp = models.DateTimeField(default=timezone.now)
     
     class Meta:
         verbose_name = "Audit Log"
         verbose_name_plural = "Audit Logs"
         ordering = ['-timestamp']
+        # On PostgreSQL the table is range-partitioned by month on timestamp
+        # (migration 0008, managed by grievances.audit_storage)
         indexes = [
-            models.Index(fields=['user']),
-            models.Index(fields=['model_name']),
-            models.Index(fields=['timestamp']),
+            models.Index(fields=['user', 'timestamp'], name='auditlog_user_time_idx'),
+            models.Index(fields=['model_name', 'object_id', 'timestamp'], name='auditlog_object_time_idx'),
+            models.Index(fields=['timestamp'], name='grievances__timesta_97f208_idx'),
         ]
     
     def __str__(self):
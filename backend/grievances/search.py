@@ -0,0 +1,78 @@
+"""
+Grievance search.
+
+On PostgreSQL, ``Grievance.search_vector`` holds a weighted ``tsvector`` over
+the title (A), description (B) and public message content (C), kept current
+by the signal handlers in ``grievances.signals``. Free text is ranked with
+``ts_rank`` against it, and identifiers typed loosely (complainant name,
+policy number, grievance ID) are matched with ``pg_trgm`` similarity. Both
+are served by GIN indexes created in migration 0005.
+
+Other databases fall back to case-insensitive substring matching, which is
+enough for development and the test suite.
+"""
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db import connections
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import Greatest
+
+SEARCH_CONFIG = 'english'
+
+UPDATE_SEARCH_VECTOR_SQL = f"""
+    UPDATE grievances_grievance AS g SET search_vector =
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(g.title, '')), 'A') ||
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(g.description, '')), 'B') ||
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce((
+            SELECT string_agg(m.content, ' ')
+            FROM grievances_grievancemessage AS m
+            WHERE m.grievance_id = g.id AND NOT m.is_internal
+        ), '')), 'C')
+"""
+
+
+def supports_search(using='default'):
+    return connections[using].vendor == 'postgresql'
+
+
+def update_search_vectors(grievance_ids=None, using='default'):
+    """Recompute search vectors for ``grievance_ids``, or for every grievance"""
+    if not supports_search(using):
+        return
+    with connections[using].cursor() as cursor:
+        if grievance_ids is None:
+            cursor.execute(UPDATE_SEARCH_VECTOR_SQL)
+        else:
+            cursor.execute(UPDATE_SEARCH_VECTOR_SQL + ' WHERE g.id = ANY(%s)', [list(grievance_ids)])
+
+
+def search_grievances(queryset, text):
+    """Filter ``queryset`` to grievances matching ``text``, best matches first"""
+    text = text.strip()
+    if not supports_search(queryset.db):
+        return queryset.filter(
+            Q(title__icontains=text)
+            | Q(description__icontains=text)
+            | Q(complainant_name__icontains=text)
+            | Q(policy_number__icontains=text)
+            | Q(grievance_id__icontains=text)
+        ).order_by('-submitted_at', '-id')
+
+    query = SearchQuery(text, search_type='websearch', config=SEARCH_CONFIG)
+    return (
+        queryset.annotate(
+            rank=SearchRank(F('search_vector'), query),
+            similarity=Greatest(
+                TrigramSimilarity('complainant_name', text),
+                TrigramSimilarity('policy_number', text),
+                TrigramSimilarity('grievance_id', text),
+                Value(0.0, output_field=FloatField()),
+            ),
+        )
+        .filter(
+            Q(search_vector=query)
+            | Q(complainant_name__trigram_similar=text)
+            | Q(policy_number__trigram_similar=text)
+            | Q(grievance_id__trigram_similar=text)
+        )
+        .order_by((F('rank') + F('similarity')).desc(), '-submitted_at')
+    )
@@ -1,5 +1,7 @@
+import posixpath
+
 from rest_framework import serializers
-from .models import Grievance, GrievanceMessage, GrievanceDocument
+from .models import DocumentUpload, Grievance, GrievanceMessage, GrievanceDocument
 from companies.serializers import InsuranceCompanySerializer
 from accounts.serializers import UserSerializer
 
@@ -17,10 +19,11 @@ class GrievanceSerializer(serializers.ModelSerializer):
             'complainant_name', 'complainant_email', 'complainant_phone',
             'policy_number', 'insurance_company', 'insurance_company_id',
             'submitted_by', 'assigned_to', 'status', 'priority',
-            'submitted_at', 'sla_deadline', 'resolved_at',
+            'submitted_at', 'sla_deadline', 'escalation_level', 'resolved_at',
             'claim_amount', 'settlement_amount', 'is_public'
         ]
-        read_only_fields = ['id', 'grievance_id', 'submitted_at']
+        # The deadline is computed from category and priority (grievances.sla)
+        read_only_fields = ['id', 'grievance_id', 'submitted_at', 'sla_deadline', 'escalation_level']
 
 class GrievanceMessageSerializer(serializers.ModelSerializer):
     """Serializer for grievance messages"""
@@ -39,6 +42,53 @@ class GrievanceDocumentSerializer(serializers.ModelSerializer):
         model = GrievanceDocument
         fields = [
             'id', 'grievance', 'uploaded_by', 'file_name', 'file_path',
-            'file_size', 'content_type', 'description', 'is_public', 'uploaded_at'
+            'file_size', 'content_type', 'content_hash', 'description', 'is_public', 'uploaded_at'
+        ]
+        read_only_fields = ['id', 'content_hash', 'uploaded_at']
+
+class DocumentUploadSerializer(serializers.ModelSerializer):
+    """Serializer for resumable document uploads"""
+    
+    class Meta:
+        model = DocumentUpload
+        fields = [
+            'id', 'grievance', 'file_name', 'file_size', 'content_type', 'description',
+            'is_public', 'chunk_size', 'offset', 'expires_at'
+        ]
+        read_only_fields = ['id', 'grievance', 'chunk_size', 'offset', 'expires_at']
+    
+    def validate_file_name(self, value):
+        # Keep the name only, whatever path the client sent
+        name = posixpath.basename(value.replace('\\', '/')).strip()
+        if not name:
+            raise serializers.ValidationError('Give the file a name.')
+        return name
+
+class GrievanceSyncSerializer(serializers.ModelSerializer):
+    """Flat grievance representation for delta sync"""
+    
+    class Meta:
+        model = Grievance
+        fields = [
+            'id', 'grievance_id', 'title', 'description', 'category',
+            'policy_number', 'insurance_company', 'submitted_by', 'assigned_to',
+            'status', 'priority', 'submitted_at', 'sla_deadline', 'escalation_level', 'resolved_at',
+            'claim_amount', 'settlement_amount', 'is_public', 'updated_at'
+        ]
+
+class GrievanceMessageSyncSerializer(serializers.ModelSerializer):
+    """Flat grievance message representation for delta sync"""
+    
+    class Meta:
+        model = GrievanceMessage
+        fields = ['id', 'grievance', 'sender', 'content', 'is_internal', 'created_at', 'updated_at']
+
+class GrievanceDocumentSyncSerializer(serializers.ModelSerializer):
+    """Flat grievance document representation for delta sync"""
+    
+    class Meta:
+        model = GrievanceDocument
+        fields = [
+            'id', 'grievance', 'uploaded_by', 'file_name', 'file_size',
+            'content_type', 'description', 'is_public', 'uploaded_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'uploaded_at']
\ No newline at end of file
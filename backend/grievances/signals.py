@@ -0,0 +1,110 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.cache import invalidate
+from . import counters, events
+from .models import Grievance, GrievanceDocument, GrievanceMessage
+from .search import update_search_vectors
+from .sla import sla_escalated
+from .sync import record_tombstone
+from .uploads import release_document_file
+
+
+@receiver(pre_save, sender=Grievance)
+def remember_counter_bucket(sender, instance, raw=False, **kwargs):
+    """Look up the stored bucket for instances not loaded with its fields"""
+    if raw or instance._state.adding or getattr(instance, '_counter_key', None):
+        return
+    instance._counter_key = counters.stored_counter_key(instance.pk)
+
+
+@receiver(pre_save, sender=Grievance)
+def remember_stored_status(sender, instance, raw=False, **kwargs):
+    """Status before this save, read from the bucket remembered above"""
+    key = None if raw or instance._state.adding else getattr(instance, '_counter_key', None)
+    instance._stored_status = key[1] if key else None
+
+
+@receiver(post_save, sender=Grievance)
+def update_grievance_counters(sender, instance, created, raw=False, **kwargs):
+    """Move the grievance into its current counter bucket"""
+    if raw:
+        return
+    old_key = None if created else getattr(instance, '_counter_key', None)
+    new_key = counters.counter_key(instance)
+    if new_key is None and not created:
+        new_key = counters.stored_counter_key(instance.pk)
+    counters.record_change(old_key, new_key)
+    instance._counter_key = new_key
+
+
+@receiver(post_delete, sender=Grievance)
+def remove_grievance_from_counters(sender, instance, **kwargs):
+    old_key = getattr(instance, '_counter_key', None)
+    counters.record_change(old_key or counters.counter_key(instance), None)
+
+
+@receiver(post_save, sender=Grievance)
+def update_grievance_search_vector(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields and not {'title', 'description'} & set(update_fields)):
+        return
+    update_search_vectors([instance.pk])
+
+
+@receiver(post_save, sender=GrievanceMessage)
+@receiver(post_delete, sender=GrievanceMessage)
+def update_message_search_vector(sender, instance, raw=False, **kwargs):
+    if not raw:
+        update_search_vectors([instance.grievance_id])
+
+
+@receiver(post_save, sender=Grievance)
+@receiver(post_delete, sender=Grievance)
+def invalidate_grievance_caches(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate('grievances')
+
+
+@receiver(sla_escalated)
+def invalidate_escalated_grievance_caches(sender, level, ids, **kwargs):
+    # The sweep escalates with update(), which sends no post_save
+    invalidate('grievances')
+
+
+@receiver(post_delete, sender=Grievance)
+def record_grievance_tombstone(sender, instance, **kwargs):
+    record_tombstone('grievance', instance, instance)
+
+
+@receiver(post_delete, sender=GrievanceMessage)
+def record_message_tombstone(sender, instance, **kwargs):
+    grievance = Grievance.objects.filter(pk=instance.grievance_id).first()
+    if grievance is not None:
+        record_tombstone('message', instance, grievance)
+
+
+@receiver(post_delete, sender=GrievanceDocument)
+def record_document_tombstone(sender, instance, **kwargs):
+    grievance = Grievance.objects.filter(pk=instance.grievance_id).first()
+    if grievance is not None:
+        record_tombstone('document', instance, grievance)
+
+
+@receiver(post_delete, sender=GrievanceDocument)
+def delete_document_file(sender, instance, **kwargs):
+    """Delete the stored file after its last document is gone (files are shared by content)"""
+    transaction.on_commit(lambda: release_document_file(instance.file_path))
+
+
+@receiver(post_save, sender=Grievance)
+def publish_status_change(sender, instance, created, raw=False, **kwargs):
+    stored = getattr(instance, '_stored_status', None)
+    if not raw and not created and stored is not None and stored != instance.status:
+        events.publish_status(instance)
+
+
+@receiver(post_save, sender=GrievanceMessage)
+def publish_new_message(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        events.publish_message(instance)
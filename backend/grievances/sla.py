@@ -0,0 +1,195 @@
+"""
+SLA deadlines and breach escalation.
+
+A grievance is due a number of business days after the day it is submitted,
+at ``DAY_END`` local time. The number comes from ``BUSINESS_DAYS``, built
+from a base per category scaled by priority. Business days skip the
+Bangladesh weekend (Friday and Saturday) and public holidays: the
+fixed-date ones, the moon-dependent ones listed per year in
+``LUNAR_HOLIDAYS``, and any dates in ``SLA_EXTRA_HOLIDAYS``.
+
+The calendar for ``CALENDAR_YEARS`` is precomputed into two arrays. One
+holds the business days in order. The other holds, for every calendar
+day, the number of business days up to and including it. Adding n business
+days is then two array lookups.
+
+``sweep()`` escalates open grievances. It marks them ``NEAR_BREACH`` within
+``SLA_WARNING_HOURS`` of their deadline. Once the deadline has passed it
+marks them ``BREACHED`` and raises their priority one step. Each level is
+found through the partial index ``grievance_sla_escalation_idx``, which
+covers (escalation_level, sla_deadline) for open grievances not yet
+breached. A sweep therefore reads only the rows it escalates, however many
+grievances are open. Rows are locked with SKIP LOCKED, so schedulers may
+overlap.
+"""
+import logging
+import math
+import time as clock
+from array import array
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BooleanField, Case, F, Value, When
+from django.db.models.expressions import RawSQL
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Grievance
+
+logger = logging.getLogger(__name__)
+
+CLOSED_STATUSES = ('resolved', 'closed')
+NONE, NEAR_BREACH, BREACHED = 0, 1, 2
+
+WEEKEND = (4, 5)  # Friday, Saturday
+DAY_END = time(17, 0)
+CALENDAR_YEARS = (2020, 2040)
+
+# Shaheed Day, Independence Day, Pohela Boishakh, May Day, Victory Day, Christmas
+FIXED_HOLIDAYS = ((2, 21), (3, 26), (4, 14), (5, 1), (12, 16), (12, 25))
+# Shab-e-Barat, Eid-ul-Fitr, Buddha Purnima, Eid-ul-Adha, Ashura,
+# Janmashtami, Eid-e-Miladunnabi and Durga Puja as announced for each year;
+# later years and last-minute moon sighting changes go in SLA_EXTRA_HOLIDAYS
+LUNAR_HOLIDAYS = {
+    2025: ('2025-02-15', '2025-03-30', '2025-03-31', '2025-04-01', '2025-05-11', '2025-06-06',
+           '2025-06-07', '2025-06-08', '2025-07-06', '2025-08-16', '2025-09-05', '2025-10-02'),
+    2026: ('2026-02-04', '2026-03-20', '2026-03-21', '2026-03-22', '2026-05-26', '2026-05-27',
+           '2026-05-28', '2026-06-26', '2026-08-26', '2026-09-04', '2026-10-21'),
+}
+
+CATEGORY_DAYS = {
+    'claim_settlement': 15,
+    'policy_terms': 10,
+    'premium_issues': 10,
+    'service_quality': 7,
+    'agent_conduct': 10,
+    'documentation': 7,
+    'fraud_concern': 5,
+    'other': 10,
+}
+PRIORITY_FACTORS = {'low': 1.5, 'medium': 1.0, 'high': 0.5, 'urgent': 0.2}
+BUSINESS_DAYS = {
+    (category, priority): max(1, math.ceil(days * factor))
+    for category, days in CATEGORY_DAYS.items()
+    for priority, factor in PRIORITY_FACTORS.items()
+}
+DEFAULT_BUSINESS_DAYS = 10
+ESCALATED_PRIORITY = {'low': 'medium', 'medium': 'high', 'high': 'urgent'}
+
+# The condition of grievance_sla_escalation_idx, spelled out with literals:
+# SQLite, and PostgreSQL generic plans, only use a partial index when the
+# query repeats its condition without bound parameters
+ESCALATABLE = RawSQL("""NOT ("status" IN ('resolved', 'closed')) AND "escalation_level" < 2""", (),
+                     output_field=BooleanField())
+
+# Sent after each escalated batch commits, with ``level`` and the grievance ``ids``
+sla_escalated = Signal()
+
+
+class BusinessCalendar:
+    """Business days between two years, precomputed for constant-time arithmetic"""
+
+    def __init__(self, holidays, first_year, last_year):
+        self.holidays = frozenset(holidays)
+        self.start = date(first_year, 1, 1).toordinal()
+        self.days = array('I')  # ordinals of the business days, in order
+        self.rank = array('I')  # business days on or before each calendar day
+        for ordinal in range(self.start, date(last_year, 12, 31).toordinal() + 1):
+            if self._is_business_day(ordinal):
+                self.days.append(ordinal)
+            self.rank.append(len(self.days))
+
+    def _is_business_day(self, ordinal):
+        day = date.fromordinal(ordinal)
+        return day.weekday() not in WEEKEND and day not in self.holidays
+
+    def is_business_day(self, day):
+        return self._is_business_day(day.toordinal())
+
+    def add(self, day, count):
+        """The ``count``-th business day after ``day``"""
+        offset = day.toordinal() - self.start
+        if 0 <= offset < len(self.rank):
+            index = self.rank[offset] + count - 1
+            if index < len(self.days):
+                return date.fromordinal(self.days[index])
+        # Outside the table, step through the days
+        ordinal = day.toordinal()
+        while count:
+            ordinal += 1
+            if self._is_business_day(ordinal):
+                count -= 1
+        return date.fromordinal(ordinal)
+
+
+@lru_cache(maxsize=4)
+def _calendar(extra_holidays):
+    first_year, last_year = CALENDAR_YEARS
+    holidays = {date(year, month, day) for year in range(first_year, last_year + 1)
+                for month, day in FIXED_HOLIDAYS}
+    holidays.update(date.fromisoformat(day) for days in LUNAR_HOLIDAYS.values() for day in days)
+    holidays.update(date.fromisoformat(day) for day in extra_holidays)
+    return BusinessCalendar(holidays, first_year, last_year)
+
+
+def get_calendar():
+    return _calendar(tuple(getattr(settings, 'SLA_EXTRA_HOLIDAYS', ())))
+
+
+def compute_deadline(category, priority, submitted_at=None):
+    """SLA deadline for a grievance of ``category`` and ``priority`` submitted at ``submitted_at``"""
+    submitted = timezone.localtime(submitted_at or timezone.now(), timezone.get_default_timezone())
+    days = BUSINESS_DAYS.get((category, priority), DEFAULT_BUSINESS_DAYS)
+    due = get_calendar().add(submitted.date(), days)
+    return datetime.combine(due, DAY_END, tzinfo=timezone.get_default_timezone())
+
+
+def _escalate(queryset, level, now, batch_size):
+    updates = {'escalation_level': level, 'escalated_at': now, 'updated_at': now}
+    if level == BREACHED:
+        updates['priority'] = Case(
+            *(When(priority=old, then=Value(new)) for old, new in ESCALATED_PRIORITY.items()),
+            default=F('priority'),
+        )
+
+    escalated = 0
+    while True:
+        with transaction.atomic():
+            ids = list(queryset.order_by('sla_deadline').select_for_update(skip_locked=True)
+                       .values_list('pk', flat=True)[:batch_size])
+            if ids:
+                Grievance.objects.filter(pk__in=ids).update(**updates)
+        if not ids:
+            return escalated
+        sla_escalated.send(sender=Grievance, level=level, ids=ids)
+        escalated += len(ids)
+        if len(ids) < batch_size:
+            return escalated
+
+
+def sweep(now=None, batch_size=None):
+    """Escalate open grievances near or past their deadline; returns the number escalated per level"""
+    from core.metrics import get_registry
+
+    started = clock.perf_counter()
+    now = now or timezone.now()
+    batch_size = batch_size or getattr(settings, 'SLA_SWEEP_BATCH_SIZE', 500)
+    horizon = now + timedelta(hours=getattr(settings, 'SLA_WARNING_HOURS', 24))
+    open_grievances = Grievance.objects.filter(ESCALATABLE)
+
+    breached = sum(
+        _escalate(open_grievances.filter(escalation_level=level, sla_deadline__lte=now), BREACHED, now, batch_size)
+        for level in (NONE, NEAR_BREACH)
+    )
+    near_breach = _escalate(open_grievances.filter(escalation_level=NONE, sla_deadline__lte=horizon),
+                            NEAR_BREACH, now, batch_size)
+
+    registry = get_registry()
+    registry.inc('idra_sla_escalations_total', (('level', 'breached'),), breached)
+    registry.inc('idra_sla_escalations_total', (('level', 'near_breach'),), near_breach)
+    registry.observe('idra_sla_sweep_duration_seconds', (), clock.perf_counter() - started)
+    if breached or near_breach:
+        logger.info('SLA sweep escalated %d breached and %d near-breach grievances', breached, near_breach)
+    return {'breached': breached, 'near_breach': near_breach}
@@ -0,0 +1,88 @@
+"""
+Grievance statistics for a scope (one user, one company, or everything).
+
+Every status bucket for a scope is computed in a single conditional
+aggregation. Company and global scopes read the materialized
+``GrievanceCounter`` buckets; the per-user scope counts the user's own
+grievances, since counters are not keyed by submitter.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime, time
+
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Grievance, GrievanceCounter
+
+# Model statuses plus the ones written by the web workflow
+# (grievances.web_views.grievance_update_status)
+STATUSES = [value for value, _ in Grievance.STATUS_CHOICES] + ['submitted', 'in_progress']
+
+
+@dataclass(frozen=True)
+class GrievanceStats:
+    """Grievance counts for one scope"""
+    total: int = 0
+    this_month: int = 0
+    by_status: dict = field(default_factory=dict)
+
+    def count(self, *statuses):
+        """Number of grievances in any of ``statuses``"""
+        return sum(self.by_status.get(status, 0) for status in statuses)
+
+
+def _stats(row):
+    return GrievanceStats(
+        total=row.pop('total'),
+        this_month=row.pop('this_month'),
+        by_status=row,
+    )
+
+
+def _month_start():
+    return timezone.localdate().replace(day=1)
+
+
+def _counter_buckets():
+    def bucket(condition=None):
+        return Coalesce(Sum('count', filter=condition), 0)
+
+    return dict(
+        total=bucket(),
+        this_month=bucket(Q(month__gte=_month_start())),
+        **{status: bucket(Q(status=status)) for status in STATUSES},
+    )
+
+
+def counter_stats(**filters):
+    """Stats from the materialized counters, e.g. ``counter_stats(company=company)``"""
+    return _stats(GrievanceCounter.objects.filter(**filters).aggregate(**_counter_buckets()))
+
+
+async def acounter_stats(**filters):
+    return _stats(await GrievanceCounter.objects.filter(**filters).aaggregate(**_counter_buckets()))
+
+
+def global_stats():
+    return counter_stats()
+
+
+async def aglobal_stats():
+    return await acounter_stats()
+
+
+def company_stats(company):
+    """Stats for one company; accepts an instance or a primary key"""
+    return counter_stats(company=company)
+
+
+def user_stats(user):
+    """Stats for the grievances ``user`` submitted"""
+    month_start = timezone.make_aware(datetime.combine(_month_start(), time.min))
+    row = Grievance.objects.filter(submitted_by=user).aggregate(
+        total=Count('id'),
+        this_month=Count('id', filter=Q(submitted_at__gte=month_start)),
+        **{status: Count('id', filter=Q(status=status)) for status in STATUSES},
+    )
+    return _stats(row)
@@ -0,0 +1,168 @@
+"""
+Delta sync for the mobile client.
+
+A client sends back the opaque token from its previous sync and receives
+only the grievances, messages and documents changed since then (selected
+through the indexed ``updated_at`` columns), plus tombstones for rows deleted
+in the meantime. Tokens are signed, holding a resume position per collection.
+
+A collection that was sent in full resumes from a few seconds before the
+query time, so rows whose transaction committed late are sent again rather
+than missed; clients upsert by ID, so repeats are harmless. A collection
+truncated at ``SYNC_PAGE_SIZE`` resumes strictly after the last
+``(timestamp, id)`` it returned, and ``has_more`` tells the client to sync
+again straight away.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import GrievanceDocument, GrievanceMessage, SyncTombstone
+
+TOKEN_SALT = 'grievances.sync'
+CLOCK_SKEW = timedelta(seconds=5)
+
+
+def page_size():
+    return getattr(settings, 'SYNC_PAGE_SIZE', 500)
+
+
+def tombstone_retention():
+    return timedelta(days=getattr(settings, 'SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+
+
+COLLECTIONS = ('grievances', 'messages', 'documents', 'deleted')
+
+
+def make_token(moment, cursors=None):
+    """
+    Token resuming every collection from ``moment``.
+
+    ``cursors`` maps truncated collections to the ``(timestamp, id)`` of the
+    last row sent, which they resume strictly after instead.
+    """
+    cursors = cursors or {}
+    payload = {
+        name: [*(cursors[name] if name in cursors else (moment, None))]
+        for name in COLLECTIONS
+    }
+    for position in payload.values():
+        position[0] = position[0].isoformat()
+    return signing.dumps(payload, salt=TOKEN_SALT, compress=True)
+
+
+def read_token(token):
+    """Per-collection resume positions in ``token``, or None for a missing or invalid token"""
+    if not token:
+        return None
+    try:
+        payload = signing.loads(token, salt=TOKEN_SALT)
+        positions = {
+            name: (parse_datetime(payload[name][0]), payload[name][1])
+            for name in COLLECTIONS
+        }
+    except (signing.BadSignature, KeyError, IndexError, TypeError, ValueError):
+        return None
+    if any(moment is None for moment, _ in positions.values()):
+        return None
+    return positions
+
+
+def _role(user):
+    profile = getattr(user, 'profile', None)
+    return profile.role if profile else None
+
+
+def _tombstone_scope(user):
+    role = _role(user)
+    if role == 'insurance_company':
+        return Q(company_ref=user.profile.company_id)
+    if role == 'policyholder':
+        return Q(submitted_by_ref=user.pk) & Q(is_internal=False)
+    return Q()
+
+
+def _changed(queryset, position, timestamp_field='updated_at'):
+    """Rows after ``position`` in (timestamp, id) order, and whether more remain"""
+    if position is not None:
+        moment, after_id = position
+        if after_id is None:
+            queryset = queryset.filter(**{f'{timestamp_field}__gte': moment})
+        else:
+            queryset = queryset.filter(
+                Q(**{f'{timestamp_field}__gt': moment})
+                | Q(**{timestamp_field: moment, 'id__gt': after_id})
+            )
+    rows = list(queryset.order_by(timestamp_field, 'id')[:page_size() + 1])
+    truncated = len(rows) > page_size()
+    return rows[:page_size()], truncated
+
+
+def collect_changes(user, grievances, positions):
+    """
+    Everything in ``grievances`` (already scoped to ``user``) changed since ``positions``.
+
+    Returns a dict of row lists, tombstones, the next token and ``has_more``.
+    """
+    now = timezone.now()
+    # Tombstones older than the retention window may have been purged, so
+    # a client that far behind cannot be told what it missed
+    reset = positions is None or positions['deleted'][0] < now - tombstone_retention()
+    if reset:
+        positions = dict.fromkeys(COLLECTIONS)
+
+    messages = GrievanceMessage.objects.filter(grievance__in=grievances.values('pk'))
+    documents = GrievanceDocument.objects.filter(grievance__in=grievances.values('pk'))
+    if _role(user) == 'policyholder':
+        messages = messages.filter(is_internal=False)
+        documents = documents.filter(is_public=True)
+
+    changed = {
+        'grievances': _changed(grievances, positions['grievances']),
+        'messages': _changed(messages, positions['messages']),
+        'documents': _changed(documents, positions['documents']),
+    }
+    if reset:
+        # A full resync has nothing to delete
+        changed['deleted'] = ([], False)
+    else:
+        tombstones = SyncTombstone.objects.filter(_tombstone_scope(user))
+        changed['deleted'] = _changed(tombstones, positions['deleted'], 'deleted_at')
+
+    cursors = {}
+    for name, (rows, truncated) in changed.items():
+        if truncated:
+            last = rows[-1]
+            cursors[name] = (last.deleted_at if name == 'deleted' else last.updated_at, last.pk)
+
+    return {
+        'reset': reset,
+        'grievances': changed['grievances'][0],
+        'messages': changed['messages'][0],
+        'documents': changed['documents'][0],
+        'deleted': changed['deleted'][0],
+        'token': make_token(now - CLOCK_SKEW, cursors),
+        'has_more': bool(cursors),
+    }
+
+
+def record_tombstone(model_name, instance, grievance):
+    """Remember a deletion so syncing clients can drop the row"""
+    SyncTombstone.objects.create(
+        model_name=model_name,
+        object_id=instance.pk,
+        grievance_ref=grievance.pk,
+        company_ref=grievance.insurance_company_id,
+        submitted_by_ref=grievance.submitted_by_id,
+        is_internal=getattr(instance, 'is_internal', False),
+    )
+
+
+def purge_tombstones():
+    """Delete tombstones older than the retention window"""
+    cutoff = timezone.now() - tombstone_retention()
+    return SyncTombstone.objects.filter(deleted_at__lt=cutoff).delete()[0]
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.mail import send_mail
+
+from core.tasks import task
+from .models import Grievance, GrievanceMessage
+
+STATUS_LABELS = dict(Grievance.STATUS_CHOICES)
+
+
+@task(queue='notifications')
+def notify_status_change(grievance_pk, old_status, new_status):
+    """Email the complainant that their grievance changed status"""
+    grievance = Grievance.objects.filter(pk=grievance_pk).only(
+        'grievance_id', 'title', 'complainant_name', 'complainant_email').first()
+    if grievance is None:
+        return
+    send_mail(
+        f'Grievance {grievance.grievance_id} is now {STATUS_LABELS.get(new_status, new_status)}',
+        f'Dear {grievance.complainant_name},\n\n'
+        f'The status of your grievance "{grievance.title}" ({grievance.grievance_id}) changed from '
+        f'{STATUS_LABELS.get(old_status, old_status)} to {STATUS_LABELS.get(new_status, new_status)}.\n',
+        settings.DEFAULT_FROM_EMAIL,
+        [grievance.complainant_email],
+    )
+
+
+@task(queue='notifications')
+def notify_new_message(message_pk):
+    """Email the other party of a grievance about a new public message"""
+    message = (GrievanceMessage.objects.select_related('grievance__insurance_company', 'sender')
+               .filter(pk=message_pk, is_internal=False).first())
+    if message is None:
+        return
+    grievance = message.grievance
+    if message.sender_id == grievance.submitted_by_id:
+        recipient = grievance.insurance_company.email
+    else:
+        recipient = grievance.complainant_email
+    if not recipient or recipient == message.sender.email:
+        return
+    send_mail(
+        f'New message on grievance {grievance.grievance_id}',
+        f'{message.sender.get_full_name()} wrote on "{grievance.title}":\n\n{message.content}\n',
+        settings.DEFAULT_FROM_EMAIL,
+        [recipient],
+    )
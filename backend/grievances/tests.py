@@ -1,3 +1,1817 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import hashlib
+import io
+import json
+import socket
+import tempfile
+import zipfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from datetime import date, datetime, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User, UserProfile
+from core.audit import AuditWriter, client_ip, get_writer
+from core.cache import get_or_compute, namespace_version
+from core.events import broker
+from core.instrumentation import RequestMetricsMiddleware, reset_request_metrics
+from core.metrics import reset_metrics
+from core.tasks import DatabaseBackend, Worker, task
+from core.replicas import (
+    STICKY_COOKIE, ReplicaStickinessMiddleware, replica_reads, replica_status, reset_replica_health,
+)
+from idra_gms.asgi import IdraASGIHandler
+from idra_gms.database import configure_database
+from companies.models import InsuranceCompany
+from .bulk_import import GrievanceImporter, ImportFormatError, read_rows
+from .export import export_rows
+from .sla import BREACHED, NEAR_BREACH, compute_deadline, get_calendar, sla_escalated, sweep
+from .counters import grievance_count
+from .serializers import GrievanceMessageSerializer, GrievanceSerializer
+from .id_allocator import BlockIdAllocator, SequenceIdAllocator, format_grievance_id
+from .stats import company_stats, global_stats, user_stats
+from .models import (
+    AuditLog, BackgroundJob, DocumentUpload, Grievance, GrievanceCounter, GrievanceDocument, GrievanceMessage,
+    GrievanceSequence, SyncTombstone,
+)
+from . import audit_storage, sync, uploads
+
+
+TASK_CALLS = []
+
+
+@task(max_attempts=2)
+def record_task_call(value, fail=False):
+    TASK_CALLS.append(value)
+    if fail:
+        raise RuntimeError('task failed')
+
+
+def create_company(name='Dhaka Insurance Limited', license_number='LIC-001'):
+    return InsuranceCompany.objects.create(
+        name=name,
+        license_number=license_number,
+        established_year=1985,
+        address='Dhaka, Bangladesh',
+        phone='+8801711111111',
+        email='contact@example.com',
+        registration_date=date(2020, 1, 15),
+        license_expiry_date=date(2030, 1, 15),
+        authorized_capital=500000000,
+        paid_up_capital=300000000,
+    )
+
+
+def create_user(email, role='policyholder', company=None):
+    user = User.objects.create_user(
+        username=email, email=email, password='demo123',
+        first_name='Test', last_name='User',
+    )
+    UserProfile.objects.create(user=user, role=role, company=company)
+    return user
+
+
+def create_grievance(company, submitted_by=None, **kwargs):
+    fields = {
+        'title': 'Claim not settled',
+        'description': 'My claim has been pending for months.',
+        'category': 'claim_settlement',
+        'complainant_name': 'Test User',
+        'complainant_email': 'complainant@example.com',
+        'complainant_phone': '+8801700000000',
+        'insurance_company': company,
+        'submitted_by': submitted_by,
+        'sla_deadline': timezone.now() + timedelta(days=30),
+    }
+    fields.update(kwargs)
+    return Grievance.objects.create(**fields)
+
+
+class QueryCountTestCase(TestCase):
+    """Query counts must not grow with the number of rows rendered"""
+
+    def setUp(self):
+        self.company = create_company()
+        self.other_company = create_company('United Insurance', 'LIC-002')
+        self.policyholder = create_user('alice@example.com')
+        self.company_user = create_user('bob@example.com', 'insurance_company', self.company)
+        self.admin = create_user('david@example.com', 'idra_admin')
+        self.client = APIClient()
+
+    def add_grievances(self, count):
+        for i in range(count):
+            grievance = create_grievance(
+                self.company if i % 2 else self.other_company,
+                submitted_by=self.policyholder,
+                assigned_to=self.company_user,
+                is_public=True,
+            )
+            GrievanceMessage.objects.create(
+                grievance=grievance, sender=self.company_user, content='Looking into it.'
+            )
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def assertConstantQueries(self, url, user=None):
+        if user:
+            self.client.force_login(user)
+        self.add_grievances(2)
+        small = self.count_queries(url)
+        self.add_grievances(10)
+        large = self.count_queries(url)
+        self.assertEqual(small, large)
+
+    def test_list_anonymous(self):
+        self.assertConstantQueries('/grievances/api/')
+
+    def test_list_per_role(self):
+        for user in (self.policyholder, self.company_user, self.admin):
+            with self.subTest(role=user.profile.role):
+                self.assertConstantQueries('/grievances/api/', user)
+
+    def test_list_query_budget(self):
+        self.client.force_login(self.admin)
+        self.add_grievances(20)
+        # session, user, profile, page rows, company prefetch
+        with self.assertNumQueries(5):
+            self.client.get('/grievances/api/')
+
+    def test_messages(self):
+        self.client.force_login(self.admin)
+        grievance = create_grievance(self.company)
+        url = f'/grievances/api/{grievance.pk}/messages/'
+        GrievanceMessage.objects.create(grievance=grievance, sender=self.admin, content='First')
+        small = self.count_queries(url)
+        for sender in (self.policyholder, self.company_user, self.admin) * 4:
+            GrievanceMessage.objects.create(grievance=grievance, sender=sender, content='More')
+        self.assertEqual(small, self.count_queries(url))
+
+    def test_detail_and_track(self):
+        self.client.force_login(self.admin)
+        grievance = create_grievance(
+            self.company, submitted_by=self.policyholder, assigned_to=self.company_user
+        )
+        # session, user, profile, validators, grievance row, company prefetch
+        with self.assertNumQueries(6):
+            self.client.get(f'/grievances/api/{grievance.pk}/')
+        self.client.logout()
+        # validators, grievance row, company prefetch
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/grievances/api/track/{grievance.grievance_id}/')
+        self.assertEqual(response.json()['insurance_company']['total_grievances'], 1)
+        self.assertEqual(response.json()['submitted_by']['profile']['role'], 'policyholder')
+
+
+class KeysetPaginationTestCase(TestCase):
+    """Listings page by (submitted_at, id) without COUNT(*) or OFFSET"""
+
+    def setUp(self):
+        self.company = create_company()
+        self.admin = create_user('david@example.com', 'idra_admin')
+        for _ in range(25):
+            create_grievance(self.company)
+        # Ties on submitted_at must be broken by id
+        Grievance.objects.filter(pk__lte=12).update(submitted_at=timezone.now())
+        self.expected = list(
+            Grievance.objects.order_by('-submitted_at', '-id').values_list('id', flat=True)
+        )
+
+    def test_api_cursor_walk(self):
+        client = APIClient()
+        client.force_login(self.admin)
+        url, seen = '/grievances/api/', []
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                response = client.get(url)
+            self.assertNotIn('COUNT(', ' '.join(q['sql'] for q in context.captured_queries))
+            self.assertNotIn('count', response.data)
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, self.expected)
+
+    def test_api_messages_in_conversation_order(self):
+        client = APIClient()
+        client.force_login(self.admin)
+        grievance = Grievance.objects.first()
+        for content in ('first', 'second', 'third'):
+            GrievanceMessage.objects.create(grievance=grievance, sender=self.admin, content=content)
+        response = client.get(f'/grievances/api/{grievance.pk}/messages/')
+        self.assertEqual([m['content'] for m in response.data['results']], ['first', 'second', 'third'])
+
+    def test_web_load_more(self):
+        self.client.force_login(self.admin)
+        url, seen = '/grievances/?mode=more', []
+        while True:
+            response = self.client.get(url)
+            seen.extend(grievance.pk for grievance in response.context['grievances'])
+            cursor = response.context['next_cursor']
+            if not cursor:
+                break
+            url = f'/grievances/?mode=more&cursor={cursor}'
+        self.assertEqual(seen, self.expected)
+
+    def test_web_estimated_count(self):
+        self.client.force_login(self.admin)
+        response = self.client.get('/grievances/?count=estimate&page=3')
+        page = response.context['grievances']
+        self.assertEqual(page.paginator.num_pages, 3)
+        self.assertEqual([g.pk for g in page], self.expected[20:])
+
+    def test_web_links_keep_filters(self):
+        self.client.force_login(self.admin)
+        response = self.client.get('/grievances/', {'status': 'open', 'page': 2})
+        self.assertContains(response, '?page=1&status=open')
+        self.assertContains(response, '?page=3&status=open')
+        response = self.client.get('/grievances/', {'status': 'open', 'mode': 'more'})
+        self.assertContains(response, '&status=open"')
+        self.assertEqual(self.client.get('/grievances/', {'company': 'x'}).status_code, 400)
+
+
+class GrievanceSearchTestCase(TestCase):
+    """Search honours the same role scoping as the list endpoint"""
+
+    def setUp(self):
+        self.company = create_company()
+        self.other_company = create_company('United Insurance', 'LIC-002')
+        self.policyholder = create_user('alice@example.com')
+        self.company_user = create_user('bob@example.com', 'insurance_company', self.other_company)
+        self.mine = create_grievance(self.company, submitted_by=self.policyholder,
+                                     title='Hospital bill rejected', policy_number='POL-001')
+        self.public = create_grievance(self.other_company, title='Hospital claim delayed',
+                                       is_public=True)
+        self.client = APIClient()
+
+    def search(self, text):
+        response = self.client.get('/grievances/api/search/', {'q': text})
+        self.assertEqual(response.status_code, 200)
+        return {row['id'] for row in response.data['results']}
+
+    def test_scoping(self):
+        self.assertEqual(self.search('hospital'), {self.public.pk})
+        self.client.force_login(self.policyholder)
+        self.assertEqual(self.search('hospital'), {self.mine.pk})
+        self.client.force_login(self.company_user)
+        self.assertEqual(self.search('hospital'), {self.public.pk})
+
+    def test_identifier_and_empty_query(self):
+        self.client.force_login(self.policyholder)
+        self.assertEqual(self.search('POL-001'), {self.mine.pk})
+        self.assertEqual(self.search(self.mine.grievance_id), {self.mine.pk})
+        self.assertEqual(self.search('  '), set())
+
+
+class ConditionalGetTestCase(TestCase):
+    """Unchanged grievances are answered 304 without serializing anything"""
+
+    def setUp(self):
+        self.company = create_company()
+        self.policyholder = create_user('alice@example.com')
+        self.admin = create_user('david@example.com', 'idra_admin')
+        self.grievance = create_grievance(self.company, submitted_by=self.policyholder)
+        GrievanceMessage.objects.create(grievance=self.grievance, sender=self.admin, content='Hi')
+        self.client = APIClient()
+        self.client.force_login(self.policyholder)
+
+    def assertNotModified(self, url, serializer_class):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+
+        with mock.patch.object(serializer_class, 'to_representation') as to_representation:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+            self.assertEqual(response.status_code, 304)
+        to_representation.assert_not_called()
+        return etag
+
+    def test_detail_track_and_messages(self):
+        urls = [
+            (f'/grievances/api/{self.grievance.pk}/', GrievanceSerializer),
+            (f'/grievances/api/track/{self.grievance.grievance_id}/', GrievanceSerializer),
+            (f'/grievances/api/{self.grievance.pk}/messages/', GrievanceMessageSerializer),
+        ]
+        etags = [self.assertNotModified(url, serializer) for url, serializer in urls]
+
+        GrievanceMessage.objects.create(grievance=self.grievance, sender=self.admin, content='Update')
+        for (url, _), etag in zip(urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+
+    def test_nested_data_changes_etag(self):
+        url = f'/grievances/api/{self.grievance.pk}/'
+        etag = self.client.get(url)['ETag']
+
+        create_grievance(self.company, submitted_by=self.admin)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        self.policyholder.first_name = 'Alicia'
+        self.policyholder.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_not_modified_query_budget(self):
+        url = f'/grievances/api/{self.grievance.pk}/'
+        etag = self.client.get(url)['ETag']
+        # session, user, profile, validators
+        with self.assertNumQueries(4):
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_web_detail(self):
+        url = f'/grievances/{self.grievance.pk}/'
+        response = self.client.get(url)
+        self.assertTemplateUsed(response, 'grievances/detail.html')
+        self.assertContains(response, 'IDRA Administrator</span>')
+        etag = response['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertTemplateNotUsed(response, 'grievances/detail.html')
+
+        # Staff see the status form, so their page has its own ETag
+        self.client.force_login(self.admin)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_revalidated_views_are_audited(self):
+        writer = get_writer()
+        api_url, web_url = f'/grievances/api/{self.grievance.pk}/', f'/grievances/{self.grievance.pk}/'
+        etags = [self.client.get(url)['ETag'] for url in (api_url, web_url)]
+        writer._take(writer.queue.maxsize)
+        for url, etag in zip((api_url, web_url), etags):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        events = writer._take(writer.queue.maxsize)
+        self.assertEqual([(event['action'], event['object_id']) for event in events],
+                         [('view', self.grievance.pk), ('view', self.grievance.pk)])
+
+    def test_hidden_grievance_is_not_revealed(self):
+        other = create_grievance(self.company, submitted_by=self.admin)
+        etag = self.client.get(f'/grievances/api/{self.grievance.pk}/')['ETag']
+        response = self.client.get(f'/grievances/api/{other.pk}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('ETag'))
+
+
+class DeltaSyncTestCase(TestCase):
+    """Sync returns only rows changed since the client's token, plus deletions"""
+
+    url = '/api/grievances/sync/'
+
+    def setUp(self):
+        self.company = create_company()
+        self.policyholder = create_user('alice@example.com')
+        self.officer = create_user('bob@example.com', 'insurance_company', self.company)
+        self.grievance = create_grievance(self.company, submitted_by=self.policyholder)
+        self.client = APIClient()
+        self.client.force_login(self.policyholder)
+
+    def sync(self, token=None):
+        response = self.client.get(self.url, {'since': token} if token else {})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def age(self, moment):
+        """Move every existing row's timestamps back to ``moment``"""
+        Grievance.objects.update(updated_at=moment)
+        GrievanceMessage.objects.update(updated_at=moment)
+        SyncTombstone.objects.update(deleted_at=moment)
+
+    def test_initial_then_delta(self):
+        data = self.sync()
+        self.assertTrue(data['reset'])
+        self.assertEqual([row['id'] for row in data['grievances']], [self.grievance.pk])
+
+        self.age(timezone.now() - timedelta(minutes=5))
+        data = self.sync(data['token'])
+        self.assertFalse(data['reset'])
+        self.assertEqual(data['grievances'], [])
+
+        GrievanceMessage.objects.create(grievance=self.grievance, sender=self.officer, content='Reply')
+        GrievanceMessage.objects.create(grievance=self.grievance, sender=self.officer,
+                                        content='Note', is_internal=True)
+        data = self.sync(data['token'])
+        self.assertEqual([row['content'] for row in data['messages']], ['Reply'])
+
+    def test_deletions_are_reported_in_scope(self):
+        token = self.sync()['token']
+        self.age(timezone.now() - timedelta(minutes=5))
+        other = create_grievance(self.company)
+        other_id, own_id = other.pk, self.grievance.pk
+        other.delete()
+        self.grievance.delete()
+
+        data = self.sync(token)
+        self.assertEqual(data['deleted'], [{'type': 'grievance', 'id': own_id, 'grievance': own_id}])
+
+        self.client.force_login(self.officer)
+        deleted = {row['id'] for row in self.sync(token)['deleted']}
+        self.assertEqual(deleted, {own_id, other_id})
+
+    def test_truncated_collection_sets_has_more(self):
+        for _ in range(3):
+            create_grievance(self.company, submitted_by=self.policyholder)
+        with self.settings(SYNC_PAGE_SIZE=2):
+            data = self.sync()
+            self.assertTrue(data['has_more'])
+            self.assertEqual(len(data['grievances']), 2)
+            seen = {row['id'] for row in data['grievances']}
+            data = self.sync(data['token'])
+        seen |= {row['id'] for row in data['grievances']}
+        self.assertFalse(data['has_more'])
+        self.assertEqual(len(seen), 4)
+
+    def test_expired_or_forged_token_resets(self):
+        stale = sync.make_token(timezone.now() - timedelta(days=365))
+        self.assertTrue(self.sync(stale)['reset'])
+        self.assertTrue(self.sync('not-a-token')['reset'])
+
+    def test_anonymous_rejected(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class GrievanceCounterTestCase(TestCase):
+    """Counters follow grievances through create, status change and delete"""
+
+    def setUp(self):
+        self.company = create_company()
+        self.other_company = create_company('United Insurance', 'LIC-002')
+
+    def test_create_and_status_change(self):
+        grievance = create_grievance(self.company)
+        create_grievance(self.company, category='fraud_concern')
+        self.assertEqual(grievance_count(company=self.company), 2)
+        self.assertEqual(grievance_count(company=self.company, status='open'), 2)
+
+        grievance.status = 'resolved'
+        grievance.save()
+        self.assertEqual(grievance_count(company=self.company, status='open'), 1)
+        self.assertEqual(grievance_count(company=self.company, status='resolved'), 1)
+
+        # Reloaded without the bucket fields, the stored bucket is looked up
+        reloaded = Grievance.objects.only('id', 'title').get(pk=grievance.pk)
+        reloaded.status = 'closed'
+        reloaded.save()
+        self.assertEqual(grievance_count(status='resolved'), 0)
+        self.assertEqual(grievance_count(status='closed'), 1)
+
+    def test_company_change_and_delete(self):
+        grievance = create_grievance(self.company)
+        grievance.insurance_company = self.other_company
+        grievance.save()
+        self.assertEqual(grievance_count(company=self.company), 0)
+        self.assertEqual(grievance_count(company=self.other_company), 1)
+
+        Grievance.objects.get(pk=grievance.pk).delete()
+        self.assertEqual(grievance_count(), 0)
+
+    def test_reconcile_after_bulk_update(self):
+        for _ in range(3):
+            create_grievance(self.company)
+        Grievance.objects.update(status='resolved')
+        self.assertEqual(grievance_count(status='resolved'), 0)
+
+        call_command('reconcile_grievance_counters', stdout=StringIO())
+        self.assertEqual(grievance_count(status='resolved'), 3)
+        self.assertEqual(GrievanceCounter.objects.count(), 1)
+
+    def test_views_read_counters(self):
+        for _ in range(5):
+            create_grievance(self.company)
+        response = self.client.get('/')
+        self.assertEqual(response.context['stats']['total_grievances'], 5)
+        response = self.client.get(f'/companies/{self.company.pk}/')
+        self.assertEqual(response.context['grievance_stats']['pending'], 5)
+
+        with CaptureQueriesContext(connection) as context:
+            self.client.get('/')
+        for query in context.captured_queries:
+            self.assertNotIn('"grievances_grievance"', query['sql'])
+
+
+class GrievanceStatsTestCase(TestCase):
+    """Each scope's status buckets come from a single aggregate query"""
+
+    def setUp(self):
+        self.company = create_company()
+        self.other_company = create_company('United Insurance', 'LIC-002')
+        self.policyholder = create_user('alice@example.com')
+        for status in ('open', 'open', 'under_review', 'resolved'):
+            create_grievance(self.company, submitted_by=self.policyholder, status=status)
+        create_grievance(self.other_company, status='resolved')
+
+    def test_scopes(self):
+        with self.assertNumQueries(1):
+            stats = global_stats()
+        self.assertEqual(stats.total, 5)
+        self.assertEqual(stats.this_month, 5)
+        self.assertEqual(stats.count('resolved'), 2)
+
+        with self.assertNumQueries(1):
+            stats = company_stats(self.company)
+        self.assertEqual(stats.total, 4)
+        self.assertEqual(stats.count('open', 'under_review'), 3)
+
+        with self.assertNumQueries(1):
+            stats = user_stats(self.policyholder)
+        self.assertEqual(stats.total, 4)
+        self.assertEqual(stats.count('closed'), 0)
+
+    def test_dashboard_query_budget(self):
+        for user in (self.policyholder,
+                     create_user('bob@example.com', 'insurance_company', self.company),
+                     create_user('david@example.com', 'idra_admin')):
+            self.client.force_login(user)
+            # session, user, profile, stats, recent grievances
+            with self.subTest(role=user.profile.role), self.assertNumQueries(5):
+                response = self.client.get('/dashboard/')
+            self.assertEqual(response.status_code, 200)
+
+
+class GrievanceIdAllocatorTestCase(TestCase):
+
+    def test_save_allocates_sequential_ids(self):
+        company = create_company()
+        year = timezone.localdate().year
+        first = create_grievance(company)
+        second = create_grievance(company)
+        self.assertEqual(first.grievance_id, format_grievance_id(year, 1))
+        self.assertEqual(second.grievance_id, format_grievance_id(year, 2))
+
+    def test_new_year_sequence_starts_after_existing_ids(self):
+        create_grievance(create_company(), grievance_id='GRV-2024-00041')
+        self.assertEqual(SequenceIdAllocator().allocate(2024), 'GRV-2024-00042')
+        self.assertEqual(GrievanceSequence.objects.get(year=2024).next_value, 43)
+
+    def test_lease_inside_transaction_is_not_cached(self):
+        allocator = BlockIdAllocator(block_size=50)
+        allocator.allocate(2030)
+        # TestCase wraps each test in a transaction, so nothing beyond the
+        # requested ID may be held in memory.
+        self.assertEqual(GrievanceSequence.objects.get(year=2030).next_value, 2)
+
+
+class GrievanceIdConcurrencyTestCase(TransactionTestCase):
+    """Parallel workers never share an ID and only skip unused block tails"""
+
+    workers = 8
+    ids_per_worker = 60
+    block_size = 7
+
+    def test_parallel_allocation_is_unique_and_gap_bounded(self):
+        allocated, errors = [], []
+        lock = threading.Lock()
+        start = threading.Barrier(self.workers)
+
+        def worker():
+            # One allocator per thread stands in for one server process
+            allocator = BlockIdAllocator(block_size=self.block_size)
+            try:
+                start.wait()
+                ids = [allocator.allocate(2031) for _ in range(self.ids_per_worker)]
+                with lock:
+                    allocated.extend(ids)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        total = self.workers * self.ids_per_worker
+        self.assertEqual(len(allocated), total)
+        self.assertEqual(len(set(allocated)), total)
+
+        highest = max(int(grievance_id.rsplit('-', 1)[1]) for grievance_id in allocated)
+        self.assertLessEqual(highest - total, self.workers * (self.block_size - 1))
+
+
+def audit_event(user, number=0):
+    return {
+        'user_id': user.pk, 'action': 'view', 'model_name': 'Grievance', 'object_id': number,
+        'details': {'n': number}, 'ip_address': '127.0.0.1', 'user_agent': 'test',
+        'timestamp': timezone.now().isoformat(),
+    }
+
+
+class AuditWriterTestCase(TransactionTestCase):
+    """Audit events are queued off the request path and never lost"""
+
+    def setUp(self):
+        self.user = create_user('alice@example.com')
+        spill_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(spill_dir.cleanup)
+        self.spill_path = Path(spill_dir.name) / 'audit-spill.jsonl'
+
+    def test_graceful_shutdown_writes_every_event(self):
+        writer = AuditWriter(batch_size=50, flush_interval=0.05, spill_path=self.spill_path)
+        writer.start()
+
+        def produce(offset):
+            for number in range(offset, offset + 250):
+                writer.record(audit_event(self.user, number))
+
+        producers = [threading.Thread(target=produce, args=(offset,)) for offset in (0, 250, 500, 750)]
+        for producer in producers:
+            producer.start()
+        for producer in producers:
+            producer.join()
+        writer.shutdown()
+
+        self.assertEqual(AuditLog.objects.count(), 1000)
+        self.assertEqual(len(set(AuditLog.objects.values_list('object_id', flat=True))), 1000)
+        stats = writer.stats()
+        self.assertEqual((stats['written'], stats['spilled'], stats['queued']), (1000, 0, 0))
+        self.assertFalse(stats['running'])
+
+    def test_backpressure_and_failed_flush_spill_then_replay(self):
+        writer = AuditWriter(queue_size=5, batch_size=2, spill_path=self.spill_path)
+        for number in range(8):
+            writer.record(audit_event(self.user, number))
+        self.assertEqual(writer.stats()['spilled'], 3)
+        self.assertEqual(writer.stats()['max_queued'], 5)
+
+        with mock.patch.object(AuditLog.objects, 'bulk_create', side_effect=Exception('timeout')), \
+                self.assertLogs('core.audit', 'WARNING'):
+            self.assertFalse(writer.flush())
+        stats = writer.stats()
+        self.assertEqual((stats['failed_flushes'], stats['spilled'], stats['queued']), (3, 8, 0))
+        self.assertEqual(AuditLog.objects.count(), 0)
+
+        self.assertEqual(writer.replay_spill(), 8)
+        self.assertFalse(writer.has_spill())
+        self.assertEqual(sorted(AuditLog.objects.values_list('object_id', flat=True)), list(range(8)))
+
+    def test_interrupted_replay_resumes_without_duplicates(self):
+        writer = AuditWriter(batch_size=2, spill_path=self.spill_path)
+        writer.spill([audit_event(self.user, number) for number in range(7)])
+
+        bulk_create = AuditLog.objects.bulk_create
+        calls = []
+
+        def fail_from_third_batch(rows, *args, **kwargs):
+            calls.append(len(rows))
+            if len(calls) >= 3:
+                raise OperationalError('timeout')
+            return bulk_create(rows, *args, **kwargs)
+
+        with mock.patch.object(AuditLog.objects, 'bulk_create', side_effect=fail_from_third_batch), \
+                self.assertLogs('core.audit', 'WARNING'):
+            self.assertEqual(writer.replay_spill(), 4)
+        self.assertTrue(writer.has_spill())
+
+        self.assertEqual(writer.replay_spill(), 3)
+        self.assertFalse(writer.has_spill())
+        self.assertEqual(sorted(AuditLog.objects.values_list('object_id', flat=True)), list(range(7)))
+
+    def test_replay_rejects_bad_events_and_continues(self):
+        writer = AuditWriter(batch_size=3, spill_path=self.spill_path)
+        writer.spill([audit_event(self.user, number) for number in range(3)])
+        writer.spill([{**audit_event(self.user, 3), 'action': None}])
+        with open(self.spill_path, 'a') as spill:
+            spill.write('{"truncated\n')
+        writer.spill([audit_event(self.user, number) for number in range(4, 7)])
+
+        with self.assertLogs('core.audit', 'WARNING'):
+            self.assertEqual(writer.replay_spill(), 6)
+        self.assertFalse(writer.has_spill())
+        self.assertEqual(writer.stats()['rejected'], 2)
+        self.assertEqual(sorted(AuditLog.objects.values_list('object_id', flat=True)), [0, 1, 2, 4, 5, 6])
+        rejected = self.spill_path.with_name('audit-spill.jsonl.rejected').read_text().splitlines()
+        self.assertEqual(len(rejected), 2)
+        self.assertEqual(rejected[1], '{"truncated')
+
+    def test_writer_thread_survives_errors(self):
+        writer = AuditWriter(flush_interval=0.01, spill_path=self.spill_path)
+        with mock.patch.object(writer, 'flush', side_effect=[RuntimeError('boom')] + [True] * 100), \
+                self.assertLogs('core.audit', 'ERROR'):
+            writer.start()
+            time.sleep(0.1)
+            self.assertTrue(writer._thread.is_alive())
+        writer._stopping.set()
+        writer._thread.join()
+
+
+class AuditViewsTestCase(TestCase):
+    """Views queue audit events instead of inserting them"""
+
+    def test_client_ip_ignores_forged_addresses(self):
+        factory = RequestFactory()
+        request = factory.get('/', HTTP_X_FORWARDED_FOR='foo, 203.0.113.7', REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(client_ip(request), '203.0.113.7')
+        request = factory.get('/', HTTP_X_FORWARDED_FOR='203.0.113.7, foo', REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(client_ip(request), '10.0.0.2')
+
+    def test_detail_view_is_queued(self):
+        writer = get_writer()
+        user = create_user('alice@example.com')
+        grievance = create_grievance(create_company(), submitted_by=user)
+        client = APIClient()
+        client.force_login(user)
+
+        writer._take(writer.queue.maxsize)
+        client.get(f'/grievances/api/{grievance.pk}/', HTTP_USER_AGENT='mobile')
+        client.get(f'/grievances/{grievance.pk}/')
+        events = writer._take(writer.queue.maxsize)
+        self.assertEqual([(event['action'], event['object_id']) for event in events],
+                         [('view', grievance.pk), ('view', grievance.pk)])
+        self.assertEqual(events[0]['user_agent'], 'mobile')
+        self.assertFalse(AuditLog.objects.exists())
+
+
+class AuditArchiveTestCase(TestCase):
+    """Cold audit months move to compressed archives and stay searchable"""
+
+    def setUp(self):
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        settings_override = self.settings(AUDIT_ARCHIVE_DIR=archive_dir.name, AUDIT_HOT_MONTHS=6)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = create_user('alice@example.com')
+        now = timezone.now()
+        self.old = audit_storage.add_months(audit_storage.month_start(now), -8) + timedelta(days=3)
+        for number, moment in enumerate([self.old, self.old + timedelta(hours=1), now]):
+            AuditLog.objects.create(**{**audit_event(self.user, number), 'timestamp': moment})
+
+    def test_archive_and_history(self):
+        call_command('manage_audit_partitions', stdout=StringIO())
+
+        self.assertEqual(list(AuditLog.objects.values_list('object_id', flat=True)), [2])
+        [entry] = audit_storage.read_manifest()
+        self.assertEqual(entry['rows'], 2)
+        self.assertEqual(entry['start'], audit_storage.month_start(self.old).isoformat())
+        self.assertEqual(audit_storage.verify_archives(), [])
+
+        start = self.old - timedelta(days=1)
+        history = audit_storage.audit_history(start, timezone.now() + timedelta(minutes=1), user=self.user)
+        self.assertEqual([event['object_id'] for event in history], [0, 1, 2])
+        self.assertEqual(history[0]['details'], {'n': 0})
+
+        history = audit_storage.audit_history(start, timezone.now(), model_name='Grievance', object_id=1)
+        self.assertEqual([event['object_id'] for event in history], [1])
+
+    def test_late_events_merge_into_the_archive(self):
+        audit_storage.archive_month(self.old)
+        AuditLog.objects.create(**{**audit_event(self.user, 3), 'timestamp': self.old - timedelta(hours=1)})
+        entry = audit_storage.archive_month(self.old)
+
+        self.assertEqual(entry['rows'], 3)
+        with gzip.open(audit_storage.archive_dir() / entry['file'], 'rt') as archive:
+            ids = [json.loads(line)['id'] for line in archive]
+        self.assertEqual(ids, sorted(set(ids)))
+        self.assertEqual(len(ids), 3)
+        self.assertEqual(list(AuditLog.objects.values_list('object_id', flat=True)), [2])
+
+    def test_verify_detects_tampering(self):
+        [entry] = audit_storage.archive_before(audit_storage.hot_cutoff())
+        path = audit_storage.archive_dir() / entry['file']
+        path.write_bytes(gzip.compress(b'{}\n'))
+        self.assertEqual(audit_storage.verify_archives(), [entry])
+
+
+class GrievanceExportTestCase(TestCase):
+    """Exports stream every scoped, filtered grievance in each format"""
+
+    url = '/grievances/api/export/'
+
+    def setUp(self):
+        self.company = create_company()
+        other = create_company('Chittagong Insurance', 'LIC-002')
+        self.officer = create_user('bob@example.com', 'insurance_company', self.company)
+        for number in range(5):
+            create_grievance(self.company, status='resolved' if number % 2 else 'open',
+                             title=f'Grievance {number}')
+        create_grievance(other, title='Elsewhere')
+        self.client = APIClient()
+        self.client.force_login(self.officer)
+
+    def export(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_csv_is_scoped_and_filtered(self):
+        rows = list(csv.DictReader(io.StringIO(self.export().decode())))
+        self.assertEqual([row['title'] for row in rows], [f'Grievance {n}' for n in range(5)])
+        self.assertEqual(rows[0]['insurance_company'], self.company.name)
+
+        rows = list(csv.DictReader(io.StringIO(self.export(status='resolved').decode())))
+        self.assertEqual([row['title'] for row in rows], ['Grievance 1', 'Grievance 3'])
+
+    def test_jsonl_gzip_and_xlsx(self):
+        lines = gzip.decompress(self.export(export_format='jsonl', gzip='1')).decode().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(json.loads(lines[0])['status'], 'open')
+
+        package = zipfile.ZipFile(io.BytesIO(self.export(export_format='xlsx')))
+        sheet = package.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 6)
+        self.assertIn('Grievance 4', sheet)
+
+    def test_rejects_unknown_format(self):
+        self.assertEqual(self.client.get(self.url, {'export_format': 'pdf'}).status_code, 400)
+
+    async def test_streams_under_asgi(self):
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(self.officer)
+        read = []
+
+        def rows(queryset, chunk_size=None):
+            for row in export_rows(queryset, chunk_size=1):
+                read.append(row)
+                yield row
+
+        with mock.patch('grievances.export.export_rows', rows), mock.patch('grievances.export.BUFFER_SIZE', 1):
+            response = await client.get(self.url)
+            self.assertTrue(response.is_async)
+            chunks = aiter(response.streaming_content)
+            header = await anext(chunks)
+            self.assertTrue(header.startswith(b'id,grievance_id'))
+            self.assertLess(len(read), 5)
+            rest = [chunk async for chunk in chunks]
+        self.assertEqual(len(read), 5)
+        self.assertEqual(len(rest), 5)
+
+    def test_rejects_invalid_filters(self):
+        for params in ({'company': 'abc'}, {'submitted_after': '2024-02-30'}, {'submitted_before': 'soon'}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(next(iter(params)), response.data)
+        self.assertEqual(self.client.get('/grievances/api/', {'company': '1;2'}).status_code, 400)
+
+    def test_dates_are_local_days(self):
+        dhaka = timezone.get_current_timezone()
+        Grievance.objects.update(submitted_at=datetime(2024, 3, 1, 23, 30, tzinfo=dhaka))
+        Grievance.objects.filter(title='Grievance 0').update(
+            submitted_at=datetime(2024, 3, 2, 0, 0, tzinfo=dhaka))
+        rows = list(csv.DictReader(io.StringIO(self.export(submitted_after='2024-03-02').decode())))
+        self.assertEqual([row['title'] for row in rows], ['Grievance 0'])
+        rows = list(csv.DictReader(io.StringIO(self.export(submitted_before='2024-03-01').decode())))
+        self.assertEqual(len(rows), 4)
+
+    def test_command_writes_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'export.csv'
+            call_command('export_grievances', output=str(path), chunk_size=2,
+                         company=[str(self.company.pk)])
+            self.assertEqual(len(path.read_text().splitlines()), 6)
+
+    def test_keyset_pages_without_server_side_cursors(self):
+        settings_dict = connections['default'].settings_dict
+        with mock.patch.dict(settings_dict, DISABLE_SERVER_SIDE_CURSORS=True):
+            rows = list(export_rows(Grievance.objects.all(), chunk_size=2))
+        self.assertEqual([row[0] for row in rows], list(Grievance.objects.order_by('id').values_list('id', flat=True)))
+
+
+class DatabaseConfigurationTestCase(TestCase):
+    """DB_POOL_MODE profiles set the connection options each pooling setup needs"""
+
+    postgres = {'ENGINE': 'django.db.backends.postgresql', 'NAME': 'idra_gms', 'OPTIONS': {}}
+
+    def test_profiles(self):
+        persistent = configure_database(self.postgres, 'persistent', 'wsgi')
+        self.assertEqual((persistent['CONN_MAX_AGE'], persistent['CONN_HEALTH_CHECKS']), (60, True))
+        self.assertEqual(persistent['OPTIONS']['connect_timeout'], 10)
+        self.assertEqual(configure_database(self.postgres, server_mode='asgi')['CONN_MAX_AGE'], 0)
+
+        bouncer = configure_database(self.postgres, 'pgbouncer', 'asgi')
+        self.assertTrue(bouncer['DISABLE_SERVER_SIDE_CURSORS'])
+        self.assertIs(bouncer['OPTIONS']['server_side_binding'], False)
+        self.assertEqual(bouncer['CONN_MAX_AGE'], 0)
+        self.assertEqual(self.postgres['OPTIONS'], {})
+
+        for mode, server_mode in (('persistent', 'asgi'), ('bogus', 'wsgi')):
+            with self.assertRaises(ImproperlyConfigured):
+                configure_database(self.postgres, mode, server_mode)
+
+
+def import_row(number, license_number='LIC-001', **overrides):
+    row = {
+        'title': f'Imported {number}', 'description': 'Received at branch office',
+        'category': 'claim_settlement', 'complainant_name': 'Rahim Ahmed',
+        'complainant_email': 'rahim@example.com', 'complainant_phone': '+8801700000000',
+        'policy_number': f'POL-{number}', 'company_license': license_number,
+        'claim_amount': '1500.50', 'initial_message': f'Original complaint {number}',
+    }
+    row.update(overrides)
+    return row
+
+
+def as_csv(rows):
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=list(rows[0]))
+    writer.writeheader()
+    writer.writerows(rows)
+    return output.getvalue().encode()
+
+
+class BulkImportTestCase(TestCase):
+    """Batch uploads are validated per row and inserted in bulk"""
+
+    def setUp(self):
+        self.company = create_company()
+        self.other = create_company('Chittagong Insurance', 'LIC-002')
+        self.officer = create_user('bob@example.com', 'insurance_company', self.company)
+        self.client = APIClient()
+        self.client.force_login(self.officer)
+
+    def upload(self, content, name='batch.csv'):
+        upload = io.BytesIO(content)
+        upload.name = name
+        return self.client.post('/grievances/api/import/', {'file': upload}, format='multipart')
+
+    def test_api_import_with_error_report(self):
+        rows = [import_row(n) for n in range(3)] + [
+            import_row(3, category='unknown', complainant_email='not-an-email'),
+            import_row(4, 'LIC-002'),
+            import_row(5, 'LIC-999', title=''),
+        ]
+        response = self.upload(as_csv(rows))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['failed']), (3, 3))
+        errors = {failure['row']: failure['errors'] for failure in response.data['errors']}
+        self.assertEqual(set(errors[4]), {'category', 'complainant_email'})
+        self.assertIn('own company', errors[5]['company_license'][0])
+        self.assertEqual(set(errors[6]), {'title', 'company_license'})
+
+        grievance = Grievance.objects.get(title='Imported 1')
+        self.assertRegex(grievance.grievance_id, r'^GRV-\d{4}-\d{5}$')
+        self.assertEqual(str(grievance.claim_amount), '1500.50')
+        self.assertEqual(grievance.messages.get().content, 'Original complaint 1')
+        self.assertEqual(grievance_count(company=self.company), 3)
+
+    def test_queries_do_not_grow_with_rows(self):
+        def queries_for(count, offset):
+            importer = GrievanceImporter(self.officer)
+            with CaptureQueriesContext(connection) as queries:
+                importer.run(import_row(n) for n in range(offset, offset + count))
+            # SQLite splits a large INSERT into parameter-limited batches
+            return len([query for query in queries if not query['sql'].startswith('INSERT')])
+
+        # The first import also creates the ID sequence and counter bucket; a
+        # plain sequence allocator keeps the process's cached ID block out of it
+        with mock.patch('grievances.bulk_import.get_allocator', return_value=SequenceIdAllocator()):
+            queries_for(1, 1000)
+            self.assertEqual(queries_for(10, 0), queries_for(200, 100))
+        self.assertEqual(Grievance.objects.count(), 211)
+
+    def test_policyholders_cannot_import(self):
+        self.client.force_login(create_user('alice@example.com'))
+        self.assertEqual(self.upload(as_csv([import_row(0)])).status_code, 403)
+
+    def test_insurers_without_a_company_cannot_import(self):
+        self.client.force_login(create_user('carol@example.com', 'insurance_company'))
+        self.assertEqual(self.upload(as_csv([import_row(0)])).status_code, 403)
+        self.assertFalse(Grievance.objects.exists())
+
+    def test_unreadable_file_reports_committed_rows(self):
+        lines = [json.dumps(import_row(n)) for n in range(3)] + ['{not json']
+        importer = GrievanceImporter(self.officer, chunk_size=2)
+        with self.assertRaises(ImportFormatError) as raised:
+            importer.run(read_rows(io.BytesIO('\n'.join(lines).encode()), 'jsonl'))
+        self.assertEqual(raised.exception.report.created, 2)
+        self.assertEqual(Grievance.objects.count(), 2)
+
+        response = self.upload(b'\xff\xfe', name='batch.csv')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['created'], 0)
+
+    def test_malformed_csv_reports_committed_rows(self):
+        head = as_csv([import_row(n) for n in range(3)])
+        for tail in (b'"' + b'x' * 200000 + b'"\n', b'"Broken "quote",x\n'):
+            with self.subTest(tail=tail[:20]):
+                Grievance.objects.all().delete()
+                importer = GrievanceImporter(self.officer, chunk_size=2)
+                with self.assertRaises(ImportFormatError) as raised:
+                    importer.run(read_rows(io.BytesIO(head + tail), 'csv'))
+                self.assertIn('Line 5', str(raised.exception))
+                self.assertEqual(raised.exception.report.created, 2)
+
+                response = self.upload(head + tail)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data['created'], 0)
+
+    def test_command_with_jsonl(self):
+        admin = create_user('david@example.com', 'idra_admin')
+        lines = [json.dumps(import_row(0, 'LIC-002')), json.dumps(import_row(1, priority='asap'))]
+        with tempfile.TemporaryDirectory() as directory:
+            path, errors = Path(directory) / 'batch.jsonl', Path(directory) / 'errors.csv'
+            path.write_text('\n'.join(lines) + '\n')
+            call_command('import_grievances', str(path), user=admin.email, errors=str(errors),
+                         stdout=StringIO())
+            self.assertEqual(errors.read_text().splitlines()[1], '2,priority,"""asap"" is not a valid choice."')
+        self.assertEqual(Grievance.objects.get().insurance_company, self.other)
+
+
+class GenerateLoadDataTestCase(TestCase):
+    """The load generator is reproducible and resumable"""
+
+    def generate(self, **options):
+        call_command('generate_load_data', **{
+            'companies': 3, 'users': 20, 'grievances': 120, 'batch_size': 50,
+            'messages': 2, 'documents': 1, 'audit': 2, 'seed': 7, 'stdout': StringIO(), **options,
+        })
+
+    def test_generates_resumes_and_repeats(self):
+        self.generate()
+        self.assertEqual(Grievance.objects.count(), 120)
+        self.assertEqual(User.objects.filter(email__startswith='load-').count(), 20 + 3 * 5 + 10)
+        self.assertGreater(GrievanceMessage.objects.count(), 0)
+        self.assertGreater(AuditLog.objects.count(), 0)
+        self.assertGreater(len(set(Grievance.objects.values_list('status', flat=True))), 2)
+        oldest = Grievance.objects.order_by('submitted_at').first().submitted_at
+        self.assertLess(oldest, timezone.now() - timedelta(days=30))
+        self.assertEqual(grievance_count(), 120)
+
+        # A lost batch is regenerated identically on resume
+        snapshot = list(Grievance.objects.order_by('grievance_id').values_list('grievance_id', 'title', 'status'))
+        Grievance.objects.filter(grievance_id__gte='LD7-0000000100').delete()
+        self.generate(resume=True)
+        self.assertEqual(
+            list(Grievance.objects.order_by('grievance_id').values_list('grievance_id', 'title', 'status')),
+            snapshot,
+        )
+
+        grievance = Grievance.objects.first()
+        self.assertEqual(grievance.sla_deadline,
+                         compute_deadline(grievance.category, grievance.priority, grievance.submitted_at))
+
+        # Seeds that share their last digits still get their own IDs
+        self.generate(seed=107, grievances=50)
+        self.assertEqual(Grievance.objects.count(), 170)
+        with self.assertRaises(CommandError):
+            self.generate(seed=10 ** 7)
+
+
+class RouteBenchmarkTestCase(TestCase):
+    """The route benchmark covers every role and flags regressions"""
+
+    def setUp(self):
+        self.company = create_company()
+        self.user = create_user('holder@example.com')
+        create_user('insurer@example.com', role='insurance_company', company=self.company)
+        create_user('admin@example.com', role='idra_admin')
+        # Another grievance first, so the sample grievance and document ids differ
+        create_grievance(self.company)
+        grievance = create_grievance(self.company, submitted_by=self.user)
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        storage_settings = self.settings(DOCUMENT_ROOT=root.name, DOCUMENT_ACCEL_REDIRECT='')
+        storage_settings.enable()
+        self.addCleanup(storage_settings.disable)
+        upload = uploads.start_upload(grievance, self.user, 'claim.pdf', 'application/pdf', 5)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.document = uploads.write_chunk(upload.pk, 0, io.BytesIO(b'claim'), 5)
+
+    def test_benchmark_and_compare(self):
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = Path(directory) / 'baseline.json'
+            call_command('benchmark_routes', iterations=2, warmup=0, output=str(baseline),
+                         stderr=StringIO())
+            results = json.loads(baseline.read_text())['results']
+
+            roles = {result['role'] for result in results.values()}
+            self.assertEqual(roles, {'anonymous', 'policyholder', 'insurance_company', 'idra_admin'})
+            detail = self.document.grievance_id
+            self.assertIn(f'GET /api/grievances/api/{detail}/ [policyholder]', results)
+            download = f'GET /api/grievances/api/documents/{self.document.pk}/download/ [policyholder]'
+            self.assertEqual(results[download]['status'], 200)
+            self.assertFalse(any('/logout/' in key or '/admin/' in key for key in results))
+            for result in results.values():
+                self.assertLess(result['status'], 500)
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+            call_command('compare_benchmarks', str(baseline), str(baseline), stdout=StringIO())
+
+            key = f'GET /api/grievances/api/{detail}/ [policyholder]'
+            regressed = json.loads(baseline.read_text())
+            regressed['results'][key]['queries'] += 1
+            regressed['results'][key]['p95_ms'] = regressed['results'][key]['p95_ms'] * 3 + 10
+            current = Path(directory) / 'current.json'
+            current.write_text(json.dumps(regressed))
+            with self.assertRaisesMessage(CommandError, '2 regression(s)'):
+                call_command('compare_benchmarks', str(baseline), str(current),
+                             stdout=StringIO(), stderr=StringIO())
+
+
+class RequestMetricsTestCase(TestCase):
+    """The instrumentation middleware reports timings and repeated queries"""
+
+    def setUp(self):
+        reset_request_metrics()
+        self.user = create_user('alice@example.com')
+        self.company = create_company()
+        self.grievance = create_grievance(self.company, submitted_by=self.user)
+        self.client = APIClient()
+        self.client.force_login(self.user)
+
+    def test_server_timing_and_histogram(self):
+        response = self.client.get(f'/api/grievances/api/{self.grievance.pk}/')
+        timing = response['Server-Timing']
+        for metric in ('db;dur=', 'tpl;dur=', 'ser;dur=', 'total;dur='):
+            self.assertIn(metric, timing)
+        self.assertRegex(timing, r'desc="[1-9]\d* queries"')
+        self.assertNotIn('ser;dur=0.0', timing)
+
+        self.assertEqual(self.client.get('/api/request-metrics/').status_code, 403)
+        admin = User.objects.create_superuser('admin@example.com', 'admin@example.com', 'x')
+        self.client.force_login(admin)
+        report = self.client.get('/api/request-metrics/').json()
+        detail = report['grievances:api-detail']
+        self.assertEqual(detail['count'], 1)
+        self.assertEqual(sum(detail['histogram'].values()), 1)
+        self.assertGreater(detail['mean_queries'], 0)
+
+    def test_repeated_queries_are_flagged(self):
+        for number in range(5):
+            create_grievance(self.company, submitted_by=self.user, title=f'Claim {number}')
+
+        def view(request):
+            for grievance in Grievance.objects.order_by('pk'):
+                grievance.insurance_company.name  # one query per grievance
+            return HttpResponse()
+
+        middleware = RequestMetricsMiddleware(view)
+        with self.assertLogs('core.instrumentation', 'WARNING') as logs:
+            middleware(RequestFactory().get('/'))
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['queries'], 7)
+        self.assertEqual(line['duplicate_queries'], 5)
+        self.assertEqual(line['repeated_queries'][0]['count'], 6)
+        self.assertIn('companies_insurancecompany', line['repeated_queries'][0]['sql'])
+
+
+class PrometheusMetricsTestCase(TestCase):
+    """/metrics sums worker snapshots and reports grievance gauges"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        settings_override = self.settings(METRICS_DIR=self.directory.name, METRICS_TOKEN='')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+        reset_metrics()
+
+        self.user = create_user('alice@example.com')
+        company = create_company()
+        create_grievance(company, submitted_by=self.user, priority='urgent',
+                         sla_deadline=timezone.now() - timedelta(days=1))
+        create_grievance(company, submitted_by=self.user, priority='urgent', status='closed',
+                         sla_deadline=timezone.now() - timedelta(days=1))
+        create_grievance(company, submitted_by=self.user, sla_deadline=timezone.now() + timedelta(hours=2))
+
+    def sample(self, text, line):
+        for row in text.splitlines():
+            if row.startswith(line + ' '):
+                return float(row.rsplit(' ', 1)[1])
+        self.fail(f'{line} not found in metrics')
+
+    def test_metrics_across_processes(self):
+        self.client.force_login(self.user)
+        self.client.get('/dashboard/')
+        # A worker that has since exited left its last snapshot behind
+        dead = Path(self.directory.name) / f'metrics-{socket.gethostname()}-4194303-1.json'
+        dead.write_text(json.dumps({
+            'pid': 4194303,
+            'counters': [['idra_http_responses_total', [['view', 'dashboard'], ['status', '200']], 4]],
+            'histograms': [],
+            'in_flight': 3,
+        }))
+        # The SLA scheduler container shares the directory; its process ids mean nothing here
+        scheduler = Path(self.directory.name) / 'metrics-sla-scheduler-4194303-1.json'
+        scheduler.write_text(json.dumps({
+            'pid': 4194303,
+            'counters': [['idra_sla_escalations_total', [['level', 'breached']], 2]],
+            'histograms': [],
+            'in_flight': 0,
+        }))
+
+        text = self.client.get('/metrics').content.decode()
+        self.assertEqual(self.sample(text, 'idra_http_responses_total{view="dashboard",status="200"}'), 5)
+        self.assertEqual(self.sample(text, 'idra_sla_escalations_total{level="breached"}'), 2)
+        self.assertEqual(self.sample(
+            text, 'idra_http_request_duration_seconds_count{view="dashboard",method="GET"}'), 1)
+        self.assertIn('idra_http_request_duration_seconds_bucket{view="dashboard",method="GET",le="+Inf"} 1',
+                      text)
+        self.assertGreater(self.sample(text, 'idra_db_queries_total{view="dashboard"}'), 0)
+        self.assertEqual(self.sample(text, 'idra_http_requests_in_flight'), 1)
+        self.assertEqual(self.sample(text, 'idra_grievances_sla_breached{priority="urgent"}'), 1)
+        self.assertEqual(self.sample(text, 'idra_grievances_sla_due_24h{priority="medium"}'), 1)
+        self.assertEqual(self.sample(text, 'idra_grievance_submissions{window="24h"}'), 3)
+        self.assertIn('# TYPE idra_http_request_duration_seconds histogram', text)
+
+        # The dead worker's counts were archived and survive
+        self.assertFalse(dead.exists())
+        self.assertTrue(scheduler.exists())
+        text = self.client.get('/metrics').content.decode()
+        self.assertEqual(self.sample(text, 'idra_http_responses_total{view="dashboard",status="200"}'), 5)
+
+        with self.settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get('/metrics').status_code, 401)
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, 200)
+
+
+class AsyncViewsTestCase(TestCase):
+    """Hot read paths run natively under the ASGI handler"""
+
+    async def test_async_read_paths(self):
+        company = await sync_to_async(create_company)()
+        grievance = await sync_to_async(create_grievance)(company)
+        client = AsyncClient()
+
+        response = await client.get(f'/api/grievances/api/track/{grievance.grievance_id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['grievance_id'], grievance.grievance_id)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        response = await client.get(f'/api/grievances/api/track/{grievance.grievance_id}/',
+                                    headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+        response = await client.get('/api/grievances/api/track/IDRA-0000-000000/')
+        self.assertEqual(response.status_code, 404)
+
+        response = await client.get('/')
+        self.assertEqual(response.context['stats']['total_grievances'], 1)
+        response = await client.get('/companies/')
+        self.assertEqual(response.context['total_companies'], 1)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTestCase(TransactionTestCase):
+    """Designated reads use a healthy replica unless the client just wrote"""
+
+    # The replica mirrors the test database through its own connection, so
+    # rows must be committed for it to see them
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        reset_replica_health()
+        self.addCleanup(reset_replica_health)
+
+        @replica_reads
+        def view(request):
+            if request.method == 'POST':
+                create_grievance(create_company())
+            return HttpResponse(Grievance.objects.all().db)
+
+        self.middleware = ReplicaStickinessMiddleware(view)
+
+    def request(self, method='get', **cookies):
+        request = getattr(RequestFactory(), method)('/')
+        request.COOKIES.update(cookies)
+        return self.middleware(request)
+
+    def test_reads_writes_and_stickiness(self):
+        response = self.request()
+        self.assertEqual(response.content, b'replica')
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+        self.assertEqual(Grievance.objects.all().db, 'default')
+
+        response = self.request('post')
+        self.assertEqual(response.content, b'default')
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        response = self.request(**{STICKY_COOKIE: '1'})
+        self.assertEqual(response.content, b'default')
+
+        user = create_user('alice@example.com')
+        self.assertEqual(replica_reads(lambda: User.objects.all().db)(), 'default')
+        self.assertEqual(replica_reads(lambda: Grievance.objects.filter(submitted_by=user).db)(), 'replica')
+
+    def test_lagging_or_unreachable_replica_falls_back(self):
+        with mock.patch('core.replicas.replication_lag', return_value=60.0):
+            self.assertEqual(self.request().content, b'default')
+        self.assertEqual(replica_status(), {'replica': False})
+
+        reset_replica_health()
+        with mock.patch('core.replicas.replication_lag', side_effect=OperationalError('down')):
+            self.assertEqual(self.request().content, b'default')
+
+        reset_replica_health()
+        self.assertEqual(self.request().content, b'replica')
+
+    def test_cache_fills_read_the_primary(self):
+        cache.clear()
+        fill = replica_reads(lambda: get_or_compute('probe', lambda: Grievance.objects.all().db))
+        self.assertEqual(fill(), 'default')
+
+    def test_monitor_checks_off_the_request_path(self):
+        checked = threading.Event()
+
+        def lag(alias):
+            checked.wait(5)
+            return 0.0
+
+        with override_settings(REPLICA_MONITOR=True, REPLICA_LAG_CHECK_INTERVAL=0.01), \
+                mock.patch('core.replicas.replication_lag', side_effect=lag):
+            # The first request does not wait for the check, and uses the primary
+            self.assertEqual(self.request().content, b'default')
+            checked.set()
+            for _ in range(100):
+                if replica_status().get('replica'):
+                    break
+                time.sleep(0.01)
+            self.assertEqual(self.request().content, b'replica')
+        time.sleep(0.05)
+
+    def test_designated_views_work_on_the_replica(self):
+        admin = create_user('david@example.com', 'idra_admin')
+        create_grievance(create_company(), submitted_by=admin)
+        self.client.force_login(admin)
+        self.assertEqual(self.client.get('/grievances/api/analytics/').json()['total_grievances'], 1)
+        self.assertEqual(self.client.get('/').status_code, 200)
+        self.assertEqual(self.client.get('/companies/').context['total_companies'], 1)
+        rows = list(csv.DictReader(io.StringIO(
+            b''.join(self.client.get('/grievances/api/export/').streaming_content).decode())))
+        self.assertEqual(len(rows), 1)
+
+
+class SlaEngineTestCase(TestCase):
+    """Deadlines count business days; the sweep escalates each grievance once per level"""
+
+    def setUp(self):
+        self.company = create_company()
+
+    def test_deadline_skips_weekends_and_holidays(self):
+        # Thursday before the Eid-ul-Fitr weekend; Independence Day falls on the 26th
+        submitted = datetime(2026, 3, 19, 11, 0, tzinfo=timezone.get_default_timezone())
+        deadline = timezone.localtime(compute_deadline('fraud_concern', 'medium', submitted))
+        self.assertEqual((deadline.date(), deadline.hour), (date(2026, 3, 30), 17))
+        self.assertLess(compute_deadline('claim_settlement', 'urgent', submitted),
+                        compute_deadline('claim_settlement', 'low', submitted))
+
+        with override_settings(SLA_EXTRA_HOLIDAYS=['2026-03-23']):
+            self.assertEqual(timezone.localtime(compute_deadline('fraud_concern', 'medium', submitted)).date(),
+                             date(2026, 3, 31))
+
+        calendar = get_calendar()
+        for offset in range(0, 400, 7):
+            day = date(2026, 1, 1) + timedelta(days=offset)
+            expected, remaining = day, 12
+            while remaining:
+                expected += timedelta(days=1)
+                remaining -= calendar.is_business_day(expected)
+            self.assertEqual(calendar.add(day, 12), expected)
+
+    def test_deadline_computed_on_save(self):
+        grievance = create_grievance(self.company, sla_deadline=None, priority='high')
+        self.assertEqual(grievance.sla_deadline,
+                         compute_deadline('claim_settlement', 'high', grievance.submitted_at))
+
+    def test_sweep_escalates_breached_and_near_breach_once(self):
+        now = timezone.now()
+        breached = create_grievance(self.company, sla_deadline=now - timedelta(hours=1))
+        near = create_grievance(self.company, sla_deadline=now + timedelta(hours=2), priority='high')
+        later = create_grievance(self.company, sla_deadline=now + timedelta(days=5))
+        create_grievance(self.company, sla_deadline=now - timedelta(days=1), status='resolved')
+        received = []
+        sla_escalated.connect(lambda level, ids, **kwargs: received.append((level, sorted(ids))),
+                              weak=False, dispatch_uid='test_sla')
+        self.addCleanup(sla_escalated.disconnect, dispatch_uid='test_sla')
+
+        version = namespace_version('grievances')
+        self.assertEqual(sweep(now=now, batch_size=1), {'breached': 1, 'near_breach': 1})
+        self.assertEqual(received, [(BREACHED, [breached.pk]), (NEAR_BREACH, [near.pk])])
+        self.assertNotEqual(namespace_version('grievances'), version)
+        breached.refresh_from_db()
+        self.assertEqual((breached.escalation_level, breached.priority), (BREACHED, 'high'))
+        self.assertEqual(breached.updated_at, now)
+        self.assertEqual(sweep(now=now), {'breached': 0, 'near_breach': 0})
+
+        self.assertEqual(sweep(now=now + timedelta(hours=3)), {'breached': 1, 'near_breach': 0})
+        near.refresh_from_db()
+        later.refresh_from_db()
+        self.assertEqual((near.escalation_level, near.priority), (BREACHED, 'urgent'))
+        self.assertEqual(later.escalation_level, 0)
+
+        out = StringIO()
+        call_command('run_sla_scheduler', '--once', stdout=out)
+        self.assertIn('Escalated 0 breached and 0 near-breach', out.getvalue())
+
+
+class BackgroundJobTestCase(TestCase):
+    """Side effects are queued by handlers and run, retried or dropped by the worker"""
+
+    def setUp(self):
+        TASK_CALLS.clear()
+        self.company = create_company()
+        self.policyholder = create_user('alice@example.com')
+        self.admin = create_user('david@example.com', 'idra_admin')
+        self.grievance = create_grievance(self.company, submitted_by=self.policyholder)
+
+    def run_worker(self):
+        return Worker({'default': 1, 'notifications': 1}).run_burst()
+
+    def test_handlers_queue_notifications(self):
+        self.client.force_login(self.admin)
+        response = self.client.post(f'/grievances/{self.grievance.pk}/update-status/', {'status': 'under_review'})
+        self.assertEqual(response.status_code, 302)
+        self.client.post(f'/grievances/{self.grievance.pk}/', {'message_content': 'We are looking into it.'})
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(BackgroundJob.objects.filter(status='queued').count(), 2)
+
+        self.assertEqual(self.run_worker(), 2)
+        self.assertEqual(sorted(message.subject for message in mail.outbox), [
+            f'Grievance {self.grievance.grievance_id} is now Under Review',
+            f'New message on grievance {self.grievance.grievance_id}',
+        ])
+        self.assertTrue(all(message.to == ['complainant@example.com'] for message in mail.outbox))
+        self.assertEqual(BackgroundJob.objects.filter(status='done').count(), 2)
+
+        response = APIClient().post('/accounts/api/register/', {
+            'email': 'carol@example.com', 'password': 'demo12345', 'first_name': 'Carol', 'last_name': 'Khan',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        call_command('run_task_worker', '--burst', '-q', 'notifications', stdout=StringIO())
+        self.assertEqual(mail.outbox[-1].to, ['carol@example.com'])
+
+    def test_retry_backoff_and_failure(self):
+        self.assertTrue(record_task_call.enqueue('once', key='job-1'))
+        self.assertFalse(record_task_call.enqueue('twice', key='job-1'))
+        record_task_call.enqueue('flaky', fail=True)
+        self.assertEqual(self.run_worker(), 2)
+        self.assertEqual(sorted(TASK_CALLS), ['flaky', 'once'])
+
+        job = BackgroundJob.objects.get(kwargs={'fail': True})
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertIn('RuntimeError: task failed', job.last_error)
+        delay = (job.run_at - timezone.now()).total_seconds()
+        self.assertTrue(2 <= delay <= 5, delay)
+        self.assertEqual(self.run_worker(), 0)
+
+        BackgroundJob.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        self.assertEqual(self.run_worker(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+
+    def test_expired_lease_is_claimed_again(self):
+        record_task_call.enqueue('lost')
+        backend = DatabaseBackend()
+        [job] = backend.claim('default')
+        self.assertEqual(backend.claim('default'), [])
+        BackgroundJob.objects.filter(pk=job.id).update(run_at=timezone.now() - timedelta(seconds=1))
+        [again] = backend.claim('default')
+        self.assertEqual((again.id, again.attempts), (job.id, 2))
+
+        # The worker died during the last attempt
+        BackgroundJob.objects.filter(pk=job.id).update(max_attempts=2, run_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(backend.claim('default'), [])
+        job = BackgroundJob.objects.get(pk=job.id)
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertIsNotNone(job.finished_at)
+
+
+@override_settings(EVENTS_HEARTBEAT_SECONDS=0.05, EVENTS_MAX_STREAM_SECONDS=1)
+class GrievanceEventsTestCase(TestCase):
+    """Participants follow a grievance over Server-Sent Events"""
+
+    def setUp(self):
+        self.company = create_company()
+        self.policyholder = create_user('alice@example.com')
+        self.admin = create_user('david@example.com', 'idra_admin')
+        self.grievance = create_grievance(self.company, submitted_by=self.policyholder)
+        self.url = f'/api/grievances/api/{self.grievance.pk}/events/'
+
+    def post(self, content, is_internal=False):
+        with self.captureOnCommitCallbacks(execute=True):
+            return GrievanceMessage.objects.create(grievance=self.grievance, sender=self.admin, content=content,
+                                                   is_internal=is_internal)
+
+    def set_status(self, value):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.grievance.status = value
+            self.grievance.save()
+
+    async def open(self, user, **headers):
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(user)
+        response = await client.get(self.url, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        return stream
+
+    async def next_event(self, stream):
+        while (chunk := (await anext(stream)).decode()).startswith(':'):
+            continue
+        return chunk
+
+    async def finish(self, stream):
+        """Read ``stream`` until the server ends it"""
+        async for chunk in stream:
+            self.assertTrue(chunk.startswith(b':'), chunk)
+
+    def test_refused_under_wsgi(self):
+        self.client.force_login(self.policyholder)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 501)
+        self.assertTrue(response.json()['fallback'].endswith(f'/api/grievances/api/{self.grievance.pk}/messages/'))
+
+    async def test_live_events_respect_visibility(self):
+        outsider = await sync_to_async(create_user)('eve@example.com')
+        client = AsyncClient()
+        self.assertEqual((await client.get(self.url)).status_code, 403)
+        await sync_to_async(client.force_login)(outsider)
+        self.assertEqual((await client.get(self.url)).status_code, 403)
+
+        staff = await self.open(self.admin)
+        complainant = await self.open(self.policyholder)
+        self.assertEqual(await anext(complainant), b': keep-alive\n\n')
+
+        note = await sync_to_async(self.post)('Check the surveyor report', is_internal=True)
+        reply = await sync_to_async(self.post)('We are looking into it.')
+        await sync_to_async(self.set_status)('under_review')
+
+        self.assertTrue((await self.next_event(staff)).startswith(f'event: message\nid: {note.pk}\n'))
+        self.assertIn('We are looking into it.', await self.next_event(staff))
+        self.assertTrue((await self.next_event(staff)).startswith('event: status\n'))
+        event = await self.next_event(complainant)
+        self.assertTrue(event.startswith(f'event: message\nid: {reply.pk}\n'), event)
+        event = await self.next_event(complainant)
+        self.assertEqual(event, 'event: status\ndata: {"status": "under_review", "priority": "medium"}\n\n')
+        await self.finish(staff)
+        await self.finish(complainant)
+
+    async def test_reconnect_replays_missed_messages(self):
+        first = await sync_to_async(self.post)('First reply')
+        await sync_to_async(self.post)('Internal note', is_internal=True)
+        missed = await sync_to_async(self.post)('Second reply')
+
+        stream = await self.open(self.policyholder, **{'Last-Event-ID': str(first.pk)})
+        event = await self.next_event(stream)
+        self.assertTrue(event.startswith(f'event: message\nid: {missed.pk}\n'), event)
+        self.assertIn('"status": "open"', await self.next_event(stream))
+        await self.finish(stream)
+
+    async def test_client_disconnect_ends_stream(self):
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(self.policyholder)
+        cookie = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': self.url, 'raw_path': self.url.encode(), 'query_string': b'', 'root_path': '',
+            'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+            'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+        }
+        messages, gone = asyncio.Queue(), asyncio.Event()
+        await messages.put({'type': 'http.request', 'body': b'', 'more_body': False})
+
+        async def receive():
+            if messages.empty():
+                await gone.wait()
+                return {'type': 'http.disconnect'}
+            return await messages.get()
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+            if message.get('body', b'').startswith(b': keep-alive'):
+                gone.set()
+
+        await asyncio.wait_for(IdraASGIHandler()(scope, receive, send), 2)
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertEqual(broker.count(), 0)
+
+
+@override_settings(DOCUMENT_CHUNK_SIZE=4, DOCUMENT_MAX_SIZE=64)
+class DocumentUploadTestCase(TestCase):
+    """Documents arrive in resumable chunks and are stored once per content"""
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = Path(root.name)
+        storage_settings = self.settings(DOCUMENT_ROOT=root.name)
+        storage_settings.enable()
+        self.addCleanup(storage_settings.disable)
+        self.company = create_company()
+        self.policyholder = create_user('alice@example.com')
+        self.grievance = create_grievance(self.company, submitted_by=self.policyholder)
+        self.client.force_login(self.policyholder)
+
+    def start(self, size, **fields):
+        return self.client.post(f'/api/grievances/api/{self.grievance.pk}/uploads/', {
+            'file_name': 'C:\\scans\\claim.pdf', 'content_type': 'application/pdf', 'file_size': size, **fields,
+        }, content_type='application/json')
+
+    def put(self, upload_id, offset, chunk):
+        return self.client.put(f'/api/grievances/api/uploads/{upload_id}/', chunk,
+                               content_type='application/octet-stream', headers={'Upload-Offset': str(offset)})
+
+    def upload(self, data):
+        upload_id = self.start(len(data)).json()['id']
+        for offset in range(0, len(data), 4):
+            response = self.put(upload_id, offset, data[offset:offset + 4])
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def stored_files(self):
+        return [path for path in (self.root / 'objects').rglob('*') if path.is_file()]
+
+    def test_chunks_resume_and_deduplicate(self):
+        data = b'Claim form, page 1'
+        response = self.start(len(data))
+        self.assertEqual(response.status_code, 201)
+        upload_id = response.json()['id']
+        self.assertEqual((response.json()['chunk_size'], response.json()['offset']), (4, 0))
+
+        self.assertEqual(self.put(upload_id, 0, data[:4]).json()['offset'], 4)
+        response = self.put(upload_id, 0, data[:4])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Upload-Offset'], '4')
+        self.assertEqual(self.put(upload_id, 4, data[4:7]).status_code, 400)
+        self.assertEqual(self.client.get(f'/api/grievances/api/uploads/{upload_id}/')['Upload-Offset'], '4')
+
+        for offset in range(4, len(data), 4):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.put(upload_id, offset, data[offset:offset + 4])
+        self.assertEqual(response.status_code, 201)
+        document = response.json()
+        content_hash = hashlib.sha256(b''.join(
+            hashlib.sha256(data[offset:offset + 4]).digest() for offset in range(0, len(data), 4)
+        )).hexdigest()
+        self.assertEqual((document['file_name'], document['file_size']), ('claim.pdf', len(data)))
+        self.assertEqual(document['content_hash'], content_hash)
+        self.assertEqual(self.stored_files()[0].read_bytes(), data)
+        self.assertFalse(DocumentUpload.objects.exists())
+        self.assertFalse(any((self.root / 'uploads').iterdir()))
+
+        again = self.upload(data)
+        self.assertEqual(again['file_path'], document['file_path'])
+        self.assertEqual(len(self.stored_files()), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            GrievanceDocument.objects.get(pk=document['id']).delete()
+        self.assertEqual(len(self.stored_files()), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            GrievanceDocument.objects.get(pk=again['id']).delete()
+        self.assertEqual(self.stored_files(), [])
+
+    def test_access_limits_and_expiry(self):
+        self.assertEqual(self.start(65).status_code, 400)
+        upload_id = self.start(8).json()['id']
+
+        self.client.force_login(create_user('eve@example.com'))
+        self.assertEqual(self.start(8).status_code, 404)
+        self.assertEqual(self.put(upload_id, 0, b'1234').status_code, 404)
+
+        self.client.force_login(self.policyholder)
+        self.assertEqual(self.client.delete(f'/api/grievances/api/uploads/{upload_id}/').status_code, 204)
+        self.assertFalse(any((self.root / 'uploads').iterdir()))
+
+        self.start(8)
+        DocumentUpload.objects.update(expires_at=timezone.now())
+        call_command('purge_document_uploads', stdout=StringIO())
+        self.assertFalse(DocumentUpload.objects.exists())
+
+    def test_racing_chunks_keep_the_first(self):
+        upload = uploads.start_upload(self.grievance, self.policyholder, 'claim.pdf', 'application/pdf', 8)
+        test = self
+
+        class Racing(io.BytesIO):
+            # Another request sends the same chunk while this one streams
+            def read(self, size=-1):
+                if not self.tell():
+                    uploads.write_chunk(upload.pk, 0, io.BytesIO(b'1234'), 4)
+                    test.assertEqual(DocumentUpload.objects.get(pk=upload.pk).offset, 4)
+                return super().read(size)
+
+        with self.assertRaises(uploads.UploadConflict):
+            uploads.write_chunk(upload.pk, 0, Racing(b'abcd'), 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            document = uploads.write_chunk(upload.pk, 4, io.BytesIO(b'5678'), 4)
+        self.assertEqual(self.stored_files()[0].read_bytes(), b'12345678')
+        self.assertEqual(document.file_size, 8)
+        self.assertFalse(any((self.root / 'uploads').iterdir()))
+
+    @override_settings(DOCUMENT_CHUNK_SIZE=8 * 1024 * 1024, DOCUMENT_MAX_SIZE=16 * 1024 * 1024)
+    def test_chunk_memory_is_bounded(self):
+        upload = uploads.start_upload(self.grievance, self.policyholder, 'scan.tiff', 'image/tiff', 8 * 1024 * 1024)
+        source = self.root / 'scan.tiff'
+        with open(source, 'wb') as handle:
+            handle.truncate(upload.file_size)
+        with open(source, 'rb') as stream:
+            tracemalloc.start()
+            try:
+                document = uploads.write_chunk(upload.pk, 0, stream, upload.file_size)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+        self.assertEqual(document.file_size, upload.file_size)
+        self.assertLess(peak, 1024 * 1024)
+
+
+class DocumentDownloadTestCase(TestCase):
+    """Documents are downloaded after an access check, by nginx or in development by Django"""
+
+    data = b'Surveyor report: vehicle total loss'
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        storage_settings = self.settings(DOCUMENT_ROOT=root.name, DOCUMENT_ACCEL_REDIRECT='')
+        storage_settings.enable()
+        self.addCleanup(storage_settings.disable)
+        self.company = create_company()
+        self.policyholder = create_user('alice@example.com')
+        grievance = create_grievance(self.company, submitted_by=self.policyholder)
+        upload = uploads.start_upload(grievance, self.policyholder, 'report.pdf', 'application/pdf', len(self.data))
+        self.document = uploads.write_chunk(upload.pk, 0, io.BytesIO(self.data), len(self.data))
+        self.url = f'/api/grievances/api/documents/{self.document.pk}/download/'
+
+    def test_access_follows_grievance_roles(self):
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        other_company = create_company('Chittagong Insurance Limited', 'LIC-002')
+        for user in (create_user('eve@example.com'), create_user('ivan@example.com', 'insurance_company', other_company)):
+            self.client.force_login(user)
+            self.assertEqual(self.client.get(self.url).status_code, 404)
+        for user in (self.policyholder, create_user('david@example.com', 'idra_admin')):
+            self.client.force_login(user)
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+        self.client.logout()
+        GrievanceDocument.objects.filter(pk=self.document.pk).update(is_public=True)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_django_fallback_serves_ranges_and_conditional_get(self):
+        self.client.force_login(self.policyholder)
+        response = self.client.get(self.url)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="report.pdf"')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        etag = response['ETag']
+
+        self.assertEqual(self.client.get(self.url, headers={'If-None-Match': etag}).status_code, 304)
+        response = self.client.get(self.url, headers={'Range': 'bytes=9-14', 'If-Range': etag})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 9-14/{len(self.data)}')
+        self.assertEqual(b''.join(response.streaming_content), b'report')
+        response = self.client.get(self.url, headers={'Range': 'bytes=-4'})
+        self.assertEqual(b''.join(response.streaming_content), b'loss')
+        self.assertEqual(self.client.get(self.url, headers={'Range': 'bytes=9-14', 'If-Range': '"stale"'}).status_code,
+                         200)
+        response = self.client.get(self.url, headers={'Range': 'bytes=100-'})
+        self.assertEqual((response.status_code, response['Content-Range']), (416, f'bytes */{len(self.data)}'))
+
+    async def test_django_fallback_streams_under_asgi(self):
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(self.policyholder)
+        with mock.patch('grievances.downloads.READ_SIZE', 8):
+            response = await client.get(self.url)
+            self.assertTrue(response.is_async)
+            self.assertEqual([chunk async for chunk in response.streaming_content][0], self.data[:8])
+            response = await client.get(self.url, headers={'Range': 'bytes=9-14'})
+            self.assertTrue(response.is_async)
+            self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), b'report')
+
+    @override_settings(DOCUMENT_ACCEL_REDIRECT='/protected-documents/')
+    def test_nginx_sends_the_file(self):
+        self.client.force_login(self.policyholder)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-documents/{self.document.file_path}')
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+
+        response = self.client.get(self.url, headers={'If-Modified-Since': response['Last-Modified']})
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(response.has_header('X-Accel-Redirect'))
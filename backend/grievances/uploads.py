@@ -0,0 +1,171 @@
+"""
+Resumable, chunked document uploads.
+
+A client starts an upload with the file's name, type and size, then sends
+its bytes in order, ``chunk_size`` at a time (the last chunk may be
+shorter), one request per chunk. Each chunk is streamed to storage (see
+``core.storage``) in ``READ_SIZE`` pieces, so an upload never holds more
+than a piece of the file in memory, however large the file. When a chunk
+fails the client asks for the upload's offset and resumes from there.
+
+Chunks are hashed as they stream. The content hash is the SHA-256 of the
+chunks' SHA-256 digests, concatenated. Only the digests carry over between
+requests, so any process can take the next chunk. The hash is the file's
+storage key, and a file uploaded again is stored once. Files are
+deduplicated against others cut into chunks of the same size, so changing
+``DOCUMENT_CHUNK_SIZE`` only costs duplicate copies.
+
+A chunk is streamed to a candidate part of its own with no transaction
+open. Only then is the upload row locked, briefly, to check that the offset
+is still the one the chunk was sent for and to accept the part and advance
+the offset and digests. Two requests racing with the same chunk cannot
+overwrite each other's bytes; the loser gets ``UploadConflict``.
+
+After the last chunk the parts are joined and moved into place, and the
+``GrievanceDocument`` is created and the upload deleted in one transaction.
+Documents with the same content share a stored file, so creating a
+document on a file and deleting an unused file both hold the file's
+``DocumentFile`` row lock. A file is never deleted just as a new document
+starts using it.
+"""
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core.storage import get_storage
+from .models import DocumentFile, DocumentUpload, GrievanceDocument
+
+READ_SIZE = 64 * 1024
+
+
+class UploadError(ValueError):
+    """The upload or chunk is not acceptable"""
+
+
+class UploadConflict(UploadError):
+    """A chunk was sent for the wrong offset"""
+
+    def __init__(self, offset):
+        super().__init__(f'Expected the chunk at offset {offset}')
+        self.offset = offset
+
+
+def storage_key(content_hash):
+    return f'{content_hash[:2]}/{content_hash[2:4]}/{content_hash}'
+
+
+def start_upload(grievance, user, file_name, content_type, file_size, description='', is_public=False):
+    max_size = getattr(settings, 'DOCUMENT_MAX_SIZE', 100 * 1024 * 1024)
+    if not 0 < file_size <= max_size:
+        raise UploadError(f'Documents must be between 1 byte and {max_size} bytes')
+    hours = getattr(settings, 'DOCUMENT_UPLOAD_EXPIRY_HOURS', 24)
+    return DocumentUpload.objects.create(
+        grievance=grievance, uploaded_by=user, storage_id=get_storage().start(),
+        file_name=file_name, content_type=content_type, file_size=file_size,
+        description=description, is_public=is_public,
+        chunk_size=getattr(settings, 'DOCUMENT_CHUNK_SIZE', 4 * 1024 * 1024),
+        expires_at=timezone.now() + timedelta(hours=hours),
+    )
+
+
+def _read(stream, length, hasher):
+    """Up to ``length`` bytes of ``stream`` in ``READ_SIZE`` pieces, added to ``hasher``"""
+    while length > 0:
+        piece = stream.read(min(READ_SIZE, length))
+        if not piece:
+            return
+        hasher.update(piece)
+        length -= len(piece)
+        yield piece
+
+
+def write_chunk(upload_id, offset, stream, length):
+    """
+    Store the chunk of ``length`` bytes at ``offset``, read from ``stream``.
+
+    Returns the upload, or the new ``GrievanceDocument`` once the last chunk
+    is in.
+    """
+    storage = get_storage()
+    upload = DocumentUpload.objects.get(pk=upload_id)
+    if offset != upload.offset:
+        raise UploadConflict(upload.offset)
+    expected = min(upload.chunk_size, upload.file_size - offset)
+    if length != expected:
+        raise UploadError(f'The chunk at offset {offset} must be {expected} bytes')
+
+    number = offset // upload.chunk_size + 1
+    hasher = hashlib.sha256()
+    token, written = storage.write_part(upload.storage_id, number, _read(stream, length, hasher))
+    try:
+        if written != length:
+            raise UploadError(f'Received {written} of {length} bytes')
+        with transaction.atomic():
+            upload = DocumentUpload.objects.select_for_update().get(pk=upload_id)
+            if upload.offset != offset:
+                raise UploadConflict(upload.offset)
+            storage.accept_part(upload.storage_id, number, token)
+            upload.offset += written
+            upload.digests = bytes(upload.digests) + hasher.digest()
+            if upload.offset < upload.file_size:
+                upload.save(update_fields=['offset', 'digests'])
+                return upload
+            return _finish(storage, upload, number)
+    finally:
+        storage.discard_part(upload.storage_id, number, token)
+
+
+def _finish(storage, upload, parts):
+    content_hash = hashlib.sha256(upload.digests).hexdigest()
+    key = storage_key(content_hash)
+    with transaction.atomic():
+        DocumentFile.objects.get_or_create(key=key)
+        DocumentFile.objects.select_for_update().get(key=key)
+        stored = storage.complete(upload.storage_id, key, parts)
+        try:
+            document = GrievanceDocument.objects.create(
+                grievance_id=upload.grievance_id, uploaded_by_id=upload.uploaded_by_id,
+                file_name=upload.file_name, file_path=key, file_size=upload.file_size,
+                content_type=upload.content_type, content_hash=content_hash,
+                description=upload.description, is_public=upload.is_public,
+            )
+            upload.delete()
+            # The parts stay until the document is committed, so a failure
+            # here rolls the offset back to a last chunk that can be resent
+            transaction.on_commit(lambda: storage.abort(upload.storage_id))
+        except Exception:
+            if stored:
+                storage.delete(key)
+            raise
+    return document
+
+
+def abort_upload(upload):
+    get_storage().abort(upload.storage_id)
+    upload.delete()
+
+
+def purge_expired_uploads(now=None):
+    """Abort uploads nobody finished in time; returns how many"""
+    expired = DocumentUpload.objects.filter(expires_at__lte=now or timezone.now())
+    count = 0
+    for upload in expired.iterator():
+        abort_upload(upload)
+        count += 1
+    return count
+
+
+def release_document_file(file_path):
+    """Delete a stored file once no document refers to it"""
+    if not file_path:
+        return
+    with transaction.atomic():
+        DocumentFile.objects.get_or_create(key=file_path)
+        file = DocumentFile.objects.select_for_update().get(key=file_path)
+        if GrievanceDocument.objects.filter(file_path=file_path).exists():
+            return
+        get_storage().delete(file_path)
+        file.delete()
@@ -15,6 +15,15 @@ urlpatterns = [
     path('api/', views.GrievanceListCreateView.as_view(), name='api-list-create'),
     path('api/<int:pk>/', views.GrievanceDetailView.as_view(), name='api-detail'),
     path('api/<int:pk>/messages/', views.GrievanceMessageListCreateView.as_view(), name='api-messages'),
+    path('api/<int:pk>/events/', views.GrievanceEventsView.as_view(), name='api-events'),
+    path('api/<int:pk>/uploads/', views.DocumentUploadStartView.as_view(), name='api-upload-start'),
+    path('api/uploads/<uuid:upload_id>/', views.DocumentUploadView.as_view(), name='api-upload'),
+    path('api/documents/<int:pk>/download/', views.GrievanceDocumentDownloadView.as_view(),
+         name='api-document-download'),
     path('api/track/<str:grievance_id>/', views.GrievanceTrackView.as_view(), name='api-track'),
     path('api/analytics/', views.AnalyticsView.as_view(), name='api-analytics'),
+    path('api/search/', views.GrievanceSearchView.as_view(), name='api-search'),
+    path('api/export/', views.GrievanceExportView.as_view(), name='api-export'),
+    path('api/import/', views.GrievanceImportView.as_view(), name='api-import'),
+    path('sync/', views.GrievanceSyncView.as_view(), name='api-sync'),
 ]
\ No newline at end of file
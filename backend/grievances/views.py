@@ -1,33 +1,204 @@
+import asyncio
+import json
+
 from rest_framework import generics, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.views import APIView
-from django.db.models import Count, Q
-from datetime import datetime, timedelta
-from .models import Grievance, GrievanceMessage
-from .serializers import GrievanceSerializer, GrievanceMessageSerializer
+from django.db.models import Q
+from datetime import date, datetime, timedelta
+from django.http import Http404, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.views import View
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from core.audit import audit
+from core.events import OVERFLOW, subscribe
+from core.cache import aget_or_compute
+from core.query_planner import plan_queryset
+from core.replicas import read_alias, replica_reads
+from core.streaming import is_asgi, streaming_content
+from .conditional import aconditional_response, conditional_response
+from .bulk_import import GrievanceImporter, ImportFormatError, ImportNotAllowed, read_rows
+from .counters import grievance_breakdown
+from .downloads import document_response
+from . import events
+from .export import FORMATS, export_stream
+from .stats import global_stats
+from .models import DocumentUpload, Grievance, GrievanceDocument, GrievanceMessage
+from .pagination import GrievanceCursorPagination, GrievanceMessageCursorPagination
+from .search import search_grievances
+from .serializers import (
+    GrievanceSerializer, GrievanceMessageSerializer, GrievanceSyncSerializer,
+    GrievanceMessageSyncSerializer, GrievanceDocumentSyncSerializer, GrievanceDocumentSerializer,
+    DocumentUploadSerializer,
+)
+from .sync import collect_changes, read_token
+from .tasks import notify_new_message, notify_status_change
+from .uploads import UploadConflict, UploadError, abort_upload, start_upload, write_chunk
+
+def scope_grievances(queryset, user):
+    """Restrict a grievance queryset to what ``user`` may list"""
+    if user.is_authenticated:
+        # Filter based on user role
+        if hasattr(user, 'profile'):
+            if user.profile.role == 'insurance_company':
+                queryset = queryset.filter(insurance_company=user.profile.company_id)
+            elif user.profile.role == 'policyholder':
+                queryset = queryset.filter(submitted_by=user)
+    else:
+        # Anonymous users can only see public grievances
+        queryset = queryset.filter(is_public=True)
+    return queryset
+
+def _local_midnight(day):
+    moment = datetime.combine(day, datetime.min.time())
+    return timezone.make_aware(moment) if settings.USE_TZ else moment
+
+def filter_grievances(queryset, params):
+    """
+    Apply the list/export query parameters (status, category, priority, company, dates).
+
+    Raises ``ValidationError`` for a company that is not an id or a date
+    that is not YYYY-MM-DD. Dates are days in the current time zone.
+    """
+    errors = {}
+    for param, lookup in (('status', 'status'), ('category', 'category'), ('priority', 'priority'),
+                          ('company', 'insurance_company_id')):
+        values = [value for value in params.getlist(param) if value]
+        if param == 'company' and not all(value.isdigit() for value in values):
+            errors[param] = ['Give insurance company ids.']
+        elif values:
+            queryset = queryset.filter(**{f'{lookup}__in': values})
+    for param, lookup, days in (('submitted_after', 'submitted_at__gte', 0),
+                                ('submitted_before', 'submitted_at__lt', 1)):
+        value = params.get(param)
+        if not value:
+            continue
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            errors[param] = ['Give a date as YYYY-MM-DD.']
+        else:
+            queryset = queryset.filter(**{lookup: _local_midnight(day + timedelta(days=days))})
+    if errors:
+        raise ValidationError(errors)
+    return queryset
 
 class GrievanceListCreateView(generics.ListCreateAPIView):
     """List and create grievances"""
     serializer_class = GrievanceSerializer
     permission_classes = [AllowAny]  # Allow anonymous grievance submission
+    pagination_class = GrievanceCursorPagination
     
     def get_queryset(self):
-        queryset = Grievance.objects.all()
-        user = self.request.user
+        queryset = scope_grievances(Grievance.objects.all(), self.request.user)
+        queryset = filter_grievances(queryset, self.request.query_params)
+        return plan_queryset(queryset.order_by('-submitted_at'), self.get_serializer_class())
+    
+    def perform_create(self, serializer):
+        grievance = serializer.save()
+        audit(self.request, 'create', grievance, grievance_id=grievance.grievance_id)
+
+class GrievanceSearchView(generics.ListAPIView):
+    """Ranked full-text and fuzzy identifier search over grievances"""
+    serializer_class = GrievanceSerializer
+    permission_classes = [AllowAny]
+    
+    def get_queryset(self):
+        text = self.request.query_params.get('q', '').strip()
+        if not text:
+            return Grievance.objects.none()
+        queryset = scope_grievances(Grievance.objects.all(), self.request.user)
+        return plan_queryset(search_grievances(queryset, text), self.get_serializer_class())
+
+class GrievanceSyncView(APIView):
+    """Grievances, messages and documents changed since the client's last sync"""
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        positions = read_token(request.query_params.get('since'))
+        grievances = scope_grievances(Grievance.objects.all(), request.user)
+        changes = collect_changes(request.user, grievances, positions)
+        return Response({
+            'token': changes['token'],
+            'has_more': changes['has_more'],
+            'reset': changes['reset'],
+            'grievances': GrievanceSyncSerializer(changes['grievances'], many=True).data,
+            'messages': GrievanceMessageSyncSerializer(changes['messages'], many=True).data,
+            'documents': GrievanceDocumentSyncSerializer(changes['documents'], many=True).data,
+            'deleted': [
+                {'type': tombstone.model_name, 'id': tombstone.object_id,
+                 'grievance': tombstone.grievance_ref}
+                for tombstone in changes['deleted']
+            ],
+        })
+
+class GrievanceExportView(APIView):
+    """Stream every grievance the user may see as CSV, JSONL or XLSX"""
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        export_format = request.query_params.get('export_format', 'csv')
+        if export_format not in FORMATS:
+            return Response(
+                {'error': f"export_format must be one of {', '.join(FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        # Bound now, since rows are read after the view returns
+        queryset = scope_grievances(Grievance.objects.using(read_alias()), request.user)
+        queryset = filter_grievances(queryset, request.query_params)
+        chunks, content_type, extension = export_stream(
+            queryset, export_format, compress=request.query_params.get('gzip') in ('1', 'true')
+        )
+        response = StreamingHttpResponse(streaming_content(request, chunks), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="grievances-{date.today():%Y%m%d}.{extension}"'
+        audit(request, 'view', model_name='Grievance', object_id=0, export=export_format,
+              filters={key: request.query_params.getlist(key) for key in request.query_params})
+        return response
+
+class GrievanceImportView(APIView):
+    """Bulk-import a CSV or JSONL file of grievances (insurers and administrators)"""
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        profile = getattr(request.user, 'profile', None)
+        if profile is None or profile.role == 'policyholder':
+            return Response(
+                {'error': 'Only insurance companies and administrators can import grievances'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'Upload a file in the "file" field'}, status=status.HTTP_400_BAD_REQUEST)
+        import_format = request.data.get('import_format') or upload.name.rsplit('.', 1)[-1].lower()
         
-        if user.is_authenticated:
-            # Filter based on user role
-            if hasattr(user, 'profile'):
-                if user.profile.role == 'insurance_company':
-                    queryset = queryset.filter(insurance_company=user.profile.company)
-                elif user.profile.role == 'policyholder':
-                    queryset = queryset.filter(submitted_by=user)
-        else:
-            # Anonymous users can only see public grievances
-            queryset = queryset.filter(is_public=True)
-            
-        return queryset.order_by('-submitted_at')
+        try:
+            importer = GrievanceImporter(request.user)
+        except ImportNotAllowed as error:
+            return Response({'error': str(error)}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            report = importer.run(read_rows(upload, import_format))
+        except ImportFormatError as error:
+            # Chunks before the unreadable part are already committed
+            body = {'error': str(error)}
+            if error.report is not None:
+                body.update(error.report.as_dict())
+                audit(request, 'create', model_name='Grievance', object_id=0, imported=error.report.created,
+                      failed=error.report.failed, file_name=upload.name)
+            return Response(body, status=status.HTTP_400_BAD_REQUEST)
+        audit(request, 'create', model_name='Grievance', object_id=0, imported=report.created,
+              failed=report.failed, file_name=upload.name)
+        return Response(
+            report.as_dict(),
+            status=status.HTTP_201_CREATED if report.created else status.HTTP_400_BAD_REQUEST
+        )
 
 class GrievanceDetailView(generics.RetrieveUpdateAPIView):
     """Get and update grievance details"""
@@ -44,40 +215,271 @@ class GrievanceDetailView(generics.RetrieveUpdateAPIView):
             elif user.profile.role == 'policyholder':
                 queryset = queryset.filter(submitted_by=user)
                 
-        return queryset
+        return plan_queryset(queryset, self.get_serializer_class())
+    
+    def retrieve(self, request, *args, **kwargs):
+        visible = scope_grievances(Grievance.objects.filter(pk=kwargs['pk']), request.user)
+        
+        def viewed():
+            audit(request, 'view', model_name='Grievance', object_id=kwargs['pk'])
+        
+        def respond():
+            response = super(GrievanceDetailView, self).retrieve(request, *args, **kwargs)
+            viewed()
+            return response
+        
+        return conditional_response(request, visible, respond, viewed=viewed)
+    
+    def perform_update(self, serializer):
+        old_status = serializer.instance.status
+        grievance = serializer.save()
+        audit(self.request, 'update', grievance, fields=sorted(serializer.validated_data))
+        if grievance.status != old_status:
+            notify_status_change.enqueue(grievance.pk, old_status, grievance.status,
+                                         key=f'status-change:{grievance.pk}:{grievance.updated_at.isoformat()}')
 
 class GrievanceMessageListCreateView(generics.ListCreateAPIView):
     """List and create messages for a grievance"""
     serializer_class = GrievanceMessageSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = GrievanceMessageCursorPagination
     
     def get_queryset(self):
         grievance_id = self.kwargs['pk']
-        return GrievanceMessage.objects.filter(grievance_id=grievance_id)
+        queryset = GrievanceMessage.objects.filter(grievance_id=grievance_id)
+        return plan_queryset(queryset, self.get_serializer_class())
+    
+    def list(self, request, *args, **kwargs):
+        grievance = Grievance.objects.filter(pk=self.kwargs['pk'])
+        return conditional_response(
+            request, grievance, lambda: super(GrievanceMessageListCreateView, self).list(request, *args, **kwargs)
+        )
     
     def perform_create(self, serializer):
         grievance_id = self.kwargs['pk']
-        serializer.save(sender=self.request.user, grievance_id=grievance_id)
+        message = serializer.save(sender=self.request.user, grievance_id=grievance_id)
+        audit(self.request, 'message_sent', message, grievance=grievance_id)
+        notify_new_message.enqueue(message.pk, key=f'message:{message.pk}')
 
-class GrievanceTrackView(APIView):
-    """Track grievance by ID (public endpoint)"""
-    permission_classes = [AllowAny]
+class DocumentUploadStartView(APIView):
+    """Start a resumable upload of a document for a grievance (see grievances.uploads)"""
+    permission_classes = [IsAuthenticated]
     
-    def get(self, request, grievance_id):
+    def post(self, request, pk):
+        grievance = scope_grievances(Grievance.objects.filter(pk=pk), request.user).first()
+        if grievance is None:
+            return Response({'error': 'Grievance not found'}, status=status.HTTP_404_NOT_FOUND)
+        serializer = DocumentUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
         try:
-            grievance = Grievance.objects.get(grievance_id=grievance_id)
-            serializer = GrievanceSerializer(grievance)
-            return Response(serializer.data)
-        except Grievance.DoesNotExist:
-            return Response(
-                {'error': 'Grievance not found'}, 
-                status=status.HTTP_404_NOT_FOUND
-            )
+            upload = start_upload(grievance, request.user, **serializer.validated_data)
+        except UploadError as error:
+            return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(DocumentUploadSerializer(upload).data, status=status.HTTP_201_CREATED,
+                        headers={'Upload-Offset': '0'})
+
+class DocumentUploadView(APIView):
+    """
+    One resumable upload: GET its offset, PUT the next chunk, DELETE to abandon it.
+
+    A chunk is the raw request body, with its position in the file in the
+    Upload-Offset header. The response to the last chunk is the new document.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get_upload(self, request, upload_id):
+        return DocumentUpload.objects.filter(pk=upload_id, uploaded_by=request.user).first()
+    
+    def get(self, request, upload_id):
+        upload = self.get_upload(request, upload_id)
+        if upload is None:
+            return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(DocumentUploadSerializer(upload).data, headers={'Upload-Offset': str(upload.offset)})
+    
+    def put(self, request, upload_id):
+        upload = self.get_upload(request, upload_id)
+        if upload is None:
+            return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+        offset = request.headers.get('Upload-Offset', '')
+        length = request.META.get('CONTENT_LENGTH', '')
+        if not offset.isdigit() or not length.isdigit():
+            return Response({'error': 'Send the chunk with Upload-Offset and Content-Length headers'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            # Read the body as a stream, never as request.data
+            result = write_chunk(upload.pk, int(offset), request.stream, int(length))
+        except UploadConflict as error:
+            return Response({'error': str(error), 'offset': error.offset}, status=status.HTTP_409_CONFLICT,
+                            headers={'Upload-Offset': str(error.offset)})
+        except UploadError as error:
+            return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        except DocumentUpload.DoesNotExist:
+            return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        if isinstance(result, GrievanceDocument):
+            audit(request, 'file_upload', result, grievance=result.grievance_id, file_size=result.file_size)
+            return Response(GrievanceDocumentSerializer(result).data, status=status.HTTP_201_CREATED)
+        return Response(DocumentUploadSerializer(result).data, headers={'Upload-Offset': str(result.offset)})
+    
+    def delete(self, request, upload_id):
+        upload = self.get_upload(request, upload_id)
+        if upload is None:
+            return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+        abort_upload(upload)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class GrievanceDocumentDownloadView(View):
+    """
+    Download a grievance document (see grievances.downloads).
+
+    Public documents are open to everyone, others to the users who may see
+    their grievance.
+    """
+    
+    def get(self, request, pk):
+        document = GrievanceDocument.objects.filter(pk=pk).first()
+        if document is None or not self.can_download(request.user, document):
+            raise Http404('Document not found')
+        try:
+            response = document_response(request, document)
+        except FileNotFoundError:
+            raise Http404('Document not found')
+        if response.status_code in (200, 206):
+            audit(request, 'view', document, grievance=document.grievance_id, download=True)
+        return response
+    
+    def can_download(self, user, document):
+        if document.is_public:
+            return True
+        # The same role rules as grievance_detail
+        return user.is_authenticated and scope_grievances(
+            Grievance.objects.filter(pk=document.grievance_id), user).exists()
+
+class GrievanceTrackView(View):
+    """
+    Track grievance by ID (public endpoint).
+
+    Async, so slow mobile clients polling this under ASGI wait on the event
+    loop instead of holding a worker thread; the response matches the DRF
+    serializer output and shares its cache entries and validators.
+    """
+
+    async def get(self, request, grievance_id):
+        grievance = Grievance.objects.filter(grievance_id=grievance_id)
+        return await aconditional_response(request, grievance, lambda: self.track(request, grievance_id))
+
+    async def track(self, request, grievance_id):
+        async def render():
+            queryset = plan_queryset(Grievance.objects.all(), GrievanceSerializer)
+            grievance = await queryset.filter(grievance_id=grievance_id).afirst()
+            if grievance is None:
+                return status.HTTP_404_NOT_FOUND, {'error': 'Grievance not found'}
+            # Plain JSON types, like cached_response stores
+            return status.HTTP_200_OK, json.loads(json.dumps(GrievanceSerializer(grievance).data, cls=JSONEncoder))
+
+        status_code, data = await aget_or_compute(
+            'grievance_track', render, suffix=request.get_full_path(), depends_on=('grievances', 'companies')
+        )
+        return JsonResponse(data, status=status_code, json_dumps_params={'ensure_ascii': False})
+
+def release_connections():
+    """
+    Close this thread's database connections.
+
+    Under ASGI the thread serving a request keeps its connections until the
+    response ends, which for an event stream is minutes of idling.
+    """
+    for conn in connections.all(initialized_only=True):
+        if not conn.in_atomic_block:
+            conn.close()
+
+class GrievanceEventsView(View):
+    """
+    Live messages and status changes of one grievance as Server-Sent Events.
+
+    Replaces polling the message list: clients keep one connection open and
+    the server pushes each new message (internal notes only to staff) and
+    status change. A client that reconnects with Last-Event-ID (or
+    ``?last_event_id=``) first gets the messages it missed. Streams end after
+    ``EVENTS_MAX_STREAM_SECONDS`` and clients reconnect, so a connection
+    whose client vanished unnoticed is not held for ever.
+
+    Streams need the ASGI server (``SERVER_MODE=asgi``). Under WSGI the
+    response would be collected whole, on a worker thread, before anything
+    reached the client, so the view answers 501 and clients poll the
+    message list instead.
+    """
+
+    async def get(self, request, pk):
+        if not is_asgi(request):
+            return JsonResponse({
+                'error': 'Live events need the ASGI server (SERVER_MODE=asgi).',
+                'fallback': request.build_absolute_uri('../messages/'),
+            }, status=501)
+        internal = await sync_to_async(self.subscriber)(request, pk)
+        if internal is None:
+            return HttpResponseForbidden('You cannot follow this grievance.')
+        last_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+        last_id = int(last_id) if last_id and last_id.isdigit() else None
+
+        response = StreamingHttpResponse(self.stream(pk, internal, last_id), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Tell nginx not to buffer the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def subscriber(self, request, pk):
+        """Whether the user sees internal notes, or None if they may not follow grievance ``pk``"""
+        try:
+            user = request.user
+            if not user.is_authenticated or not scope_grievances(Grievance.objects.filter(pk=pk), user).exists():
+                return None
+            profile = getattr(user, 'profile', None)
+            return profile is None or profile.role != 'policyholder'
+        finally:
+            release_connections()
+
+    def replay(self, pk, last_id, internal):
+        try:
+            return events.replay(pk, last_id, internal)
+        finally:
+            release_connections()
+
+    async def stream(self, pk, internal, last_id):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + getattr(settings, 'EVENTS_MAX_STREAM_SECONDS', 300)
+        heartbeat = getattr(settings, 'EVENTS_HEARTBEAT_SECONDS', 15)
+        async with subscribe(events.topic(pk)) as subscription:
+            yield 'retry: 3000\n\n'
+            if last_id is not None:
+                for event in await sync_to_async(self.replay)(pk, last_id, internal):
+                    last_id = event.get('id', last_id)
+                    yield self.format(event)
+            while (remaining := deadline - loop.time()) > 0:
+                event = await subscription.get(timeout=min(heartbeat, remaining))
+                if event is OVERFLOW:
+                    return
+                if event is None:
+                    yield ': keep-alive\n\n'
+                    continue
+                if event['internal'] and not internal:
+                    continue
+                if 'id' in event and last_id is not None and event['id'] <= last_id:
+                    continue  # already replayed
+                yield self.format(event)
+
+    def format(self, event):
+        lines = [f"event: {event['type']}"]
+        if 'id' in event:
+            lines.append(f"id: {event['id']}")
+        lines.append(f"data: {json.dumps(event['data'], cls=JSONEncoder, ensure_ascii=False)}")
+        return '\n'.join(lines) + '\n\n'
 
 class AnalyticsView(APIView):
     """Analytics data for IDRA administrators"""
     permission_classes = [IsAuthenticated]
     
+    @replica_reads
     def get(self, request):
         user = request.user
         
@@ -88,28 +490,23 @@ class AnalyticsView(APIView):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # Calculate analytics
-        total_grievances = Grievance.objects.count()
-        pending_grievances = Grievance.objects.filter(status='open').count()
-        resolved_grievances = Grievance.objects.filter(status='resolved').count()
+        # Calculate analytics from the materialized counters
+        stats = global_stats()
+        total_grievances = stats.total
+        pending_grievances = stats.count('open')
+        resolved_grievances = stats.count('resolved')
         
         # Monthly statistics
-        current_month = datetime.now().replace(day=1)
-        monthly_grievances = Grievance.objects.filter(
-            submitted_at__gte=current_month
-        ).count()
+        monthly_grievances = stats.this_month
         
         # By category
-        category_stats = Grievance.objects.values('category').annotate(
-            count=Count('id')
-        ).order_by('-count')
+        category_stats = grievance_breakdown('category')
         
         # By company
-        company_stats = Grievance.objects.values(
-            'insurance_company__name'
-        ).annotate(
-            count=Count('id')
-        ).order_by('-count')[:10]
+        company_stats = [
+            {'insurance_company__name': row['company__name'], 'count': row['count']}
+            for row in grievance_breakdown('company__name')[:10]
+        ]
         
         return Response({
             'total_grievances': total_grievances,
@@ -2,8 +2,14 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.paginator import Paginator
-from django.http import HttpResponseForbidden
+from django.http import HttpResponseBadRequest, HttpResponseForbidden
+from rest_framework.exceptions import ValidationError
+from core.audit import audit
+from .conditional import conditional_response
 from .models import Grievance, GrievanceMessage
+from .pagination import EstimatedCountPaginator, keyset_page
+from .tasks import notify_new_message, notify_status_change
+from .views import filter_grievances
 
 
 @login_required
@@ -21,18 +27,34 @@ def grievance_list(request):
         # Admin sees all grievances
         grievances = Grievance.objects.all()
     
-    grievances = grievances.order_by('-created_at')
-    
-    # Pagination
-    paginator = Paginator(grievances, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
+    try:
+        grievances = filter_grievances(grievances, request.GET)
+    except ValidationError as error:
+        return HttpResponseBadRequest(' '.join(
+            f'{param}: {problem}' for param, problems in error.detail.items() for problem in problems
+        ))
+    grievances = grievances.select_related('insurance_company').order_by('-submitted_at', '-id')
+    
+    # Filters (and ?count=) carried over to the pagination links
+    query = request.GET.copy()
+    for param in ('page', 'mode', 'cursor'):
+        query.pop(param, None)
     context = {
-        'grievances': page_obj,
         'user_role': user_profile.role,
+        'query': query.urlencode(),
     }
     
+    if request.GET.get('mode') == 'more':
+        # "Load more" mode: seek past the cursor instead of OFFSET + COUNT
+        rows, next_cursor = keyset_page(grievances, request.GET.get('cursor'), 10)
+        context.update({'grievances': rows, 'next_cursor': next_cursor})
+    else:
+        # Pagination; ?count=estimate reads planner statistics instead of COUNT(*)
+        paginator_class = EstimatedCountPaginator if request.GET.get('count') == 'estimate' else Paginator
+        paginator = paginator_class(grievances, 10)
+        page_number = request.GET.get('page')
+        context['grievances'] = paginator.get_page(page_number)
+    
     return render(request, 'grievances/list.html', context)
 
 
@@ -55,25 +77,37 @@ def grievance_detail(request, pk):
         message_content = request.POST.get('message_content')
         if message_content.strip():
             # Create a new message
-            GrievanceMessage.objects.create(
+            message = GrievanceMessage.objects.create(
                 grievance=grievance,
                 sender=request.user,
-                sender_role=user_profile.role,
                 content=message_content.strip()
             )
+            audit(request, 'message_sent', message, grievance=grievance.pk)
+            notify_new_message.enqueue(message.pk, key=f'message:{message.pk}')
             messages.success(request, 'Your message has been added.')
             return redirect('grievances:detail', pk=pk)
     
-    # Get all messages for this grievance
-    grievance_messages = grievance.messages.all().order_by('created_at')
-    
-    context = {
-        'grievance': grievance,
-        'messages': grievance_messages,
-        'user_role': user_profile.role,
-    }
-    
-    return render(request, 'grievances/detail.html', context)
+    def render_detail():
+        audit(request, 'view', grievance)
+        
+        # Get all messages for this grievance
+        grievance_messages = grievance.messages.select_related('sender__profile').order_by('created_at')
+        
+        context = {
+            'grievance': grievance,
+            'messages': grievance_messages,
+            'user_role': user_profile.role,
+        }
+        
+        return render(request, 'grievances/detail.html', context)
+    
+    # Pending flash messages must be rendered, so never answer 304 over them
+    if request.method == 'GET' and not len(messages.get_messages(request)):
+        # The page differs by viewer (staff get the status form), not just by grievance
+        return conditional_response(request, Grievance.objects.filter(pk=pk), render_detail,
+                                    viewed=lambda: audit(request, 'view', grievance),
+                                    vary=(request.user.pk, user_profile.role))
+    return render_detail()
 
 
 @login_required
@@ -96,12 +130,8 @@ def grievance_create(request):
             messages.error(request, 'Please fill in all required fields.')
             return render(request, 'grievances/create.html')
         
-        # Create grievance with auto-generated ID
-        import uuid
-        grievance_id = f"GRV-{uuid.uuid4().hex[:8].upper()}"
-        
+        # Grievance ID is allocated by Grievance.save()
         grievance = Grievance.objects.create(
-            grievance_id=grievance_id,
             title=title,
             description=description,
             category=category,
@@ -113,7 +143,8 @@ def grievance_create(request):
             # Will need to assign insurance_company based on policy or manual assignment
         )
         
-        messages.success(request, f'Grievance {grievance_id} has been submitted successfully.')
+        audit(request, 'create', grievance, grievance_id=grievance.grievance_id)
+        messages.success(request, f'Grievance {grievance.grievance_id} has been submitted successfully.')
         return redirect('grievances:detail', pk=grievance.pk)
     
     return render(request, 'grievances/create.html')
@@ -156,13 +187,17 @@ def grievance_update_status(request, pk):
             if new_priority in valid_priorities and old_priority != new_priority:
                 status_message += f" and priority changed from '{old_priority}' to '{new_priority}'"
             
-            GrievanceMessage.objects.create(
+            message = GrievanceMessage.objects.create(
                 grievance=grievance,
                 sender=request.user,
-                sender_role=user_profile.role,
                 content=status_message
             )
             
+            audit(request, 'status_change', grievance, old_status=old_status, new_status=new_status,
+                  old_priority=old_priority, new_priority=grievance.priority)
+            if new_status != old_status:
+                notify_status_change.enqueue(grievance.pk, old_status, new_status,
+                                             key=f'status-change:{message.pk}')
             messages.success(request, 'Grievance status updated successfully.')
         else:
             messages.error(request, 'Invalid status provided.')
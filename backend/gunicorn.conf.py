@@ -0,0 +1,41 @@
+"""
+Gunicorn configuration for production serving (``python run.py serve``).
+
+``SERVER_MODE=asgi`` (the default) runs uvicorn workers on the ASGI
+application: each worker multiplexes many slow client connections on an
+event loop, and the async views (grievance tracking, landing page, company
+list) never tie up a thread while a client trickles its request or reads its
+response. ``SERVER_MODE=wsgi`` runs threaded sync workers on the WSGI
+application for comparison or as a fallback. Live grievance events
+(``GrievanceEventsView``) are only served under ASGI; under WSGI they
+answer 501 and clients fall back to polling the message list.
+"""
+import multiprocessing
+import os
+
+mode = os.getenv('SERVER_MODE', 'asgi')
+if mode not in ('asgi', 'wsgi'):
+    raise ValueError(f'SERVER_MODE must be "asgi" or "wsgi", not {mode!r}')
+
+bind = f"0.0.0.0:{os.getenv('PORT', '6789')}"
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+
+if mode == 'asgi':
+    wsgi_app = 'idra_gms.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'idra_gms.wsgi:application'
+    worker_class = 'gthread'
+    threads = int(os.getenv('GUNICORN_THREADS', '8'))
+
+# Idle keep-alive connections cost almost nothing on an event loop
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '75' if mode == 'asgi' else '5'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = 30
+# Recycle workers to bound slow memory growth
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '5000'))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+errorlog = '-'
+forwarded_allow_ips = os.getenv('FORWARDED_ALLOW_IPS', '127.0.0.1')
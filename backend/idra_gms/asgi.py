@@ -7,10 +7,72 @@ For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
 
+import asyncio
 import os
+import re
 
-from django.core.asgi import get_asgi_application
+import django
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'idra_gms.settings')
 
-application = get_asgi_application()
+# Grievance event streams (GrievanceEventsView), as routed by nginx
+EVENT_STREAM_PATH = re.compile(r'^/(api/)?grievances/api/\d+/events/$')
+
+
+class IdraASGIHandler(ASGIHandler):
+    """
+    Django's handler, with two changes for long-lived event streams.
+
+    Django runs each request's sync code (middleware, ORM queries) on a thread
+    of its own, kept until the response ends. An event stream stays open for
+    minutes, so every idle subscriber would hold a thread. Streams only do a
+    few quick queries when they open, which run on asgiref's shared thread
+    instead.
+
+    Django 4.2 also keeps streaming to a client that has gone away. Streams
+    are cancelled when the server reports the disconnect, as Django 5 does
+    for every response.
+    """
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and EVENT_STREAM_PATH.match(scope['path']):
+            await self.handle_stream(scope, receive, send)
+        else:
+            await super().__call__(scope, receive, send)
+
+    async def handle_stream(self, scope, receive, send):
+        body = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body.append(message)
+            if not message.get('more_body'):
+                break
+
+        async def receive_body():
+            return body.pop(0)
+
+        # Anything the server sends after the body can only be the disconnect
+        response = asyncio.create_task(self.handle(scope, receive_body, send))
+        disconnect = asyncio.create_task(receive())
+        try:
+            await asyncio.wait((response, disconnect), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            response.cancel()
+            disconnect.cancel()
+            await asyncio.gather(response, disconnect, return_exceptions=True)
+        if not response.cancelled():
+            response.result()
+
+
+django.setup(set_prefix=False)
+application = IdraASGIHandler()
+
+from django.conf import settings  # noqa: E402  (needs the settings module set above)
+
+if settings.DEBUG:
+    # Serve static files like runserver does when no nginx is in front
+    from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
+    application = ASGIStaticFilesHandler(application)
@@ -0,0 +1,84 @@
+"""
+Database connection handling, chosen with ``DB_POOL_MODE``.
+
+``persistent``
+    Each worker thread keeps its connection for ``DB_CONN_MAX_AGE`` seconds
+    and checks it is still alive before reusing it (``CONN_HEALTH_CHECKS``).
+    The default under WSGI and ``runserver``.
+``pool``
+    psycopg 3's connection pool (``OPTIONS['pool']``), sized by
+    ``DB_POOL_MIN_SIZE``/``DB_POOL_MAX_SIZE``. Needs Django 5.1+ and psycopg 3.
+``pgbouncer``
+    Connect through pgbouncer in transaction pooling mode. Server-side
+    cursors are disabled because a cursor cannot outlive the transaction
+    that pgbouncer lent the server connection for, and server-side
+    parameter binding and prepared statements stay off because statements
+    prepared on one server connection are missing on the next.
+``none``
+    A new connection per request. The default under ASGI.
+
+Under ASGI every request runs its ORM calls in a thread of its own, so
+per-thread persistent connections would accumulate instead of being reused;
+use ``pgbouncer`` or ``pool`` there.
+"""
+import importlib.util
+import os
+
+import django
+from django.core.exceptions import ImproperlyConfigured
+
+MODES = ('persistent', 'pool', 'pgbouncer', 'none')
+
+
+def _int(name, default):
+    return int(os.getenv(name, default))
+
+
+def configure_database(database, mode=None, server_mode=None):
+    """``database`` (one ``DATABASES`` entry) set up for ``mode``"""
+    server_mode = server_mode or os.getenv('SERVER_MODE', 'dev')
+    mode = mode or os.getenv('DB_POOL_MODE') or ('none' if server_mode == 'asgi' else 'persistent')
+    if mode not in MODES:
+        raise ImproperlyConfigured(f'DB_POOL_MODE must be one of {", ".join(MODES)}, not {mode!r}')
+
+    database = {**database, 'OPTIONS': dict(database.get('OPTIONS') or {})}
+    postgresql = 'postgresql' in database.get('ENGINE', '')
+    psycopg3 = importlib.util.find_spec('psycopg') is not None
+    if postgresql:
+        database['OPTIONS'].setdefault('connect_timeout', 10)
+
+    if mode == 'persistent':
+        if server_mode == 'asgi':
+            raise ImproperlyConfigured(
+                'DB_POOL_MODE=persistent leaks connections under ASGI; use pgbouncer, pool or none.'
+            )
+        database['CONN_MAX_AGE'] = _int('DB_CONN_MAX_AGE', '60')
+        database['CONN_HEALTH_CHECKS'] = True
+
+    elif mode == 'pool':
+        if not (postgresql and psycopg3 and django.VERSION >= (5, 1)):
+            raise ImproperlyConfigured('DB_POOL_MODE=pool needs PostgreSQL, psycopg 3 and Django 5.1+.')
+        database['CONN_MAX_AGE'] = 0
+        database['OPTIONS']['pool'] = {
+            'min_size': _int('DB_POOL_MIN_SIZE', '2'),
+            'max_size': _int('DB_POOL_MAX_SIZE', '10'),
+            'timeout': _int('DB_POOL_TIMEOUT', '10'),
+        }
+
+    elif mode == 'pgbouncer':
+        if not postgresql:
+            raise ImproperlyConfigured('DB_POOL_MODE=pgbouncer needs the PostgreSQL backend.')
+        # Connections to pgbouncer are cheap; under WSGI keep them anyway
+        if server_mode == 'asgi':
+            database['CONN_MAX_AGE'] = 0
+        else:
+            database['CONN_MAX_AGE'] = _int('DB_CONN_MAX_AGE', '60')
+            database['CONN_HEALTH_CHECKS'] = True
+        database['DISABLE_SERVER_SIDE_CURSORS'] = True
+        database['OPTIONS']['server_side_binding'] = False
+        if psycopg3:
+            database['OPTIONS']['prepare_threshold'] = None
+
+    else:
+        database['CONN_MAX_AGE'] = 0
+    return database
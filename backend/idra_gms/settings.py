@@ -2,9 +2,12 @@
 Django settings for IDRA Grievance Management System project.
 """
 import os
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 
+from idra_gms.database import configure_database
+
 load_dotenv()
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -35,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     # Third party apps
     'rest_framework',
@@ -47,6 +51,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.instrumentation.RequestMetricsMiddleware',
+    'core.replicas.ReplicaStickinessMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -103,6 +110,55 @@ except ImportError:
         }
     }
 
+# Persistent connections, psycopg pool or pgbouncer (see idra_gms.database)
+DATABASES['default'] = configure_database(DATABASES['default'])
+
+# Read replicas for designated heavy reads (see core.replicas), as host[:port] pairs
+DATABASE_REPLICAS = []
+REPLICA_CONNECT_TIMEOUT = int(os.getenv('REPLICA_CONNECT_TIMEOUT', '2'))
+for number, replica in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), 1):
+    host, _, port = replica.strip().partition(':')
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'], 'HOST': host, 'PORT': port or DATABASES['default'].get('PORT', ''),
+        'OPTIONS': {**DATABASES['default']['OPTIONS'], 'connect_timeout': REPLICA_CONNECT_TIMEOUT},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+if sys.argv[1:2] == ['test']:
+    # Routing tests point DATABASE_REPLICAS at this mirror of the test database
+    DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', '5'))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('REPLICA_LAG_CHECK_INTERVAL', '5'))
+# Check replica health from a background thread instead of during requests
+REPLICA_MONITOR = os.getenv('REPLICA_MONITOR', 'true').lower() == 'true' and sys.argv[1:2] != ['test']
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '10'))
+
+# Cache: Redis when REDIS_URL is set, otherwise per-process local memory
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Per-endpoint cache TTLs in seconds (see core.cache)
+CACHE_TTLS = {
+    'landing': int(os.getenv('CACHE_TTL_LANDING', '60')),
+    'company_list': int(os.getenv('CACHE_TTL_COMPANY_LIST', '300')),
+    'company_detail': int(os.getenv('CACHE_TTL_COMPANY_DETAIL', '120')),
+    'company_api': int(os.getenv('CACHE_TTL_COMPANY_API', '120')),
+    'grievance_track': int(os.getenv('CACHE_TTL_GRIEVANCE_TRACK', '30')),
+    'grievance_metrics': int(os.getenv('CACHE_TTL_GRIEVANCE_METRICS', '15')),
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -161,4 +217,79 @@ SESSION_COOKIE_SECURE = not DEBUG
 SESSION_COOKIE_SAMESITE = 'Lax'
 
 # Custom user model
-AUTH_USER_MODEL = 'accounts.User'
\ No newline at end of file
+AUTH_USER_MODEL = 'accounts.User'
+
+# Grievance ID allocation (see grievances.id_allocator)
+GRIEVANCE_ID_ALLOCATOR = os.getenv('GRIEVANCE_ID_ALLOCATOR', 'grievances.id_allocator.BlockIdAllocator')
+GRIEVANCE_ID_BLOCK_SIZE = int(os.getenv('GRIEVANCE_ID_BLOCK_SIZE', '20'))
+# Mobile delta sync (see grievances.sync)
+SYNC_PAGE_SIZE = int(os.getenv('SYNC_PAGE_SIZE', '500'))
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.getenv('SYNC_TOMBSTONE_RETENTION_DAYS', '30'))
+
+# SLA deadlines and the escalation sweep (see grievances.sla); extra holidays as ISO dates
+SLA_EXTRA_HOLIDAYS = [day.strip() for day in os.getenv('SLA_EXTRA_HOLIDAYS', '').split(',') if day.strip()]
+SLA_WARNING_HOURS = float(os.getenv('SLA_WARNING_HOURS', '24'))
+SLA_SWEEP_INTERVAL = float(os.getenv('SLA_SWEEP_INTERVAL', '60'))
+SLA_SWEEP_BATCH_SIZE = int(os.getenv('SLA_SWEEP_BATCH_SIZE', '500'))
+
+# Background jobs (see core.tasks); TASK_QUEUES is "queue:threads,..." per worker
+TASK_BACKEND = 'database' if sys.argv[1:2] == ['test'] else os.getenv('TASK_BACKEND', 'redis' if REDIS_URL else 'database')
+TASK_QUEUES = {}
+for entry in os.getenv('TASK_QUEUES', 'notifications:4,default:2').split(','):
+    name, _, threads = entry.strip().partition(':')
+    if name:
+        TASK_QUEUES[name] = int(threads or 1)
+TASK_LEASE_SECONDS = int(os.getenv('TASK_LEASE_SECONDS', '300'))
+TASK_BACKOFF_SECONDS = float(os.getenv('TASK_BACKOFF_SECONDS', '5'))
+TASK_MAX_BACKOFF_SECONDS = float(os.getenv('TASK_MAX_BACKOFF_SECONDS', '3600'))
+TASK_POLL_INTERVAL = float(os.getenv('TASK_POLL_INTERVAL', '1.0'))
+TASK_RETENTION_HOURS = float(os.getenv('TASK_RETENTION_HOURS', '72'))
+
+# Live grievance events over Server-Sent Events (see core.events)
+EVENTS_BACKEND = 'local' if sys.argv[1:2] == ['test'] else os.getenv('EVENTS_BACKEND', 'redis' if REDIS_URL else 'local')
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv('EVENTS_HEARTBEAT_SECONDS', '15'))
+EVENTS_MAX_STREAM_SECONDS = float(os.getenv('EVENTS_MAX_STREAM_SECONDS', '300'))
+EVENTS_QUEUE_SIZE = int(os.getenv('EVENTS_QUEUE_SIZE', '100'))
+
+# Grievance documents, uploaded in resumable chunks (see grievances.uploads)
+DOCUMENT_STORAGE = os.getenv('DOCUMENT_STORAGE', 'core.storage.LocalStorage')
+DOCUMENT_ROOT = os.getenv('DOCUMENT_ROOT', os.path.join(BASE_DIR, 'var', 'documents'))
+# Must fit in nginx's client_max_body_size
+DOCUMENT_CHUNK_SIZE = int(os.getenv('DOCUMENT_CHUNK_SIZE', str(4 * 1024 * 1024)))
+DOCUMENT_MAX_SIZE = int(os.getenv('DOCUMENT_MAX_SIZE', str(100 * 1024 * 1024)))
+DOCUMENT_UPLOAD_EXPIRY_HOURS = float(os.getenv('DOCUMENT_UPLOAD_EXPIRY_HOURS', '24'))
+# nginx internal location serving DOCUMENT_ROOT/objects, set where nginx is in
+# front (see docker-compose.yml); empty to send files from Django
+DOCUMENT_ACCEL_REDIRECT = os.getenv('DOCUMENT_ACCEL_REDIRECT', '')
+
+# Outgoing email, sent from background jobs
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', '25'))
+EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'false').lower() == 'true'
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'no-reply@idra.org.bd')
+
+# Audit logging (see core.audit); the background writer is off under `manage.py test`
+AUDIT_BACKGROUND = os.getenv('AUDIT_BACKGROUND', 'true').lower() == 'true' and sys.argv[1:2] != ['test']
+AUDIT_QUEUE_SIZE = int(os.getenv('AUDIT_QUEUE_SIZE', '10000'))
+AUDIT_BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', '200'))
+AUDIT_FLUSH_INTERVAL = float(os.getenv('AUDIT_FLUSH_INTERVAL', '1.0'))
+AUDIT_SLOW_FLUSH_SECONDS = float(os.getenv('AUDIT_SLOW_FLUSH_SECONDS', '2.0'))
+AUDIT_SPILL_PATH = os.getenv('AUDIT_SPILL_PATH', os.path.join(BASE_DIR, 'var', 'audit-spill.jsonl'))
+
+# Audit log partitions and archives (see grievances.audit_storage)
+AUDIT_HOT_MONTHS = int(os.getenv('AUDIT_HOT_MONTHS', '6'))
+AUDIT_PARTITIONS_AHEAD = int(os.getenv('AUDIT_PARTITIONS_AHEAD', '3'))
+AUDIT_ARCHIVE_DIR = os.getenv('AUDIT_ARCHIVE_DIR', os.path.join(BASE_DIR, 'var', 'audit-archive'))
+
+# Per-request Server-Timing headers, log lines and histograms (see core.instrumentation)
+REQUEST_METRICS_ENABLED = os.getenv('REQUEST_METRICS_ENABLED', 'true').lower() == 'true'
+REQUEST_METRICS_WINDOW = int(os.getenv('REQUEST_METRICS_WINDOW', '1000'))
+REQUEST_METRICS_REPEAT_THRESHOLD = int(os.getenv('REQUEST_METRICS_REPEAT_THRESHOLD', '5'))
+
+# Prometheus /metrics (see core.metrics); worker snapshots are shared through METRICS_DIR
+METRICS_DIR = '' if sys.argv[1:2] == ['test'] else os.getenv('METRICS_DIR', os.path.join(BASE_DIR, 'var', 'metrics'))
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '1.0'))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
@@ -3,12 +3,15 @@ URL configuration for IDRA Grievance Management System project.
 """
 from django.contrib import admin
 from django.urls import path, include
-from core.views import landing_page, dashboard
+from core.views import (
+    landing_page, dashboard, cache_stats_view, audit_stats_view, request_metrics_view, metrics_view,
+)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', landing_page, name='landing'),
     path('dashboard/', dashboard, name='dashboard'),
+    path('metrics', metrics_view, name='metrics'),
     path('accounts/', include('accounts.urls')),
     path('grievances/', include('grievances.urls')),
     path('companies/', include('companies.urls')),
@@ -17,4 +20,7 @@ urlpatterns = [
     path('api/auth/', include('accounts.urls')),
     path('api/companies/', include('companies.urls')),
     path('api/grievances/', include('grievances.urls')),
+    path('api/cache-stats/', cache_stats_view, name='cache-stats'),
+    path('api/audit-stats/', audit_stats_view, name='audit-stats'),
+    path('api/request-metrics/', request_metrics_view, name='request-metrics'),
 ]
\ No newline at end of file
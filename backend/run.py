@@ -1,6 +1,10 @@
 #!/usr/bin/env python
 """
-Django development server runner for IDRA GMS
+Server runner for IDRA GMS.
+
+``python run.py`` starts the development server on port 6789;
+``python run.py serve`` starts the production server configured in
+``gunicorn.conf.py`` (ASGI by default, see ``SERVER_MODE``).
 """
 import os
 import sys
@@ -16,6 +20,13 @@ if __name__ == '__main__':
             "forget to activate a virtual environment?"
         ) from exc
     
+    if sys.argv[1:2] == ['serve']:
+        # gunicorn.conf.py and the database settings both read this
+        os.environ.setdefault('SERVER_MODE', 'asgi')
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        os.chdir(base_dir)
+        os.execvp('gunicorn', ['gunicorn', '--config', os.path.join(base_dir, 'gunicorn.conf.py'), *sys.argv[2:]])
+
     # Default to runserver with specific host and port
     if len(sys.argv) == 1:
         sys.argv.append('runserver')
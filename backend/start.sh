@@ -81,8 +81,14 @@ except Exception as e:
 
 python manage.py collectstatic --noinput
 
-# Start server
-echo "Starting server on port 6789..."
+# Worker metric snapshots from a previous run would mix into /metrics
+rm -rf "${METRICS_DIR:-/app/var/metrics}"
+
+# Start server (SERVER_MODE: asgi, wsgi or dev)
+echo "Starting ${SERVER_MODE:-asgi} server on port 6789..."
 echo "🌐 Access at: http://localhost:6789"
 echo "👤 Demo users: alice@example.com, david@idra.gov.bd (password: demo123)"
-exec python manage.py runserver 0.0.0.0:6789
\ No newline at end of file
+if [ "${SERVER_MODE:-asgi}" = "dev" ]; then
+    exec python manage.py runserver 0.0.0.0:6789
+fi
+exec python run.py serve
\ No newline at end of file